@@ -0,0 +1,162 @@
+# Hourly and daily UserActivity rollups, raw-row retention and usage series
+#
+# UserActivity keeps one row per action. A periodic job (manage.py
+# rollup_activity) folds closed hours into UserActivityHourly and recomputes the
+# affected days of UserActivityDaily from it, so dashboards read one row per
+# user, action and bucket. The rollups cover everything before
+# rolled_up_until(); usage_series() adds the raw rows after that point, so
+# results are current without the request path doing any extra writes.
+import logging
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import UserActivity, UserActivityDaily, UserActivityHourly
+
+logger = logging.getLogger(__name__)
+
+# Hours are rolled up only once this long past their end, so a row stamped
+# just before the hour boundary has been committed
+ROLLUP_GRACE = timedelta(minutes=5)
+
+def get_raw_retention_days():
+    """Raw UserActivity rows are kept this long, and never before they are rolled up"""
+    return getattr(settings, 'ACTIVITY_RAW_RETENTION_DAYS', 30)
+
+def get_hourly_retention_days():
+    return getattr(settings, 'ACTIVITY_HOURLY_RETENTION_DAYS', 90)
+
+def truncate_hour(value):
+    return timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def rolled_up_until():
+    """End of the last hour folded into the rollups, or None before the first run"""
+    last_bucket = UserActivityHourly.objects.aggregate(last=Max('bucket'))['last']
+    return last_bucket + timedelta(hours=1) if last_bucket else None
+
+def rollup_activity(since=None, now=None):
+    """
+    Fold closed hours of raw activity into the hourly and daily rollups, one
+    day per transaction. Continues from rolled_up_until() unless `since` asks
+    to rebuild from an earlier time. Returns the number of hours rolled up.
+    """
+    now = now or timezone.now()
+    end = truncate_hour(now - ROLLUP_GRACE)
+    oldest = UserActivity.objects.aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is None:
+        return 0
+    start = since or rolled_up_until() or oldest
+    # Hours before the oldest raw row may have been pruned; never rebuild them
+    start = max(truncate_hour(start), truncate_hour(oldest))
+
+    hours = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(day_start(timezone.localdate(chunk_start) + timedelta(days=1)), end)
+        with transaction.atomic():
+            rollup_hours(chunk_start, chunk_end)
+            rollup_day(timezone.localdate(chunk_start))
+        hours += int((chunk_end - chunk_start).total_seconds() // 3600)
+        chunk_start = chunk_end
+    if hours:
+        logger.info(f"Rolled up {hours} hour(s) of user activity up to {end}")
+    return hours
+
+def rollup_hours(start, end):
+    """Recompute the hourly rows for [start, end) from the raw rows"""
+    UserActivityHourly.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+    counts = (
+        UserActivity.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        .annotate(hour=TruncHour('timestamp'))
+        .values('user_id', 'action', 'hour')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    UserActivityHourly.objects.bulk_create([
+        UserActivityHourly(user_id=row['user_id'], action=row['action'], bucket=row['hour'], count=row['n'])
+        for row in counts
+    ], batch_size=1000)
+
+def rollup_day(day):
+    """Recompute one day's rows from the hourly rollup"""
+    UserActivityDaily.objects.filter(bucket=day).delete()
+    counts = (
+        UserActivityHourly.objects.filter(bucket__gte=day_start(day), bucket__lt=day_start(day + timedelta(days=1)))
+        .values('user_id', 'action')
+        .annotate(n=Sum('count'))
+        .order_by()
+    )
+    UserActivityDaily.objects.bulk_create([
+        UserActivityDaily(user_id=row['user_id'], action=row['action'], bucket=day, count=row['n'])
+        for row in counts
+    ], batch_size=1000)
+
+def prune_activity(now=None, batch_size=5000):
+    """
+    Delete raw rows past ACTIVITY_RAW_RETENTION_DAYS that are already rolled
+    up, and hourly rows past ACTIVITY_HOURLY_RETENTION_DAYS. Daily rows are
+    kept. Returns (raw rows deleted, hourly rows deleted).
+    """
+    now = now or timezone.now()
+    watermark = rolled_up_until()
+    if watermark is None:
+        return 0, 0
+    raw_cutoff = truncate_hour(min(now - timedelta(days=get_raw_retention_days()), watermark))
+    # Keep whole days of hourly rows behind the raw rows so a day can always be recomputed
+    hourly_cutoff = day_start(timezone.localdate(
+        min(now - timedelta(days=get_hourly_retention_days()), raw_cutoff)
+    ))
+
+    raw_deleted = 0
+    while True:
+        ids = list(UserActivity.objects.filter(timestamp__lt=raw_cutoff).order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        raw_deleted += UserActivity.objects.filter(id__in=ids).delete()[0]
+    hourly_deleted = UserActivityHourly.objects.filter(bucket__lt=hourly_cutoff).delete()[0]
+    return raw_deleted, hourly_deleted
+
+def usage_series(start, end, granularity='day', user=None, action=None):
+    """
+    Activity counts per bucket and action over [start, end), summed over users
+    unless `user` is given. Reads the rollups up to rolled_up_until() and the
+    raw rows after it. Returns [{'bucket', 'action', 'count'}] ordered by bucket.
+    """
+    watermark = rolled_up_until() or start
+    split = min(max(watermark, start), end)
+    if granularity == 'hour':
+        rollups = UserActivityHourly.objects.filter(bucket__gte=start, bucket__lt=split)
+        raw_bucket = TruncHour('timestamp')
+    else:
+        # `start` should be a day start; the daily row of the watermark's day
+        # holds only the hours before the watermark, the raw rows the rest
+        rollups = UserActivityDaily.objects.filter(
+            bucket__gte=timezone.localdate(start), bucket__lte=timezone.localdate(split)
+        ) if split > start else UserActivityDaily.objects.none()
+        raw_bucket = TruncDate('timestamp')
+    raw = UserActivity.objects.filter(timestamp__gte=split, timestamp__lt=end)
+    if user is not None:
+        rollups = rollups.filter(user=user)
+        raw = raw.filter(user=user)
+    if action:
+        rollups = rollups.filter(action=action)
+        raw = raw.filter(action=action)
+
+    totals = {}
+    for row in rollups.values('bucket', 'action').annotate(n=Sum('count')).order_by():
+        key = (row['bucket'], row['action'])
+        totals[key] = totals.get(key, 0) + row['n']
+    for row in raw.annotate(bucket=raw_bucket).values('bucket', 'action').annotate(n=Count('id')).order_by():
+        key = (row['bucket'], row['action'])
+        totals[key] = totals.get(key, 0) + row['n']
+    return [
+        {'bucket': bucket.isoformat(), 'action': action_name, 'count': count}
+        for (bucket, action_name), count in sorted(totals.items())
+    ]
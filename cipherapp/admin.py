@@ -2,7 +2,48 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile, ChatSession, ChatMessage, UserActivity
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from datetime import timedelta
+import csv
+import json
+from .models import (
+    UserProfile, ChatSession, ChatMessage, ResponseText, UserActivity, ArchivedSession,
+    UserActivityHourly, UserActivityDaily, ShadowEvaluation
+)
+from .session_stats import refresh_session_stats
+from .pagination import EstimatedCountPaginator
+
+# Rows fetched per query by the streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin for tables too large to COUNT(*) on every changelist page"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class RecentActionFilter(admin.SimpleListFilter):
+    """Action filter listing the actions of the last 30 days from the daily rollup, not a DISTINCT over raw rows"""
+    title = 'action'
+    parameter_name = 'action'
+
+    def lookups(self, request, model_admin):
+        since = timezone.localdate() - timedelta(days=30)
+        actions = UserActivityDaily.objects.filter(bucket__gte=since).values_list('action', flat=True).distinct()
+        return [(action, action) for action in sorted(actions)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(action=self.value())
+        return queryset
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -10,6 +51,8 @@ class UserProfileInline(admin.StackedInline):
     verbose_name_plural = 'Profile'
 
 class CustomUserAdmin(UserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = (UserProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'is_active', 'date_joined', 'last_login', 'chat_session_count')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'date_joined', 'last_login')
@@ -17,43 +60,51 @@ class CustomUserAdmin(UserAdmin):
     list_editable = ('is_active',)
     actions = ['deactivate_users', 'export_users_csv', 'export_users_json']
 
+    def get_queryset(self, request):
+        # A correlated subquery is evaluated for the listed page only, unlike a JOIN + GROUP BY over every user
+        sessions = ChatSession.objects.filter(user=OuterRef('pk')).order_by().values('user').annotate(n=Count('id')).values('n')
+        return super().get_queryset(request).annotate(_chat_session_count=Coalesce(Subquery(sessions), 0))
+
     def chat_session_count(self, obj):
-        return ChatSession.objects.filter(user=obj).count()
+        return obj._chat_session_count
     chat_session_count.short_description = 'Chat Sessions'
+    chat_session_count.admin_order_field = '_chat_session_count'
 
     def deactivate_users(self, request, queryset):
         updated = queryset.update(is_active=False)
         self.message_user(request, f"{updated} user(s) deactivated.")
     deactivate_users.short_description = "Deactivate selected users"
 
+    EXPORT_FIELDS = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'is_active', 'date_joined', 'last_login')
+
+    def export_rows(self, queryset):
+        # Plain values, streamed in chunks; the list annotation is not needed here
+        return queryset.order_by('pk').values_list(*self.EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
     def export_users_csv(self, request, queryset):
-        import csv
-        from django.http import HttpResponse
-        response = HttpResponse(content_type='text/csv')
+        writer = csv.writer(Echo())
+
+        def rows():
+            yield writer.writerow(['Username', 'Email', 'First Name', 'Last Name', 'Is Staff', 'Is Active', 'Date Joined', 'Last Login'])
+            for row in self.export_rows(queryset):
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename=users.csv'
-        writer = csv.writer(response)
-        writer.writerow(['Username', 'Email', 'First Name', 'Last Name', 'Is Staff', 'Is Active', 'Date Joined', 'Last Login'])
-        for user in queryset:
-            writer.writerow([user.username, user.email, user.first_name, user.last_name, user.is_staff, user.is_active, user.date_joined, user.last_login])
         return response
     export_users_csv.short_description = "Export selected users to CSV"
 
     def export_users_json(self, request, queryset):
-        import json
-        from django.http import HttpResponse
-        users_data = []
-        for user in queryset:
-            users_data.append({
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'is_staff': user.is_staff,
-                'is_active': user.is_active,
-                'date_joined': user.date_joined.isoformat() if user.date_joined else None,
-                'last_login': user.last_login.isoformat() if user.last_login else None,
-            })
-        response = HttpResponse(json.dumps(users_data, indent=2), content_type='application/json')
+        def chunks():
+            yield '['
+            for i, row in enumerate(self.export_rows(queryset)):
+                user_data = dict(zip(self.EXPORT_FIELDS, row))
+                for field in ('date_joined', 'last_login'):
+                    user_data[field] = user_data[field].isoformat() if user_data[field] else None
+                yield (',\n' if i else '\n') + json.dumps(user_data, indent=2)
+            yield '\n]'
+
+        response = StreamingHttpResponse(chunks(), content_type='application/json')
         response['Content-Disposition'] = 'attachment; filename=users.json'
         return response
     export_users_json.short_description = "Export selected users to JSON"
@@ -65,31 +116,134 @@ class UserProfileAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email', 'full_name')
 
 @admin.register(ChatSession)
-class ChatSessionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'title', 'created_at', 'updated_at', 'is_active')
-    list_filter = ('is_active', 'created_at', 'updated_at')
+class ChatSessionAdmin(LargeTableAdmin):
+    list_display = ('user', 'title', 'message_count', 'last_message_at', 'created_at', 'is_active', 'archived_at')
+    list_filter = ('is_active', 'created_at', 'last_message_at', 'archived_at')
     search_fields = ('user__username', 'title')
-    ordering = ('-updated_at',)
+    ordering = ('-last_message_at',)
+    readonly_fields = ('message_count', 'last_message_at', 'last_message_preview', 'archived_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(LargeTableAdmin):
     list_display = ('session', 'message_type', 'content_preview', 'timestamp')
     list_filter = ('message_type', 'timestamp')
-    search_fields = ('content', 'session__title', 'session__user__username')
-    ordering = ('-timestamp',)
+    # Indexed lookups only: an exact username or a session title prefix. Message
+    # text is not searched here, a substring scan cannot finish at this size
+    search_fields = ('=session__user__username', '^session__title')
+    search_help_text = 'Exact username, session title prefix, or a message id'
+    # Ids grow with time, and the primary key needs no extra index to sort
+    ordering = ('-id',)
+    raw_id_fields = ('session', 'linked_message', 'response_text')
+
+    def get_queryset(self, request):
+        # The changelist ignores list_select_related when the manager already
+        # selects response_text, so add the session and user joins here
+        return super().get_queryset(request).select_related('session__user')
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term.strip().isdigit():
+            return queryset.filter(id=int(search_term.strip())), False
+        return super().get_search_results(request, queryset, search_term)
     
     def content_preview(self, obj):
         return obj.content[:50] + ('...' if len(obj.content) > 50 else '')
     content_preview.short_description = 'Content Preview'
 
+    # Admin edits go through the ORM, so recompute the affected sessions' stats
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            previous_session_id = form.initial.get('session') if change else None
+            super().save_model(request, obj, form, change)
+            refresh_session_stats(ChatSession.all_objects.filter(id__in=[obj.session_id, previous_session_id]))
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            refresh_session_stats(ChatSession.all_objects.filter(id=obj.session_id))
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            session_ids = set(queryset.values_list('session_id', flat=True))
+            super().delete_queryset(request, queryset)
+            refresh_session_stats(ChatSession.all_objects.filter(id__in=session_ids))
+
+@admin.register(ResponseText)
+class ResponseTextAdmin(LargeTableAdmin):
+    list_display = ('digest', 'text_preview', 'created_at')
+    search_fields = ('=digest',)
+    ordering = ('-id',)
+    readonly_fields = ('digest', 'text', 'created_at')
+
+    def has_add_permission(self, request):
+        # Rows are created by cipherapp.response_store only
+        return False
+
+    def text_preview(self, obj):
+        return obj.text[:50] + ('...' if len(obj.text) > 50 else '')
+    text_preview.short_description = 'Text Preview'
+
+@admin.register(ArchivedSession)
+class ArchivedSessionAdmin(LargeTableAdmin):
+    list_display = ('session', 'user', 'message_count', 'original_size', 'stored_size', 'archived_at')
+    list_filter = ('archived_at',)
+    search_fields = ('user__username', 'session__title')
+    ordering = ('-archived_at',)
+    raw_id_fields = ('session', 'user')
+    list_select_related = ('session__user', 'user')
+    exclude = ('payload',)
+    readonly_fields = ('message_count', 'first_message_id', 'last_message_id', 'original_size', 'archived_at')
+
+    def has_add_permission(self, request):
+        # Rows are created by the archive_sessions command only
+        return False
+
+    def stored_size(self, obj):
+        return len(obj.payload)
+    stored_size.short_description = 'Stored Size'
+
 @admin.register(UserActivity)
-class UserActivityAdmin(admin.ModelAdmin):
+class UserActivityAdmin(LargeTableAdmin):
     list_display = ('user', 'action', 'timestamp', 'ip_address')
-    list_filter = ('action', 'timestamp')
-    search_fields = ('user__username', 'action', 'ip_address')
+    list_filter = (RecentActionFilter, 'timestamp')
+    search_fields = ('=user__username', '=ip_address')
     ordering = ('-timestamp',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
     readonly_fields = ('timestamp',)
 
+class ActivityRollupAdmin(LargeTableAdmin):
+    """Read-only view of a rollup table maintained by manage.py rollup_activity"""
+    list_display = ('bucket', 'user', 'action', 'count')
+    list_filter = (RecentActionFilter, 'bucket')
+    search_fields = ('=user__username',)
+    ordering = ('-bucket',)
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'action', 'bucket', 'count')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(UserActivityHourly, ActivityRollupAdmin)
+admin.site.register(UserActivityDaily, ActivityRollupAdmin)
+
+@admin.register(ShadowEvaluation)
+class ShadowEvaluationAdmin(LargeTableAdmin):
+    """Read-only list of shadow model evaluations; summarize with manage.py shadow_report"""
+    list_display = ('created_at', 'candidate', 'batch_size', 'active_seconds', 'candidate_seconds', 'identical', 'similarity', 'error')
+    list_filter = ('candidate', 'created_at')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # Re-register UserAdmin
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
@@ -0,0 +1,166 @@
+# Admission control and load shedding for the response pipeline
+#
+# Views that generate bot responses pass two checks before doing any database
+# work. A per-user token bucket (ADMISSION_USER_RATE messages per second,
+# ADMISSION_USER_BURST deep) answers 429 when one user sends faster than that.
+# Buckets live in the ADMISSION_CACHE cache: per worker with the default
+# local-memory cache, shared by all workers with Redis or Memcached. Then each
+# worker runs at most ADMISSION_MAX_CONCURRENCY requests through the pipeline
+# at once; up to ADMISSION_MAX_QUEUE more wait ADMISSION_QUEUE_TIMEOUT seconds
+# for a slot and the rest are shed with 503. Both answers carry Retry-After.
+import math
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .fastjson import FastJsonResponse, parse_json_body
+
+def is_enabled():
+    return getattr(settings, 'ADMISSION_ENABLED', True)
+
+def get_user_rate():
+    """Messages per second a user's bucket refills"""
+    return getattr(settings, 'ADMISSION_USER_RATE', 1.0)
+
+def get_user_burst():
+    """Messages a user can send at once after being idle"""
+    return getattr(settings, 'ADMISSION_USER_BURST', 10)
+
+def get_max_concurrency():
+    return getattr(settings, 'ADMISSION_MAX_CONCURRENCY', 8)
+
+def get_max_queue():
+    return getattr(settings, 'ADMISSION_MAX_QUEUE', 16)
+
+def get_queue_timeout():
+    return getattr(settings, 'ADMISSION_QUEUE_TIMEOUT', 2.0)
+
+def get_shed_retry_after():
+    """Retry-After (seconds) sent with a 503 when the pipeline is overloaded"""
+    return getattr(settings, 'ADMISSION_SHED_RETRY_AFTER', 2)
+
+def take_tokens(user_id, cost=1):
+    """
+    Charge `cost` messages to a user's bucket. Returns 0 when admitted, or the
+    seconds until enough tokens have refilled. `cost` must not exceed the
+    burst, which a bucket never holds more than (admission_control refuses those).
+
+    The read and write are separate cache calls, so concurrent requests from
+    one user can each spend the same token; the bucket is a bound on sustained
+    load, not an exact quota.
+    """
+    rate = get_user_rate()
+    burst = get_user_burst()
+    cache = caches[getattr(settings, 'ADMISSION_CACHE', 'default')]
+    key = f'admission:bucket:{user_id}'
+    now = time.time()
+
+    tokens, updated = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens < cost:
+        return (cost - tokens) / rate
+    # The entry is only needed until the bucket would be full again
+    cache.set(key, (tokens - cost, now), math.ceil((burst - tokens + cost) / rate) + 1)
+    return 0
+
+class PipelineGate:
+    """Per-worker concurrency limit with a bounded wait queue"""
+
+    def __init__(self):
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a pipeline slot. Returns None when admitted, else why the request was shed."""
+        limit = get_max_concurrency()
+        with self._condition:
+            if self.active < limit:
+                self.active += 1
+                metrics.pipeline_in_flight.inc()
+                return None
+            if self.waiting >= get_max_queue():
+                return 'queue_full'
+
+            self.waiting += 1
+            metrics.pipeline_queue_depth.inc()
+            started = time.monotonic()
+            deadline = started + get_queue_timeout()
+            try:
+                while self.active >= limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return 'queue_timeout'
+                    self._condition.wait(remaining)
+                self.active += 1
+                metrics.pipeline_in_flight.inc()
+                return None
+            finally:
+                self.waiting -= 1
+                metrics.pipeline_queue_depth.dec()
+                metrics.admission_wait.observe(time.monotonic() - started)
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            metrics.pipeline_in_flight.dec()
+            self._condition.notify()
+
+gate = PipelineGate()
+
+def reject(status, reason, retry_after=None, error=None):
+    metrics.admission_rejections.inc(reason)
+    if error is None:
+        error = 'Too many messages, please slow down' if status == 429 else 'The server is busy, please try again shortly'
+    if retry_after is None:
+        # Waiting would not help, so no Retry-After
+        return FastJsonResponse({'error': error}, status=status)
+    retry_after = max(1, math.ceil(retry_after))
+    response = FastJsonResponse({'error': error, 'retry_after': retry_after}, status=status)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+def batch_cost(request):
+    """
+    Number of messages in a /api/chat/batch/ body (the view reports malformed
+    ones). parse_json_body() keeps the parsed body for the view.
+    """
+    try:
+        return max(1, len(parse_json_body(request).get('messages') or []))
+    except (ValueError, AttributeError, TypeError):
+        return 1
+
+def admission_control(cost=None):
+    """
+    Rate-limit and shed POSTs to a pipeline view before it runs. `cost` maps a
+    request to the number of messages it charges to the user's bucket.
+    Apply inside the authentication decorator so only known users are charged.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method != 'POST' or not is_enabled():
+                return view_func(request, *args, **kwargs)
+
+            charge = cost(request) if cost else 1
+            burst = get_user_burst()
+            if charge > burst:
+                # More than a full bucket could ever be admitted
+                return reject(429, 'rate_limited', error=f'At most {burst} messages can be sent at once')
+            retry_after = take_tokens(request.user.pk, charge)
+            if retry_after:
+                return reject(429, 'rate_limited', retry_after)
+
+            shed_reason = gate.acquire()
+            if shed_reason:
+                return reject(503, shed_reason, get_shed_retry_after())
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                gate.release()
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,107 @@
+# Stateless signed API tokens for the /api/chat/* endpoints
+from functools import wraps
+import logging
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.views.decorators.csrf import csrf_protect
+
+from .cache import get_user_cache_version, make_user_cache_key
+from .fastjson import FastJsonResponse
+
+logger = logging.getLogger(__name__)
+
+API_TOKEN_SALT = 'cipherapp.api_token'
+
+def get_api_token_max_age():
+    """Lifetime of an API token in seconds"""
+    return getattr(settings, 'API_TOKEN_MAX_AGE', 900)
+
+def issue_api_token(user):
+    """Issue a short-lived HMAC-signed token carrying the user's claims"""
+    claims = {
+        'uid': user.pk,
+        'usr': user.get_username(),
+        'stf': user.is_staff,
+    }
+    return signing.dumps(claims, salt=API_TOKEN_SALT, compress=True)
+
+def verify_api_token(token):
+    """Return the claims of a valid token, or None if it is bad or expired"""
+    try:
+        claims = signing.loads(token, salt=API_TOKEN_SALT, max_age=get_api_token_max_age())
+    except signing.SignatureExpired:
+        return None
+    except signing.BadSignature:
+        return None
+    if not isinstance(claims, dict) or 'uid' not in claims:
+        return None
+    return claims
+
+def get_token_user_cache_timeout():
+    """How long a token request may reuse the user row it loaded, in seconds"""
+    return getattr(settings, 'API_TOKEN_USER_CACHE_TIMEOUT', 60)
+
+def user_from_claims(claims):
+    """
+    The active User a token's claims name, or None if it was deleted or deactivated.
+
+    Rows are cached under the user's cache version, which every User save bumps,
+    so deactivating an account takes effect on its next token request.
+    """
+    user_id = claims['uid']
+    key = make_user_cache_key(user_id, get_user_cache_version(user_id), 'api_user')
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, get_token_user_cache_timeout())
+    if not user.is_active:
+        return None
+    user.api_token_claims = claims
+    return user
+
+def get_bearer_token(request):
+    """Extract the bearer token from the Authorization header"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = auth_header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+def api_login_required(view_func):
+    """
+    Authenticate an API view with a signed bearer token, falling back to the session.
+
+    Token requests skip the session lookup, load the user through the cache and
+    are exempt from CSRF (the token travels in a header, not a cookie). Session requests keep the
+    original behaviour: login_required plus CSRF unless the view is csrf_exempt.
+    """
+    session_view = login_required(view_func)
+    if not getattr(view_func, 'csrf_exempt', False):
+        session_view = csrf_protect(session_view)
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        token = get_bearer_token(request)
+        if token is None:
+            return session_view(request, *args, **kwargs)
+
+        claims = verify_api_token(token)
+        if claims is None:
+            return FastJsonResponse({'error': 'Invalid or expired API token'}, status=401)
+
+        user = user_from_claims(claims)
+        if user is None:
+            return FastJsonResponse({'error': 'Invalid or expired API token'}, status=401)
+
+        request.user = user
+        request.api_token_auth = True
+        return view_func(request, *args, **kwargs)
+
+    _wrapped_view.csrf_exempt = True
+    return _wrapped_view
@@ -1,4 +1,6 @@
 # CipherApp Django app configuration
+import sys
+
 from django.apps import AppConfig
 
 class CipherappConfig(AppConfig):
@@ -7,5 +9,7 @@ class CipherappConfig(AppConfig):
     verbose_name = 'Cipher Depth Application'
     
     def ready(self):
-        # Import signals here if needed
-        pass
+        # Import signals so cache invalidation handlers are connected
+        from . import signals  # noqa: F401
+        from .metrics import isolate_command_runs
+        isolate_command_runs(sys.argv)
@@ -0,0 +1,279 @@
+# Cold-storage archive for inactive chat sessions
+#
+# Archiving moves a session's messages and their feedback out of the hot
+# ChatMessage/MessageFeedback tables into a single compressed ArchivedSession
+# row. The ChatSession row stays, with its stats, so sidebars and session lists
+# are unchanged. Reads (history, export, search in that session) go through to
+# the archive; the next write to the session restores its rows first, with
+# their original ids and timestamps. Archiving and writes both lock the
+# session row first, so a message is never written next to an archive that
+# was taken without it.
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_user_cache_version
+from .deletion import delete_messages
+from .fields import compress_bytes, decompress_bytes
+from .models import ArchivedSession, ChatMessage, ChatSession, MessageFeedback
+from .response_store import intern_response_texts
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_VERSION = 1
+
+def get_archive_after_days():
+    """Sessions without messages for this many days are archived"""
+    return getattr(settings, 'ARCHIVE_AFTER_DAYS', 90)
+
+def get_archive_batch_size():
+    return getattr(settings, 'ARCHIVE_BATCH_SIZE', 100)
+
+def get_archive_cutoff(days=None):
+    return timezone.now() - timedelta(days=get_archive_after_days() if days is None else days)
+
+def archivable_sessions(days=None):
+    return ChatSession.objects.filter(archived_at__isnull=True, last_message_at__lt=get_archive_cutoff(days))
+
+def archive_session(session, inactive_before=None):
+    """
+    Move one session's messages into its archive row; returns messages archived.
+
+    Skips the session (returning 0) when, once its row is locked, it turns out
+    to be archived already or to have had a message since `inactive_before`.
+    """
+    with transaction.atomic():
+        # Claiming the row with an UPDATE locks it before anything is read; on
+        # SQLite a read first would fail to upgrade to a write under concurrency
+        claimed = ChatSession.objects.filter(id=session.id, archived_at__isnull=True)
+        if inactive_before is not None:
+            claimed = claimed.filter(last_message_at__lt=inactive_before)
+        if not claimed.update(archived_at=timezone.now()):
+            return 0
+        messages = list(ChatMessage.objects.filter(session=session).order_by('timestamp', 'id'))
+        if not messages:
+            transaction.set_rollback(True)
+            return 0
+        message_ids = [message.id for message in messages]
+        feedback = list(MessageFeedback.objects.filter(message_id__in=message_ids).order_by('id'))
+
+        payload = json.dumps({
+            'version': PAYLOAD_VERSION,
+            'messages': [
+                {
+                    'id': message.id,
+                    'type': message.message_type,
+                    'content': message.content,
+                    'timestamp': message.timestamp.isoformat(),
+                    'linked_message_id': message.linked_message_id,
+                }
+                for message in messages
+            ],
+            'feedback': [
+                {
+                    'id': item.id,
+                    'message_id': item.message_id,
+                    'user_id': item.user_id,
+                    'type': item.feedback_type,
+                    'timestamp': item.timestamp.isoformat(),
+                }
+                for item in feedback
+            ],
+        }, separators=(',', ':')).encode('utf-8')
+
+        ArchivedSession.objects.create(
+            session=session,
+            user_id=session.user_id,
+            payload=compress_bytes(payload),
+            message_count=len(messages),
+            first_message_id=min(message_ids),
+            last_message_id=max(message_ids),
+            original_size=len(payload),
+        )
+        # The session keeps its counters and last message; only the rows move
+        delete_messages(message_ids, update_stats=False)
+        transaction.on_commit(lambda: bump_user_cache_version(session.user_id))
+    return len(messages)
+
+def archive_inactive_sessions(days=None, batch_size=None, limit=None):
+    """
+    Archive inactive sessions in bounded batches, one transaction per session.
+    Returns (sessions archived, messages archived).
+    """
+    batch_size = batch_size or get_archive_batch_size()
+    cutoff = get_archive_cutoff(days)
+    sessions_done = messages_done = 0
+    last_id = 0
+    while limit is None or sessions_done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sessions_done)
+        batch = list(ChatSession.objects.filter(
+            archived_at__isnull=True, last_message_at__lt=cutoff, id__gt=last_id
+        ).order_by('id')[:size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for session in batch:
+            try:
+                archived = archive_session(session, inactive_before=cutoff)
+                if archived:
+                    messages_done += archived
+                    sessions_done += 1
+            except Exception as e:
+                logger.error(f"Error archiving session {session.id}: {e}")
+    return sessions_done, messages_done
+
+def load_archive(archive):
+    return json.loads(decompress_bytes(archive.payload))
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value)
+
+def get_archived_messages(session):
+    """Unsaved ChatMessage instances for an archived session, in order"""
+    archive = ArchivedSession.objects.filter(session_id=session.id).first()
+    if archive is None:
+        return []
+    return [
+        ChatMessage(
+            id=item['id'],
+            session=session,
+            message_type=item['type'],
+            content=item['content'],
+            timestamp=parse_timestamp(item['timestamp']),
+            linked_message_id=item['linked_message_id'],
+        )
+        for item in load_archive(archive)['messages']
+    ]
+
+def get_session_messages(session):
+    """A session's messages from the hot table or, for archived sessions, from the archive"""
+    if session.archived_at is not None:
+        return get_archived_messages(session)
+    return list(session.messages.all())
+
+def restore_session(session):
+    """
+    Move an archived session's rows back into the hot tables; returns messages
+    restored, 0 when a concurrent restore got there first.
+    """
+    with transaction.atomic():
+        # Write before reading, as in lock_sessions_for_write: the claim makes a
+        # concurrent restore wait here and then find the archive gone
+        ChatSession.all_objects.filter(id=session.id).update(updated_at=timezone.now())
+        archive = ArchivedSession.objects.filter(session_id=session.id).first()
+        if archive is None:
+            ChatSession.all_objects.filter(id=session.id).update(archived_at=None)
+            session.archived_at = None
+            return 0
+        data = load_archive(archive)
+
+        messages = []
+        bot_items = [item for item in data['messages'] if item['type'] == 'bot']
+        shared = dict(zip(
+            (item['id'] for item in bot_items),
+            intern_response_texts([item['content'] for item in bot_items])
+        ))
+        for item in data['messages']:
+            message = ChatMessage(
+                id=item['id'],
+                session=session,
+                message_type=item['type'],
+                linked_message_id=item['linked_message_id'],
+            )
+            if item['id'] in shared:
+                message.response_text = shared[item['id']]
+            else:
+                message.content = item['content']
+            messages.append(message)
+        ChatMessage.objects.bulk_create(messages)
+
+        feedback = [
+            MessageFeedback(
+                id=item['id'],
+                message_id=item['message_id'],
+                user_id=item['user_id'],
+                feedback_type=item['type'],
+            )
+            for item in data['feedback']
+        ]
+        MessageFeedback.objects.bulk_create(feedback)
+
+        # auto_now_add stamped the rows with the current time; put the originals back
+        for message, item in zip(messages, data['messages']):
+            message.timestamp = parse_timestamp(item['timestamp'])
+        ChatMessage.objects.bulk_update(messages, ['timestamp'])
+        if feedback:
+            for item, record in zip(data['feedback'], feedback):
+                record.timestamp = parse_timestamp(item['timestamp'])
+            MessageFeedback.objects.bulk_update(feedback, ['timestamp'])
+
+        archive.delete()
+        ChatSession.all_objects.filter(id=session.id).update(archived_at=None)
+        session.archived_at = None
+        transaction.on_commit(lambda: bump_user_cache_version(session.user_id))
+    logger.info(f"Restored archived session {session.id} ({len(messages)} messages)")
+    return len(messages)
+
+def lock_sessions_for_write(sessions):
+    """
+    Lock the sessions' rows in the caller's write transaction and restore any
+    that are archived. The archived state is re-read from the locked rows: the
+    instances may have been loaded before an archive run moved their messages.
+
+    The lock is an UPDATE of updated_at rather than SELECT ... FOR UPDATE: on
+    SQLite, where FOR UPDATE is ignored, a transaction that reads before its
+    first write fails with "database is locked" when another writer got in
+    between, instead of waiting for it.
+    """
+    sessions = [session for session in sessions if session is not None]
+    if not sessions:
+        return
+    session_ids = [session.id for session in sessions]
+    ChatSession.all_objects.filter(id__in=session_ids).update(updated_at=timezone.now())
+    archived = dict(ChatSession.all_objects.filter(id__in=session_ids).values_list('id', 'archived_at'))
+    for session in sessions:
+        session.archived_at = archived.get(session.id)
+        if session.archived_at is not None:
+            restore_session(session)
+
+def archived_matches(archive, query):
+    """Messages of an archive whose text contains `query` (case-insensitive), as search rows"""
+    query_lower = query.lower()
+    session = archive.session
+    return [
+        {
+            'id': item['id'],
+            'text': item['content'],
+            'message_type': item['type'],
+            'timestamp': parse_timestamp(item['timestamp']),
+            'session_id': session.id,
+            'session__title': session.title,
+        }
+        for item in load_archive(archive)['messages']
+        if query_lower in item['content'].lower()
+    ]
+
+def restore_for_message(user, message_id):
+    """
+    Restore the user's archived session holding `message_id`, if any.
+
+    Lets writes addressed by message id (edit, delete, feedback) restore
+    lazily. Returns True when the message's session was restored, here or by a
+    concurrent request, so the caller should look the message up again.
+    """
+    try:
+        message_id = int(message_id)
+    except (TypeError, ValueError):
+        return False
+    candidates = ArchivedSession.objects.filter(
+        user=user, first_message_id__lte=message_id, last_message_id__gte=message_id
+    ).select_related('session')
+    for archive in candidates:
+        if any(item['id'] == message_id for item in load_archive(archive)['messages']):
+            restore_session(archive.session)
+            return True
+    return False
@@ -0,0 +1,55 @@
+# Authentication backends for CipherApp
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.functions import Lower
+
+def normalize_email(email):
+    """Case-normalize an email address for storage and lookup"""
+    return (email or '').strip().lower()
+
+def users_by_email(email):
+    """
+    Users whose email matches case-insensitively.
+
+    Filters on LOWER(email) so the lookup is served by the functional index
+    instead of a LIKE scan (which is what email__iexact compiles to). Blank
+    emails are excluded to match the index's partial condition.
+    """
+    UserModel = get_user_model()
+    return UserModel._default_manager.exclude(email='').annotate(
+        email_lower=Lower('email')
+    ).filter(email_lower=normalize_email(email))
+
+class EmailBackend(ModelBackend):
+    """
+    Authenticate with email and password in a single indexed user lookup.
+
+    The reason for a failed attempt is left on request.email_auth_error
+    ('not_found', 'duplicate', 'inactive' or 'password') so login_view can
+    show the right message without querying again.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+
+        users = list(users_by_email(email)[:2])
+
+        if len(users) != 1:
+            # Run the hasher anyway to keep timing similar for unknown emails
+            get_user_model()().set_password(password)
+            self._set_error(request, 'not_found' if not users else 'duplicate')
+            return None
+
+        user = users[0]
+        if not user.check_password(password):
+            self._set_error(request, 'password')
+            return None
+        if not self.user_can_authenticate(user):
+            self._set_error(request, 'inactive')
+            return None
+        return user
+
+    def _set_error(self, request, reason):
+        if request is not None:
+            request.email_auth_error = reason
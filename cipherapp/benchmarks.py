@@ -0,0 +1,524 @@
+# Microbenchmark suite for rl_service, the response pipeline and worker startup
+import datetime
+import json
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings as django_settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import override_settings
+
+from .fastjson import orjson
+from .fields import zstandard
+
+# Fixed seed so every run benchmarks exactly the same synthetic data
+DATASET_SEED = 20250628
+
+VOCABULARY = [
+    'cipher', 'encryption', 'python', 'function', 'algorithm', 'network', 'security',
+    'database', 'design', 'story', 'weather', 'robot', 'learning', 'model', 'neural',
+    'caesar', 'vigenere', 'hash', 'signature', 'token', 'server', 'client', 'browser',
+    'request', 'response', 'memory', 'thread', 'process', 'compile', 'debug', 'error',
+    'what', 'how', 'why', 'explain', 'create', 'imagine', 'technical', 'code', 'the',
+    'and', 'with', 'for', 'about', 'this', 'that', 'please', 'could', 'you', 'tell',
+]
+
+# Message length distributions (words per message)
+MESSAGE_LENGTHS = {
+    'short': 3,
+    'medium': 15,
+    'long': 80,
+}
+
+KB_SIZES = [100, 1000, 5000]
+PATTERN_TABLE_SIZE = 1000
+# Stored messages per storage variant, and words per message (~2 KB of text)
+STORED_MESSAGES = 200
+STORED_MESSAGE_WORDS = 300
+# Concurrent chat load with a skewed prompt mix: prompt k is drawn with weight 1/k^s
+ZIPF_PROMPTS = 200
+ZIPF_EXPONENT = 1.1
+COALESCE_THREADS = 8
+COALESCE_REQUESTS = 64
+# Messages in the full-session history payload of the JSON benchmarks
+HISTORY_MESSAGES = 10000
+
+_registry = []
+
+def benchmark(name, settings=None):
+    """
+    Register a benchmark.
+
+    The decorated function receives the shared Datasets and returns the
+    zero-argument callable to time, so setup cost stays out of the timing.
+    `settings` optionally maps the Datasets to settings overrides applied
+    while the benchmark runs.
+    """
+    def decorator(func):
+        _registry.append((name, func, settings))
+        return func
+    return decorator
+
+def get_benchmarks(pattern=None):
+    """Registered benchmarks, optionally filtered by a name substring"""
+    return [entry for entry in _registry if not pattern or pattern in entry[0]]
+
+def make_message(rng, length):
+    """A synthetic user message of `length` words"""
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(length))
+
+def make_knowledge_base(rng, size):
+    """A synthetic knowledge base in the enhanced_knowledge_base.json format"""
+    qa_pairs = []
+    for i in range(size):
+        keywords = rng.sample(VOCABULARY[:30], 4)
+        qa_pairs.append({
+            'question': f"{' '.join(keywords)} question {i}",
+            'answer': f"Answer {i}: {make_message(rng, 25)}.",
+            'keywords': keywords,
+        })
+    return {'qa_pairs': qa_pairs}
+
+class SyntheticChatbotModel:
+    """Picklable stand-in for the chatbot model with a predict() like sklearn's"""
+
+    def predict(self, messages):
+        return [f"Model reply about {message.split()[0] if message.split() else 'that'}." for message in messages]
+
+class Datasets:
+    """Synthetic datasets shared by all benchmarks in one run"""
+
+    def __init__(self, workdir):
+        rng = random.Random(DATASET_SEED)
+        self.workdir = Path(workdir)
+        self.messages = {
+            label: [make_message(rng, length) for _ in range(50)]
+            for label, length in MESSAGE_LENGTHS.items()
+        }
+        self.knowledge_base_paths = {}
+        for size in KB_SIZES:
+            path = self.workdir / f'kb_{size}.json'
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(make_knowledge_base(rng, size), f)
+            self.knowledge_base_paths[size] = path
+
+        self.model_path = self.workdir / 'model.pkl'
+        with open(self.model_path, 'wb') as f:
+            pickle.dump(SyntheticChatbotModel(), f)
+
+        self.pattern_rows = [
+            {
+                'user_input': make_message(rng, MESSAGE_LENGTHS['medium']),
+                'bot_response': f"{make_message(rng, 12).capitalize()}. {make_message(rng, 30)}.",
+                'success_rate': rng.random(),
+                'total_uses': rng.randint(0, 20),
+            }
+            for _ in range(PATTERN_TABLE_SIZE)
+        ]
+        self.patterns = []
+
+    def load_patterns(self):
+        """Insert the synthetic ResponsePattern table (inside the run's transaction)"""
+        from .models import ResponsePattern
+        from .rl_service import rl_service
+
+        patterns = []
+        for row in self.pattern_rows:
+            patterns.append(ResponsePattern(
+                user_input=row['user_input'],
+                bot_response=row['bot_response'],
+                success_rate=row['success_rate'],
+                total_uses=row['total_uses'],
+                context_keywords=rl_service.extract_keywords(row['user_input']),
+                response_category=rl_service.categorize_input(row['user_input']),
+            ))
+        ResponsePattern.objects.bulk_create(patterns, batch_size=500)
+        self.patterns = list(ResponsePattern.objects.order_by('-success_rate')[:50])
+
+    def load_messages(self):
+        """Insert long messages stored plaintext in one session and compressed in another"""
+        from django.contrib.auth.models import User
+        from .fields import Plaintext
+        from .models import ChatMessage, ChatSession
+
+        rng = random.Random(DATASET_SEED)
+        texts = [make_message(rng, STORED_MESSAGE_WORDS) for _ in range(STORED_MESSAGES)]
+        user = User.objects.create_user(username='benchmark_storage', password=None)
+        self.message_sessions = {}
+        for variant in ('plain', 'compressed'):
+            chat_session = ChatSession.objects.create(user=user, title=f'Benchmark {variant}')
+            ChatMessage.objects.bulk_create([
+                ChatMessage(
+                    session=chat_session,
+                    message_type='user',
+                    inline_content=Plaintext(text) if variant == 'plain' else text,
+                )
+                for text in texts
+            ])
+            self.message_sessions[variant] = chat_session
+
+def cycle(items):
+    """Callable-friendly round robin over a list"""
+    state = {'i': 0}
+
+    def next_item():
+        item = items[state['i'] % len(items)]
+        state['i'] += 1
+        return item
+    return next_item
+
+# --- rl_service -----------------------------------------------------------
+
+for _label in MESSAGE_LENGTHS:
+    def _extract_keywords(data, label=_label):
+        from .rl_service import rl_service
+        next_message = cycle(data.messages[label])
+        return lambda: rl_service.extract_keywords(next_message())
+    benchmark(f'rl.extract_keywords[{_label}]')(_extract_keywords)
+
+    def _categorize_input(data, label=_label):
+        from .rl_service import rl_service
+        next_message = cycle(data.messages[label])
+        return lambda: rl_service.categorize_input(next_message())
+    benchmark(f'rl.categorize_input[{_label}]')(_categorize_input)
+
+@benchmark(f'rl.find_similar_patterns[patterns={PATTERN_TABLE_SIZE}]')
+def _find_similar_patterns(data):
+    from .rl_service import rl_service
+    next_message = cycle(data.messages['medium'])
+    return lambda: rl_service.find_similar_patterns(next_message())
+
+@benchmark('rl.extract_successful_phrases[patterns=50]')
+def _extract_successful_phrases(data):
+    from .rl_service import rl_service
+    return lambda: rl_service.extract_successful_phrases(data.patterns)
+
+@benchmark('rl.enhance_response[patterns=5]')
+def _enhance_response(data):
+    from .rl_service import rl_service
+    patterns = data.patterns[:5]
+    for pattern in patterns:
+        pattern.success_rate = 0.9
+    return lambda: rl_service.enhance_response('Base response text.', 'technical', patterns)
+
+# --- response pipeline ----------------------------------------------------
+
+for _size in KB_SIZES:
+    def _search_knowledge_base(data):
+        from .views import search_knowledge_base
+        next_message = cycle(data.messages['medium'])
+        return lambda: search_knowledge_base(next_message())
+    benchmark(
+        f'pipeline.search_knowledge_base[kb={_size}]',
+        settings=lambda data, size=_size: {'CHATBOT_KNOWLEDGE_BASE_PATH': data.knowledge_base_paths[size]},
+    )(_search_knowledge_base)
+
+def _pipeline_settings(data):
+    return {
+        'CHATBOT_KNOWLEDGE_BASE_PATH': data.knowledge_base_paths[1000],
+        'CHATBOT_MODEL_PATH': data.model_path,
+    }
+
+for _label in MESSAGE_LENGTHS:
+    def _generate_bot_response(data, label=_label):
+        from .views import generate_bot_response
+        next_message = cycle(data.messages[label])
+        return lambda: generate_bot_response(next_message())
+    benchmark(
+        f'pipeline.generate_bot_response[{_label},kb=1000,patterns={PATTERN_TABLE_SIZE}]',
+        settings=_pipeline_settings,
+    )(_generate_bot_response)
+
+@benchmark(
+    f'pipeline.generate_bot_responses[batch=50,medium,kb=1000,patterns={PATTERN_TABLE_SIZE}]',
+    settings=_pipeline_settings,
+)
+def _generate_bot_responses(data):
+    from .views import generate_bot_responses
+    return lambda: generate_bot_responses(data.messages['medium'])
+
+# --- compressed text storage ---------------------------------------------
+
+def _stored_message_text(data):
+    rng = random.Random(DATASET_SEED)
+    return make_message(rng, STORED_MESSAGE_WORDS)
+
+for _codec in ('zlib', 'zstd') if zstandard is not None else ('zlib',):
+    def _encode_text(data):
+        from .fields import encode_text
+        text = _stored_message_text(data)
+        return lambda: encode_text(text)
+    benchmark(
+        f'storage.encode_text[{_codec},words={STORED_MESSAGE_WORDS}]',
+        settings=lambda data, codec=_codec: {'COMPRESSED_TEXT_CODEC': codec},
+    )(_encode_text)
+
+    def _decode_text(data, codec=_codec):
+        from django.test.utils import override_settings
+        from .fields import decode_text, encode_text
+        with override_settings(COMPRESSED_TEXT_CODEC=codec):
+            stored = encode_text(_stored_message_text(data))
+        return lambda: decode_text(stored)
+    benchmark(f'storage.decode_text[{_codec},words={STORED_MESSAGE_WORDS}]')(_decode_text)
+
+for _variant in ('plain', 'compressed'):
+    def _read_messages(data, variant=_variant):
+        from .models import ChatMessage
+        chat_session = data.message_sessions[variant]
+        return lambda: [message.content for message in ChatMessage.objects.filter(session=chat_session)]
+    benchmark(f'storage.read_messages[{_variant},n={STORED_MESSAGES}]')(_read_messages)
+
+    def _load_messages(data, variant=_variant):
+        from .models import ChatMessage
+        chat_session = data.message_sessions[variant]
+        return lambda: list(ChatMessage.objects.filter(session=chat_session))
+    benchmark(f'storage.load_messages[{_variant},n={STORED_MESSAGES},text unread]')(_load_messages)
+
+# --- chat transport -------------------------------------------------------
+
+# The same chat turn over HTTP (full middleware, session and CSRF stack) and as
+# a frame on an open WebSocket, which skips all of that. 1 / seconds per call
+# is the messages per second one core sustains on each transport.
+
+def _transport_settings(data):
+    # One user sends every message; keep admission control in the path but never limiting
+    return dict(_pipeline_settings(data), ADMISSION_USER_RATE=1e9, ADMISSION_USER_BURST=1e9)
+
+def _transport_session(transport):
+    from django.contrib.auth.models import User
+    from .models import ChatSession
+
+    user = User.objects.create_user(username=f'benchmark_{transport}', password=None)
+    return user, ChatSession.objects.create(user=user, title=f'Benchmark {transport}')
+
+@benchmark('transport.http[chat,kb=1000]', settings=_transport_settings)
+def _transport_http(data):
+    from django.test import Client
+
+    user, chat_session = _transport_session('http')
+    client = Client()
+    client.force_login(user)
+    next_message = cycle(data.messages['medium'])
+    return lambda: client.post(
+        '/api/chat/',
+        json.dumps({'message': next_message(), 'session_id': chat_session.id}),
+        content_type='application/json',
+    )
+
+@benchmark('transport.websocket[chat,kb=1000]', settings=_transport_settings)
+def _transport_websocket(data):
+    from .websocket import dispatch_frame
+
+    user, chat_session = _transport_session('websocket')
+    meta = {'REMOTE_ADDR': '127.0.0.1', 'HTTP_USER_AGENT': 'benchmark'}
+    next_message = cycle(data.messages['medium'])
+    return lambda: dispatch_frame(user, meta, json.dumps({
+        'id': 1, 'type': 'chat', 'data': {'message': next_message(), 'session_id': chat_session.id},
+    }))
+
+# --- request coalescing ---------------------------------------------------
+
+# COALESCE_REQUESTS chat responses for Zipfian prompts, generated on a pool of
+# COALESCE_THREADS threads as in a threaded worker. With coalescing on, the
+# concurrent requests for a popular prompt share one pipeline run.
+
+def zipf_prompt_batches(count=20):
+    rng = random.Random(DATASET_SEED)
+    prompts = [make_message(rng, MESSAGE_LENGTHS['medium']) for _ in range(ZIPF_PROMPTS)]
+    weights = [1 / rank ** ZIPF_EXPONENT for rank in range(1, ZIPF_PROMPTS + 1)]
+    return [rng.choices(prompts, weights=weights, k=COALESCE_REQUESTS) for _ in range(count)]
+
+def use_connection(connection):
+    connections[DEFAULT_DB_ALIAS] = connection
+
+@contextmanager
+def shared_connection_pool(max_workers):
+    """
+    Thread pool whose threads use this thread's database connection (as
+    LiveServerTestCase does), so they see the run's uncommitted datasets
+    instead of blocking on its write lock
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    connection.inc_thread_sharing()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=use_connection, initargs=(connection,)) as pool:
+            yield pool
+    finally:
+        connection.dec_thread_sharing()
+
+for _coalesce in (False, True):
+    def _coalesced_chat(data):
+        from .views import generate_bot_response
+        next_batch = cycle(zipf_prompt_batches())
+
+        def run_batch():
+            with shared_connection_pool(COALESCE_THREADS) as pool:
+                return list(pool.map(generate_bot_response, next_batch()))
+        return run_batch
+    benchmark(
+        f'coalesce.zipf[s={ZIPF_EXPONENT},threads={COALESCE_THREADS},requests={COALESCE_REQUESTS},'
+        f'kb=1000,patterns={PATTERN_TABLE_SIZE},{"on" if _coalesce else "off"}]',
+        settings=lambda data, coalesce=_coalesce: dict(_pipeline_settings(data), CHAT_COALESCE_ENABLED=coalesce),
+    )(_coalesced_chat)
+
+# --- API JSON -------------------------------------------------------------
+
+# A full-session /api/chat/history/ payload of HISTORY_MESSAGES messages: built
+# and encoded the old way (isoformat() per timestamp, Django's JsonResponse)
+# and with FastJsonResponse on each backend, plus gzip on top of the fastest.
+
+def history_messages():
+    from types import SimpleNamespace
+    from django.utils import timezone
+
+    rng = random.Random(DATASET_SEED)
+    start = timezone.now()
+    return [
+        SimpleNamespace(
+            id=i,
+            message_type='user' if i % 2 == 0 else 'bot',
+            content=make_message(rng, MESSAGE_LENGTHS['medium']),
+            timestamp=start + datetime.timedelta(seconds=i),
+            linked_message_id=i - 1 if i % 2 else None,
+        )
+        for i in range(HISTORY_MESSAGES)
+    ]
+
+def history_payload(messages, timestamp):
+    return {
+        'success': True,
+        'messages': [{
+            'id': msg.id,
+            'type': msg.message_type,
+            'content': msg.content,
+            'timestamp': timestamp(msg.timestamp),
+            'linked_message_id': msg.linked_message_id,
+        } for msg in messages],
+    }
+
+@benchmark(f'json.history[n={HISTORY_MESSAGES},django JsonResponse]')
+def _history_django(data):
+    from django.http import JsonResponse
+    messages = history_messages()
+    return lambda: JsonResponse(history_payload(messages, lambda value: value.isoformat()))
+
+for _backend in ('stdlib', 'orjson') if orjson is not None else ('stdlib',):
+    def _history_fast(data):
+        from .fastjson import FastJsonResponse
+        messages = history_messages()
+        return lambda: FastJsonResponse(history_payload(messages, lambda value: value))
+    benchmark(
+        f'json.history[n={HISTORY_MESSAGES},{_backend}]',
+        settings=lambda data, backend=_backend: {'API_JSON_BACKEND': backend},
+    )(_history_fast)
+
+@benchmark(f'json.history[n={HISTORY_MESSAGES},auto,gzip]')
+def _history_gzip(data):
+    from django.test import RequestFactory
+    from .fastjson import FastJsonResponse
+    from .middleware import JsonGzipMiddleware
+
+    messages = history_messages()
+    request = RequestFactory().get('/api/chat/history/', HTTP_ACCEPT_ENCODING='gzip')
+    middleware = JsonGzipMiddleware(lambda request: FastJsonResponse(history_payload(messages, lambda value: value)))
+    return lambda: middleware(request)
+
+# --- worker startup -------------------------------------------------------
+
+# Run in a fresh interpreter: boot the WSGI application like a worker does and
+# fail if that opened a database connection or imported numpy or the RL
+# service, then time the first request, which imports the views and compiles
+# the page's templates (and must not need numpy or the RL service either).
+STARTUP_SCRIPT = '''
+import sys
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+
+def check_lazy(when):
+    for module, name in (('numpy', 'numpy'), ('cipherapp.rl_service', 'the RL service')):
+        if module in sys.modules:
+            sys.exit(when + ' imported ' + name)
+
+application = get_wsgi_application()
+if any(connections[alias].connection is not None for alias in connections):
+    sys.exit('worker boot opened a database connection')
+check_lazy('worker boot')
+if {first_request}:
+    from wsgiref.util import setup_testing_defaults
+    environ = {{'PATH_INFO': '/login/', 'HTTP_HOST': 'localhost'}}
+    setup_testing_defaults(environ)
+    statuses = []
+    b''.join(application(environ, lambda status, headers: statuses.append(status)))
+    if not statuses[0].startswith('200'):
+        sys.exit('first request failed: ' + statuses[0])
+    check_lazy('the first request')
+'''
+
+def run_startup_script(first_request):
+    script = STARTUP_SCRIPT.format(first_request=first_request)
+    result = subprocess.run(
+        [sys.executable, '-c', script], cwd=django_settings.BASE_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Startup benchmark failed: {result.stderr.strip()}')
+
+@benchmark('startup.worker_boot[subprocess]')
+def _worker_boot(data):
+    return lambda: run_startup_script(first_request=False)
+
+@benchmark('startup.first_request[subprocess,/login/]')
+def _first_request(data):
+    return lambda: run_startup_script(first_request=True)
+
+# --- runner ---------------------------------------------------------------
+
+def time_callable(func, repeat=5):
+    """Best-of-`repeat` seconds per call, with the loop count picked by autorange()"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+@contextmanager
+def benchmark_environment():
+    """Build the datasets inside a transaction that is always rolled back"""
+    with tempfile.TemporaryDirectory(prefix='cipherapp-bench-') as workdir:
+        with transaction.atomic():
+            data = Datasets(workdir)
+            data.load_patterns()
+            data.load_messages()
+            try:
+                yield data
+            finally:
+                transaction.set_rollback(True)
+
+def run_benchmarks(pattern=None, repeat=5):
+    """Run registered benchmarks and return {name: seconds per call}"""
+    results = {}
+    with benchmark_environment() as data:
+        for name, factory, settings in get_benchmarks(pattern):
+            with override_settings(**(settings(data) if settings else {})):
+                results[name] = time_callable(factory(data), repeat=repeat)
+    return results
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare results with a stored baseline.
+
+    Returns a list of (name, baseline, current, ratio, regressed) for every
+    benchmark present in both.
+    """
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current / previous
+        rows.append((name, previous, current, ratio, ratio > 1 + tolerance))
+    return rows
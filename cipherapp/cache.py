@@ -0,0 +1,59 @@
+# Per-user caching with versioned keys for CipherApp
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserProfile, ChatSession
+
+def get_home_cache_timeout():
+    """How long cached home page data lives, in seconds"""
+    return getattr(settings, 'HOME_CACHE_TIMEOUT', 300)
+
+def _version_key(user_id):
+    return f'cipherapp:user:{user_id}:version'
+
+def get_user_cache_version(user_id):
+    """
+    Current cache version for a user.
+
+    A missing version starts from the clock rather than 1, so keys written
+    under a version that was evicted can never be picked up again.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+def bump_user_cache_version(user_id):
+    """Invalidate everything cached for a user by moving to a new version"""
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+def make_user_cache_key(user_id, version, name):
+    """Build a cache key scoped to a user and cache version"""
+    return f'cipherapp:user:{user_id}:v{version}:{name}'
+
+def get_home_data(user):
+    """
+    Profile and recent chat sessions for the home page, cached per user.
+
+    The version is read before the database so data fetched while a signal
+    bumps the version lands under the superseded key and is never served.
+    """
+    version = get_user_cache_version(user.pk)
+    key = make_user_cache_key(user.pk, version, 'home')
+    data = cache.get(key)
+    if data is None:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        data = {
+            'profile': profile,
+            'chat_sessions': list(ChatSession.objects.filter(user=user)[:10]),
+        }
+        cache.set(key, data, get_home_cache_timeout())
+    return dict(data, version=version)
@@ -0,0 +1,150 @@
+# Set-based deletion of chat sessions and messages
+#
+# Model.delete() runs Django's cascade collector, which loads every message,
+# its response_to children and its feedback into memory and deletes them row
+# by row. These helpers issue a handful of bulk DELETEs in dependency order
+# instead: feedback, then bot replies (which reference user messages), then
+# the remaining messages, then the session.
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_user_cache_version
+from .models import ArchivedSession, ChatSession, ChatMessage, MessageFeedback
+from .session_stats import count_messages_by_session, record_messages_removed
+
+logger = logging.getLogger(__name__)
+
+def get_soft_delete_threshold():
+    """Sessions with more messages than this are soft-deleted and purged in the background"""
+    return getattr(settings, 'SESSION_SOFT_DELETE_THRESHOLD', 2000)
+
+def get_purge_batch_size():
+    return getattr(settings, 'SESSION_PURGE_BATCH_SIZE', 500)
+
+def _tables():
+    qn = connection.ops.quote_name
+    return (
+        qn(MessageFeedback._meta.db_table),
+        qn(ChatMessage._meta.db_table),
+        qn(ChatSession._meta.db_table),
+    )
+
+def _archive_table():
+    return connection.ops.quote_name(ArchivedSession._meta.db_table)
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+def delete_messages(message_ids, update_stats=True):
+    """
+    Delete messages (and their feedback) by id in one transaction; returns rows removed.
+
+    The affected sessions' counters and last message are updated in the same
+    transaction unless the caller does that itself (update_stats=False).
+    """
+    message_ids = list(message_ids)
+    if not message_ids:
+        return 0
+    feedback_table, message_table, _ = _tables()
+    ids = _placeholders(message_ids)
+    with transaction.atomic():
+        counts = count_messages_by_session(message_ids) if update_stats else {}
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {feedback_table} WHERE message_id IN ({ids})', message_ids)
+            cursor.execute(
+                f'DELETE FROM {message_table} WHERE id IN ({ids}) AND linked_message_id IS NOT NULL',
+                message_ids
+            )
+            deleted = cursor.rowcount
+            cursor.execute(f'DELETE FROM {message_table} WHERE id IN ({ids})', message_ids)
+            deleted += cursor.rowcount
+        record_messages_removed(counts)
+    return deleted
+
+def delete_session(session):
+    """Delete a session and everything in it (including any archive) with set-based DELETEs"""
+    feedback_table, message_table, session_table = _tables()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {feedback_table} WHERE message_id IN '
+                f'(SELECT id FROM {message_table} WHERE session_id = %s)',
+                [session.id]
+            )
+            cursor.execute(
+                f'DELETE FROM {message_table} WHERE session_id = %s AND linked_message_id IS NOT NULL',
+                [session.id]
+            )
+            cursor.execute(f'DELETE FROM {message_table} WHERE session_id = %s', [session.id])
+            cursor.execute(f'DELETE FROM {_archive_table()} WHERE session_id = %s', [session.id])
+            cursor.execute(f'DELETE FROM {session_table} WHERE id = %s', [session.id])
+        # Raw deletes send no signals, so invalidate the owner's cache here
+        transaction.on_commit(lambda: bump_user_cache_version(session.user_id))
+
+def soft_delete_session(session, purge_now=True):
+    """
+    Hide a session immediately and remove its rows later in bounded batches.
+
+    The session disappears from ChatSession.objects with one UPDATE; the purge
+    runs in a background thread after commit (and manage.py
+    purge_deleted_sessions picks up anything a worker did not finish).
+    """
+    ChatSession.all_objects.filter(id=session.id).update(deleted_at=timezone.now())
+    bump_user_cache_version(session.user_id)
+    if purge_now:
+        transaction.on_commit(lambda: purge_in_background(session.id))
+
+def purge_session(session_id, batch_size=None):
+    """Remove a soft-deleted session in batches, each in its own short transaction"""
+    batch_size = batch_size or get_purge_batch_size()
+    removed = 0
+
+    # Bot replies first: they reference the user messages through linked_message
+    for replies_only in (True, False):
+        while True:
+            batch = ChatMessage.objects.filter(session_id=session_id)
+            if replies_only:
+                batch = batch.filter(linked_message__isnull=False)
+            batch_ids = list(batch.values_list('id', flat=True)[:batch_size])
+            if not batch_ids:
+                break
+            # The session row goes last, so its stats are not worth maintaining
+            removed += delete_messages(batch_ids, update_stats=False)
+
+    session = ChatSession.all_objects.filter(id=session_id).first()
+    if session is not None:
+        delete_session(session)
+    logger.info(f"Purged session {session_id} ({removed} messages)")
+    return removed
+
+def _purge_worker(session_id):
+    try:
+        purge_session(session_id)
+    except Exception as e:
+        logger.error(f"Error purging session {session_id}: {e}")
+    finally:
+        connection.close()
+
+def purge_in_background(session_id):
+    """Start purging a soft-deleted session on a daemon thread"""
+    thread = threading.Thread(
+        target=_purge_worker,
+        args=(session_id,),
+        name=f'purge-session-{session_id}',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def delete_session_auto(session):
+    """Delete small sessions right away and soft-delete huge ones; returns 'deleted' or 'scheduled'"""
+    # The denormalized count; counting the rows would scan the very sessions this guards against
+    if session.message_count > get_soft_delete_threshold():
+        soft_delete_session(session)
+        return 'scheduled'
+    delete_session(session)
+    return 'deleted'
@@ -0,0 +1,70 @@
+# Fast JSON encoding and decoding for the API views
+#
+# API views answer with FastJsonResponse and read request bodies with
+# parse_json_body(). Both use orjson when it is installed (and API_JSON_BACKEND
+# allows it) and the standard library otherwise. Datetimes, dates, UUIDs and
+# Decimals are encoded natively, so payloads can hold model values directly; a
+# datetime comes out exactly as .isoformat() writes it on either backend.
+# Large responses are gzipped by middleware.JsonGzipMiddleware.
+import datetime
+import decimal
+import json
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.functional import Promise
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def get_backend():
+    """'orjson' or 'stdlib'; API_JSON_BACKEND = 'auto' picks orjson when installed"""
+    backend = getattr(settings, 'API_JSON_BACKEND', 'auto')
+    if backend == 'auto':
+        return 'orjson' if orjson is not None else 'stdlib'
+    if backend == 'orjson' and orjson is None:
+        raise ImportError('API_JSON_BACKEND is "orjson" but the orjson package is not installed')
+    return backend
+
+def encode_default(value):
+    """Values neither backend encodes on its own"""
+    if type(value) is datetime.datetime:  # the common case, without the isinstance chain
+        return value.isoformat()
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(data):
+    """Encode to UTF-8 JSON bytes"""
+    if get_backend() == 'orjson':
+        # Non-string keys are written as strings, like the standard library does
+        return orjson.dumps(data, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=encode_default, ensure_ascii=False).encode('utf-8')
+
+def loads(data):
+    """Decode JSON bytes or text; malformed input raises json.JSONDecodeError on both backends"""
+    if get_backend() == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+def parse_json_body(request):
+    """The decoded body, parsed once per request (admission control reads it before the view)"""
+    try:
+        return request._json_body
+    except AttributeError:
+        request._json_body = loads(request.body)
+        return request._json_body
+
+class FastJsonResponse(JsonResponse):
+    """JsonResponse encoded with dumps() instead of DjangoJSONEncoder"""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        HttpResponse.__init__(self, content=dumps(data), **kwargs)
@@ -0,0 +1,221 @@
+# Text field that transparently compresses long values
+#
+# Values of at least COMPRESSED_TEXT_MIN_LENGTH characters are compressed with
+# zstd (when the zstandard package is installed) or zlib and stored in the same
+# TEXT column as a short prefix plus base64, so the column type never changes
+# and plaintext and compressed rows can live side by side. Rows are only
+# decompressed when the attribute is read; loading a message without touching
+# its text costs nothing extra. Rows that need database full-text matching can
+# be kept as plaintext per row through `plaintext_when`.
+import base64
+import zlib
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Length
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every encoded value starts with ESC, which ordinary text practically never
+# does; the rare plaintext that does is stored behind ESCAPE_PREFIX.
+MARKER = '\x1b'
+ZLIB_PREFIX = '\x1bz:'
+ZSTD_PREFIX = '\x1bs:'
+ESCAPE_PREFIX = '\x1bp:'
+COMPRESSED_PREFIXES = (ZLIB_PREFIX, ZSTD_PREFIX)
+
+def get_min_length():
+    return getattr(settings, 'COMPRESSED_TEXT_MIN_LENGTH', 512)
+
+def get_codec():
+    """'zstd' or 'zlib'; COMPRESSED_TEXT_CODEC = 'auto' picks zstd when installed"""
+    codec = getattr(settings, 'COMPRESSED_TEXT_CODEC', 'auto')
+    if codec == 'auto':
+        return 'zstd' if zstandard is not None else 'zlib'
+    if codec == 'zstd' and zstandard is None:
+        raise ImportError('COMPRESSED_TEXT_CODEC is "zstd" but the zstandard package is not installed')
+    return codec
+
+def is_compressed(stored):
+    return isinstance(stored, str) and stored.startswith(COMPRESSED_PREFIXES)
+
+def compressed_lookup(field_name):
+    """Q matching rows whose stored `field_name` value is compressed"""
+    return Q(**{f'{field_name}__startswith': ZLIB_PREFIX}) | Q(**{f'{field_name}__startswith': ZSTD_PREFIX})
+
+def encode_text(text, compress=True, min_length=None):
+    """The column value for `text`: compressed when long enough and actually smaller"""
+    if compress and len(text) >= (get_min_length() if min_length is None else min_length):
+        data = text.encode('utf-8')
+        if get_codec() == 'zstd':
+            encoded = ZSTD_PREFIX + base64.b64encode(zstandard.ZstdCompressor(level=6).compress(data)).decode('ascii')
+        else:
+            encoded = ZLIB_PREFIX + base64.b64encode(zlib.compress(data, 6)).decode('ascii')
+        if len(encoded) < len(text):
+            return encoded
+    if text.startswith(MARKER):
+        return ESCAPE_PREFIX + text
+    return text
+
+def decode_text(stored):
+    """The text for a column value written by encode_text (or any legacy plaintext)"""
+    if not stored.startswith(MARKER):
+        return stored
+    if stored.startswith(ZLIB_PREFIX):
+        return zlib.decompress(base64.b64decode(stored[len(ZLIB_PREFIX):])).decode('utf-8')
+    if stored.startswith(ZSTD_PREFIX):
+        if zstandard is None:
+            raise ImportError('A zstd-compressed value was read but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(base64.b64decode(stored[len(ZSTD_PREFIX):])).decode('utf-8')
+    if stored.startswith(ESCAPE_PREFIX):
+        return stored[len(ESCAPE_PREFIX):]
+    return stored
+
+def compress_bytes(data):
+    """Compress bytes with the configured codec; the first byte records which one"""
+    if get_codec() == 'zstd':
+        return b's' + zstandard.ZstdCompressor(level=6).compress(data)
+    return b'z' + zlib.compress(data, 6)
+
+def decompress_bytes(blob):
+    blob = bytes(blob)
+    if blob[:1] == b'z':
+        return zlib.decompress(blob[1:])
+    if blob[:1] == b's':
+        if zstandard is None:
+            raise ImportError('A zstd-compressed value was read but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(blob[1:])
+    raise ValueError('Unknown compression codec')
+
+class CompressedText:
+    """A compressed column value as loaded from the database; str() decompresses it"""
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __str__(self):
+        return decode_text(self.raw)
+
+    def __repr__(self):
+        return f'<CompressedText {len(self.raw)} chars>'
+
+class Plaintext(str):
+    """A value pre_save decided to keep uncompressed"""
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """Decompresses a loaded value the first time the attribute is read"""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            value = str(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+class CompressedTextField(models.TextField):
+    """
+    TextField stored compressed above a size threshold.
+
+    `min_length` overrides COMPRESSED_TEXT_MIN_LENGTH. `plaintext_when` names a
+    model method; rows for which it returns True are always stored as
+    plaintext so database LIKE/full-text lookups keep matching them.
+    values() returns CompressedText for compressed rows; use str() on them.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, min_length=None, plaintext_when=None, **kwargs):
+        self.min_length = min_length
+        self.plaintext_when = plaintext_when
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.min_length is not None:
+            kwargs['min_length'] = self.min_length
+        if self.plaintext_when is not None:
+            kwargs['plaintext_when'] = self.plaintext_when
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or not value.startswith(MARKER):
+            return value
+        if is_compressed(value):
+            return CompressedText(value)
+        return decode_text(value)
+
+    def to_python(self, value):
+        if isinstance(value, CompressedText):
+            return str(value)
+        if isinstance(value, str):
+            return decode_text(value)
+        return super().to_python(value)
+
+    def pre_save(self, model_instance, add):
+        # Read the raw value so an untouched compressed row is written back as is
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, CompressedText) or value is None:
+            return value
+        if self.plaintext_when and getattr(model_instance, self.plaintext_when)():
+            return Plaintext(value)
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, CompressedText):
+            return value.raw
+        if isinstance(value, Plaintext):
+            return encode_text(str(value), compress=False)
+        return encode_text(str(value), min_length=self.min_length)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+def compress_rows(queryset, field_name, batch_size=500, decompress=False):
+    """
+    Re-encode existing rows of a CompressedTextField in batches, each in its own
+    transaction. Compresses plaintext rows at or above the field's threshold,
+    or with decompress=True turns compressed rows back into plaintext.
+    Returns (rows rewritten, characters before, characters after).
+    """
+    field = queryset.model._meta.get_field(field_name)
+    if decompress:
+        candidates = queryset.filter(compressed_lookup(field_name))
+    else:
+        min_length = get_min_length() if field.min_length is None else field.min_length
+        candidates = queryset.annotate(stored_length=Length(field_name)).filter(
+            stored_length__gte=min_length
+        ).exclude(**{f'{field_name}__startswith': MARKER})
+
+    rows = before = after = 0
+    last_pk = None
+    while True:
+        batch = candidates.select_related(None).order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch.only('pk', field_name)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        pks = [obj.pk for obj in batch]
+        size = queryset.model._base_manager.filter(pk__in=pks).aggregate(size=Sum(Length(field_name)))
+        with transaction.atomic():
+            for obj in batch:
+                value = getattr(obj, field.attname)
+                setattr(obj, field.attname, Plaintext(value) if decompress else value)
+            queryset.model._base_manager.bulk_update(batch, [field_name])
+        rows += len(batch)
+        before += size['size'] or 0
+        after += queryset.model._base_manager.filter(pk__in=pks).aggregate(size=Sum(Length(field_name)))['size'] or 0
+    return rows, before, after
@@ -3,6 +3,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import UserProfile
+from .backends import normalize_email, users_by_email
 
 class CustomUserCreationForm(UserCreationForm):
     """Extended user creation form with additional fields"""
@@ -60,9 +61,9 @@ class CustomUserCreationForm(UserCreationForm):
         })
 
     def clean_email(self):
-        """Validate email uniqueness"""
-        email = self.cleaned_data.get('email')
-        if User.objects.filter(email=email).exists():
+        """Validate email uniqueness (case-insensitive)"""
+        email = normalize_email(self.cleaned_data.get('email'))
+        if users_by_email(email).exists():
             raise forms.ValidationError("A user with this email already exists.")
         return email
 
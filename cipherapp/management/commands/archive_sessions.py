@@ -0,0 +1,44 @@
+# Move inactive chat sessions into the compressed archive tier
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from cipherapp.archive import (
+    archivable_sessions, archive_inactive_sessions, get_archive_after_days, get_archive_batch_size, restore_session
+)
+from cipherapp.models import ArchivedSession, ChatSession
+
+class Command(BaseCommand):
+    help = 'Archive sessions without messages for N days (reads go through to the archive, writes restore them)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Inactivity threshold in days (default ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Sessions selected per batch (default ARCHIVE_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, help='Archive at most this many sessions')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the sessions that would be archived')
+        parser.add_argument('--restore', type=int, metavar='SESSION_ID', help='Restore one archived session instead')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            session = ChatSession.all_objects.filter(id=options['restore']).first()
+            if session is None:
+                raise CommandError(f"Session {options['restore']} does not exist")
+            restored = restore_session(session)
+            self.stdout.write(self.style.SUCCESS(f'Restored {restored} message(s) to session {session.id}'))
+            return
+
+        days = get_archive_after_days() if options['days'] is None else options['days']
+        if options['dry_run']:
+            sessions = archivable_sessions(days)
+            totals = sessions.aggregate(messages=Sum('message_count'))
+            self.stdout.write(
+                f"{sessions.count()} session(s) with {totals['messages'] or 0} message(s) inactive for {days}+ days"
+            )
+            return
+
+        sessions, messages = archive_inactive_sessions(
+            days=days, batch_size=options['batch_size'] or get_archive_batch_size(), limit=options['limit']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {sessions} session(s) with {messages} message(s)'))
+
+        totals = ArchivedSession.objects.aggregate(stored=Sum('message_count'))
+        self.stdout.write(f"Archive now holds {ArchivedSession.objects.count()} session(s), {totals['stored'] or 0} message(s)")
@@ -0,0 +1,74 @@
+# Benchmark session vs. stateless token authentication on the chat API
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cipherapp.api_auth import issue_api_token
+from cipherapp.models import ChatSession
+
+class Command(BaseCommand):
+    help = 'Compare DB queries and latency per request for session and API token auth'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per auth path')
+        parser.add_argument('--sessions', type=int, default=5, help='Chat sessions owned by the benchmark user')
+
+    def handle(self, *args, **options):
+        # Everything happens inside one transaction that is rolled back at the end
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='bench_api_auth',
+                email='bench_api_auth@example.com',
+                password='bench-pass-123'
+            )
+            for i in range(options['sessions']):
+                ChatSession.objects.create(user=user, title=f'Benchmark session {i}')
+
+            url = reverse('chat_history')
+
+            session_client = Client()
+            session_client.force_login(user)
+
+            token_client = Client(HTTP_AUTHORIZATION=f'Bearer {issue_api_token(user)}')
+
+            results = [
+                self.run_path('session', session_client, url, options['requests']),
+                self.run_path('token', token_client, url, options['requests']),
+            ]
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'path':<10}{'queries/req':>14}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for result in results:
+            self.stdout.write(
+                f"{result['path']:<10}{result['queries']:>14.2f}{result['mean']:>10.3f}"
+                f"{result['p50']:>10.3f}{result['p95']:>10.3f}"
+            )
+
+    def run_path(self, name, client, url, count):
+        """Time `count` GET requests and count their queries"""
+        latencies = []
+        total_queries = 0
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                self.stderr.write(f'{name}: unexpected status {response.status_code}')
+            total_queries += len(ctx.captured_queries)
+
+        latencies.sort()
+        return {
+            'path': name,
+            'queries': total_queries / count,
+            'mean': statistics.mean(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
@@ -0,0 +1,103 @@
+# Run the microbenchmark suite and check it against stored baselines
+import json
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cipherapp.benchmarks import run_benchmarks, compare_to_baseline
+
+class Command(BaseCommand):
+    help = 'Time rl_service and the response pipeline on fixed synthetic data and fail on regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filter', help='Only run benchmarks whose name contains this text')
+        parser.add_argument('--baseline', help='Baseline JSON file (default: BENCHMARK_BASELINE_PATH)')
+        parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+        parser.add_argument('--check', action='store_true',
+                            help='Also fail when the baseline is missing or has no entry for a benchmark that ran (CI)')
+        parser.add_argument('--tolerance', type=float, default=None,
+                            help='Allowed slowdown before failing, e.g. 0.25 for 25%% (default: BENCHMARK_TOLERANCE)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing repeats per benchmark (best is kept)')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        baseline_path = Path(options['baseline'] or getattr(
+            settings, 'BENCHMARK_BASELINE_PATH', settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+        ))
+        tolerance = options['tolerance']
+        if tolerance is None:
+            tolerance = getattr(settings, 'BENCHMARK_TOLERANCE', 0.25)
+
+        # The pipeline logs every KB/model hit; keep the output readable
+        logging.disable(logging.INFO)
+        try:
+            results = run_benchmarks(options['filter'], repeat=options['repeat'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if not results:
+            raise CommandError('No benchmarks matched')
+
+        baseline = {}
+        if baseline_path.exists():
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f).get('results', {})
+
+        rows = compare_to_baseline(results, baseline, tolerance)
+        regressions = [row for row in rows if row[4]]
+        unbaselined = [name for name in results if not baseline.get(name)]
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'results': results,
+                'baseline': str(baseline_path) if baseline else None,
+                'tolerance': tolerance,
+                'regressions': [row[0] for row in regressions],
+                'missing_baseline': unbaselined,
+            }, indent=2))
+        else:
+            self.print_table(results, {row[0]: row for row in rows})
+
+        if options['save_baseline']:
+            # Keep baselines of benchmarks that were filtered out of this run
+            baseline.update(results)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump({'results': baseline}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stderr.write(f'Baseline saved to {baseline_path}')
+            return
+
+        if options['check'] and unbaselined:
+            if not baseline:
+                raise CommandError(f'No baseline at {baseline_path}; record one with --save-baseline')
+            raise CommandError(f'{len(unbaselined)} benchmark(s) have no baseline: {", ".join(unbaselined)}')
+        if unbaselined:
+            self.stderr.write(f'{len(unbaselined)} benchmark(s) have no baseline in {baseline_path} and were not checked')
+
+        if regressions:
+            names = ', '.join(row[0] for row in regressions)
+            raise CommandError(f'{len(regressions)} benchmark(s) regressed more than {tolerance:.0%}: {names}')
+
+    def print_table(self, results, compared):
+        width = max(len(name) for name in results)
+        self.stdout.write(f"{'benchmark':<{width}}  {'per call':>12}  {'baseline':>12}  {'change':>8}")
+        for name, seconds in results.items():
+            line = f'{name:<{width}}  {format_duration(seconds):>12}'
+            if name in compared:
+                _, previous, _, ratio, regressed = compared[name]
+                change = f'{ratio - 1:+.1%}'
+                line += f'  {format_duration(previous):>12}  {change:>8}'
+                if regressed:
+                    line += '  REGRESSED'
+            self.stdout.write(line)
+
+def format_duration(seconds):
+    """Human-readable duration for one call"""
+    if seconds < 1e-6:
+        return f'{seconds * 1e9:.0f} ns'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.2f} us'
+    return f'{seconds * 1e3:.3f} ms'
@@ -0,0 +1,58 @@
+# Compress, decompress or report on CompressedTextField columns
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from cipherapp.fields import compress_rows, compressed_lookup, get_codec, get_min_length
+from cipherapp.models import ChatMessage, ResponsePattern, ResponseText
+
+def compressed_text_columns():
+    """(queryset, field name) for every compressed column, honouring PLAINTEXT_MESSAGE_TYPES"""
+    plaintext_types = getattr(settings, 'PLAINTEXT_MESSAGE_TYPES', [])
+    return [
+        (ChatMessage.objects.exclude(message_type__in=plaintext_types), 'inline_content'),
+        (ResponseText.objects.none() if 'bot' in plaintext_types else ResponseText.objects.all(), 'text'),
+        (ResponsePattern.objects.all(), 'bot_response'),
+    ]
+
+class Command(BaseCommand):
+    help = 'Compress existing long text rows in batches (after changing the threshold), undo it, or report sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows rewritten per transaction')
+        parser.add_argument('--decompress', action='store_true', help='Store every compressed row as plaintext again')
+        parser.add_argument('--report', action='store_true', help='Only report stored and original sizes')
+
+    def handle(self, *args, **options):
+        if options['report']:
+            self.report()
+            return
+
+        self.stdout.write(f'Codec: {get_codec()}, threshold: {get_min_length()} characters')
+        for queryset, field_name in compressed_text_columns():
+            if options['decompress']:
+                queryset = queryset.model.objects.all()
+            rows, before, after = compress_rows(
+                queryset, field_name, batch_size=options['batch_size'], decompress=options['decompress']
+            )
+            self.stdout.write(f'{queryset.model.__name__}.{field_name}: {rows} row(s), {before} -> {after} characters')
+
+    def report(self):
+        self.stdout.write(f"{'column':<30}{'rows':>10}{'compressed':>12}{'stored chars':>15}{'text chars':>15}{'ratio':>8}")
+        for queryset, field_name in compressed_text_columns():
+            base = queryset.model.objects.select_related(None)
+            compressed = compressed_lookup(field_name)
+            stored = base.aggregate(size=Sum(Length(field_name)))['size'] or 0
+            plain = base.exclude(compressed).aggregate(size=Sum(Length(field_name)))['size'] or 0
+            # Original size of compressed rows needs decompressing them
+            original = plain
+            compressed_rows = 0
+            for value in base.filter(compressed).values_list(field_name, flat=True).iterator():
+                original += len(str(value))
+                compressed_rows += 1
+            ratio = original / stored if stored else 1.0
+            self.stdout.write(
+                f"{queryset.model.__name__ + '.' + field_name:<30}{base.count():>10}{compressed_rows:>12}"
+                f"{stored:>15}{original:>15}{ratio:>7.2f}x"
+            )
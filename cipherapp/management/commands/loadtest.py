@@ -0,0 +1,342 @@
+# Load-testing harness for the chat, feedback, history, search and export APIs
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from cipherapp.api_auth import issue_api_token
+
+DEFAULT_MIX = 'chat=5,feedback=2,history=2,search=1,export=1'
+
+ENDPOINTS = ['chat', 'feedback', 'history', 'search', 'export']
+
+PROMPTS = [
+    'hello there',
+    'what can you do',
+    'explain how AES encryption works',
+    'tell me about caesar ciphers',
+    'how do I write a python function',
+    'create a short story about a robot',
+    'thanks for the help',
+    'what is the weather like',
+    'why is the sky blue',
+    'design a logo for my project',
+]
+
+SEARCH_TERMS = ['cipher', 'hello', 'python', 'story', 'help']
+
+# Admission control answers; counted apart from served requests and errors
+REJECTION_STATUSES = {429: 'rate_limited', 503: 'shed'}
+
+def is_served(status):
+    """2xx and 3xx; 0 (connection failed or timed out) and 4xx/5xx are errors"""
+    return 200 <= status < 400
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def latency_summary(samples):
+    """Mean, p50/p95/p99 and max in milliseconds of sorted seconds, or None without samples"""
+    if not samples:
+        return None
+    return {
+        'mean': round(sum(samples) / len(samples) * 1000, 3),
+        'p50': round(percentile(samples, 50) * 1000, 3),
+        'p95': round(percentile(samples, 95) * 1000, 3),
+        'p99': round(percentile(samples, 99) * 1000, 3),
+        'max': round(samples[-1] * 1000, 3),
+    }
+
+def parse_mix(value):
+    """Parse 'chat=5,history=2' into a weight per endpoint"""
+    mix = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint '{name}' in --mix (choose from {', '.join(ENDPOINTS)})")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}' in --mix")
+    if not mix or sum(mix.values()) <= 0:
+        raise CommandError('--mix needs at least one endpoint with a positive weight')
+    return mix
+
+class InProcessTransport:
+    """Send requests through the Django test client (no server needed)"""
+
+    def __init__(self, token):
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def request(self, method, path, params=None, payload=None):
+        if method == 'GET':
+            response = self.client.get(path, params or {})
+        else:
+            response = self.client.post(path, json.dumps(payload or {}), content_type='application/json')
+        return response.status_code, response.content
+
+    def close(self):
+        connection.close()
+
+class HTTPTransport:
+    """Send requests to a running server over HTTP"""
+
+    def __init__(self, token, base_url, timeout):
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, params=None, payload=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        data = json.dumps(payload).encode('utf-8') if method == 'POST' else None
+        req = urllib.request.Request(url, data=data, method=method, headers={
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json',
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            return 0, str(e).encode('utf-8')
+
+    def close(self):
+        pass
+
+class SimulatedUser:
+    """One user driving a weighted mix of API calls with its own session state"""
+
+    def __init__(self, transport, mix, rng):
+        self.transport = transport
+        self.endpoints = list(mix.keys())
+        self.weights = list(mix.values())
+        self.rng = rng
+        self.session_id = None
+        self.bot_message_id = None
+
+    def next_request(self, endpoint):
+        """Build (method, path, params, payload) for an endpoint"""
+        # Endpoints that need an existing conversation start one first
+        if endpoint in ('feedback', 'history', 'export') and self.bot_message_id is None:
+            endpoint = 'chat'
+
+        if endpoint == 'chat':
+            return endpoint, 'POST', '/api/chat/', None, {
+                'message': self.rng.choice(PROMPTS),
+                'session_id': self.session_id,
+            }
+        if endpoint == 'feedback':
+            return endpoint, 'POST', '/api/chat/feedback/', None, {
+                'message_id': self.bot_message_id,
+                'feedback_type': self.rng.choice(['positive', 'negative']),
+            }
+        if endpoint == 'history':
+            return endpoint, 'GET', '/api/chat/history/', {'session_id': self.session_id}, None
+        if endpoint == 'search':
+            return endpoint, 'GET', '/api/chat/search/', {'query': self.rng.choice(SEARCH_TERMS)}, None
+        return endpoint, 'POST', '/api/chat/export/', None, {
+            'session_id': self.session_id,
+            'format': self.rng.choice(['txt', 'md']),
+        }
+
+    def run(self, count, deadline, record):
+        try:
+            for _ in range(count):
+                if deadline and time.perf_counter() >= deadline:
+                    break
+                picked = self.rng.choices(self.endpoints, weights=self.weights)[0]
+                endpoint, method, path, params, payload = self.next_request(picked)
+
+                start = time.perf_counter()
+                status, body = self.transport.request(method, path, params, payload)
+                elapsed = time.perf_counter() - start
+                record(endpoint, status, elapsed)
+
+                if endpoint == 'chat' and status == 200:
+                    try:
+                        data = json.loads(body)
+                        self.session_id = data['session_id']
+                        self.bot_message_id = data['bot_message']['id']
+                    except (ValueError, KeyError):
+                        pass
+        finally:
+            self.transport.close()
+
+class Command(BaseCommand):
+    help = 'Drive concurrent simulated users against the chat APIs and report throughput and latency as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per simulated user')
+        parser.add_argument('--duration', type=float, default=0, help='Stop after this many seconds (0 = no limit)')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Endpoint weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--url', help='Base URL of a running server; omit to run in-process')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout for --url mode')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible request mixes')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the load-test users and their data afterwards')
+        parser.add_argument('--no-admission', action='store_true', help='Turn admission control off (in-process only)')
+        parser.add_argument('--user-rate', type=float, help='Override ADMISSION_USER_RATE (in-process only)')
+        parser.add_argument('--user-burst', type=int, help='Override ADMISSION_USER_BURST (in-process only)')
+        parser.add_argument('--max-concurrency', type=int, help='Override ADMISSION_MAX_CONCURRENCY (in-process only)')
+
+    def admission_overrides(self, options):
+        """Settings overrides for the admission options; a server's limits come from its own settings"""
+        overrides = {}
+        if options['no_admission']:
+            overrides['ADMISSION_ENABLED'] = False
+        for option, setting in (('user_rate', 'ADMISSION_USER_RATE'), ('user_burst', 'ADMISSION_USER_BURST'),
+                                ('max_concurrency', 'ADMISSION_MAX_CONCURRENCY')):
+            if options[option] is not None:
+                if options[option] <= 0:
+                    raise CommandError(f"--{option.replace('_', '-')} must be positive")
+                overrides[setting] = options[option]
+        if overrides and options['url']:
+            raise CommandError("Admission options only apply in-process; change the server's ADMISSION_* settings instead")
+        return overrides
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if options['users'] < 1 or options['requests'] < 1:
+            raise CommandError('--users and --requests must be at least 1')
+        overrides = self.admission_overrides(options)
+
+        users = self.get_users(options['users'])
+        seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+
+        latencies = defaultdict(list)
+        error_latencies = defaultdict(list)
+        statuses = defaultdict(lambda: defaultdict(int))
+        lock = threading.Lock()
+
+        def record(endpoint, status, elapsed):
+            with lock:
+                statuses[endpoint][status] += 1
+                # Rejections return before the pipeline runs, and failures can be
+                # fast too; either would flatter the served latencies
+                if is_served(status):
+                    latencies[endpoint].append(elapsed)
+                elif status not in REJECTION_STATUSES:
+                    error_latencies[endpoint].append(elapsed)
+
+        simulated = []
+        for i, user in enumerate(users):
+            token = issue_api_token(user)
+            if options['url']:
+                transport = HTTPTransport(token, options['url'], options['timeout'])
+            else:
+                transport = InProcessTransport(token)
+            simulated.append(SimulatedUser(transport, mix, random.Random(seed + i)))
+
+        started = time.perf_counter()
+        deadline = started + options['duration'] if options['duration'] else None
+        with override_settings(**overrides), ThreadPoolExecutor(max_workers=len(simulated)) as pool:
+            futures = [pool.submit(s.run, options['requests'], deadline, record) for s in simulated]
+            for future in futures:
+                future.result()
+        wall_time = time.perf_counter() - started
+
+        report = self.build_report(options, mix, seed, wall_time, latencies, error_latencies, statuses, overrides)
+
+        if options['cleanup']:
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def get_users(self, count):
+        """Get or create the load-test users"""
+        users = []
+        for i in range(count):
+            user, created = User.objects.get_or_create(
+                username=f'loadtest_user_{i}',
+                defaults={'email': f'loadtest_user_{i}@example.com'}
+            )
+            if created:
+                user.set_unusable_password()
+                user.save()
+            users.append(user)
+        return users
+
+    def build_report(self, options, mix, seed, wall_time, latencies, error_latencies, statuses, overrides):
+        """
+        Summarize per-endpoint throughput and latency percentiles. Requests
+        rejected by admission control (429/503) are counted under 'rejected'
+        and left out of the throughput, latencies and errors. Only 2xx and 3xx
+        answers count as served; other failures are errors with latencies of
+        their own.
+        """
+        endpoints = {}
+        total = served_total = total_errors = 0
+        total_rejected = {reason: 0 for reason in REJECTION_STATUSES.values()}
+        for endpoint in ENDPOINTS:
+            counts = statuses.get(endpoint)
+            if not counts:
+                continue
+            requests = sum(counts.values())
+            rejected = {reason: counts.get(status, 0) for status, reason in REJECTION_STATUSES.items()}
+            errors = sum(
+                n for status, n in counts.items()
+                if not is_served(status) and status not in REJECTION_STATUSES
+            )
+            samples = sorted(latencies.get(endpoint, []))
+            total += requests
+            served_total += len(samples)
+            total_errors += errors
+            for reason, n in rejected.items():
+                total_rejected[reason] += n
+            endpoints[endpoint] = {
+                'requests': requests,
+                'served': len(samples),
+                'rejected': rejected,
+                'errors': errors,
+                'status_codes': {str(status): n for status, n in sorted(counts.items())},
+                'requests_per_second': round(len(samples) / wall_time, 2),
+                'latency_ms': latency_summary(samples),
+                'error_latency_ms': latency_summary(sorted(error_latencies.get(endpoint, []))),
+            }
+
+        return {
+            'config': {
+                'mode': 'http' if options['url'] else 'in-process',
+                'url': options['url'],
+                'users': options['users'],
+                'requests_per_user': options['requests'],
+                'duration_limit': options['duration'] or None,
+                'mix': mix,
+                'seed': seed,
+                'admission_overrides': overrides,
+            },
+            'wall_time_seconds': round(wall_time, 3),
+            'total_requests': total,
+            'total_served': served_total,
+            'total_rejected': total_rejected,
+            'total_errors': total_errors,
+            'requests_per_second': round(served_total / wall_time, 2) if wall_time else None,
+            'endpoints': endpoints,
+        }
@@ -0,0 +1,30 @@
+# Purge soft-deleted chat sessions in bounded batches
+from django.core.management.base import BaseCommand
+
+from cipherapp.deletion import purge_session, get_purge_batch_size
+from cipherapp.models import ChatSession
+
+class Command(BaseCommand):
+    help = 'Remove the rows of soft-deleted chat sessions in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Messages deleted per transaction (default: SESSION_PURGE_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, default=None, help='Purge at most this many sessions')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or get_purge_batch_size()
+        pending = ChatSession.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at')
+        session_ids = list(pending.values_list('id', flat=True)[:options['limit']])
+
+        if not session_ids:
+            self.stdout.write('No soft-deleted sessions to purge.')
+            return
+
+        total = 0
+        for session_id in session_ids:
+            removed = purge_session(session_id, batch_size=batch_size)
+            total += removed
+            self.stdout.write(f'Purged session {session_id}: {removed} messages')
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {len(session_ids)} session(s), {total} messages'))
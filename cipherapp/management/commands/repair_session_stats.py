@@ -0,0 +1,59 @@
+# Backfill or repair the denormalized ChatSession message stats
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, Q
+
+from cipherapp.models import ChatSession
+from cipherapp.session_stats import refresh_session_stats
+
+class Command(BaseCommand):
+    help = 'Recompute message_count, last_message_at and last_message_preview for chat sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Sessions recomputed per transaction')
+        parser.add_argument('--user', help='Only sessions of this username')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report sessions whose count or last message time has drifted')
+
+    def handle(self, *args, **options):
+        sessions = ChatSession.all_objects.order_by('id')
+        if options['user']:
+            sessions = sessions.filter(user__username=options['user'])
+
+        if options['check']:
+            self.check_drift(sessions)
+            return
+
+        batch_size = max(1, options['batch_size'])
+        total = 0
+        last_id = 0
+        while True:
+            batch_ids = list(sessions.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+            if not batch_ids:
+                break
+            with transaction.atomic():
+                total += refresh_session_stats(ChatSession.all_objects.filter(id__in=batch_ids))
+            last_id = batch_ids[-1]
+            self.stdout.write(f'Recomputed {total} session(s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed stats for {total} session(s)'))
+
+    def check_drift(self, sessions):
+        drifted = sessions.filter(archived_at__isnull=True).annotate(
+            actual_count=Count('messages'),
+            actual_last=Max('messages__timestamp'),
+        ).filter(
+            ~Q(message_count=F('actual_count'))
+            | (Q(actual_last__isnull=False) & ~Q(last_message_at=F('actual_last')))
+        )
+        found = 0
+        for session in drifted.iterator():
+            found += 1
+            self.stdout.write(
+                f'Session {session.id}: message_count {session.message_count} (actual {session.actual_count}), '
+                f'last_message_at {session.last_message_at} (actual {session.actual_last})'
+            )
+        if found:
+            self.stdout.write(self.style.WARNING(f'{found} session(s) drifted; run without --check to repair'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All session stats are consistent'))
@@ -0,0 +1,77 @@
+# Replay stored conversations through the response pipeline and report throughput
+import json
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cipherapp.replay import (
+    export_messages, replay_pool, replay_single, stream_database_messages, stream_file_messages,
+)
+
+class Command(BaseCommand):
+    help = 'Run stored user messages through generate_bot_response, single-threaded and across a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Replay a JSON lines export instead of the database')
+        parser.add_argument('--export', help='Write the messages to this JSON lines file and exit')
+        parser.add_argument('--limit', type=int, default=1000, help='Messages to replay (0 = all)')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='Process pool size')
+        parser.add_argument('--mode', choices=['single', 'pool', 'both'], default='both')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Messages read and sent to a worker at a time')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--processes and --chunk-size must be at least 1')
+        if options['file'] and not os.path.exists(options['file']):
+            raise CommandError(f"No such file: {options['file']}")
+
+        def chunks():
+            # A fresh stream per run, so no run holds every message in memory
+            if options['file']:
+                return stream_file_messages(options['file'], options['limit'], options['chunk_size'])
+            return stream_database_messages(options['limit'], options['chunk_size'])
+
+        if options['export']:
+            count = export_messages(chunks(), options['export'])
+            self.stdout.write(self.style.SUCCESS(f"Exported {count} message(s) to {options['export']}"))
+            return
+
+        report = {'source': options['file'] or 'database'}
+        logging.disable(logging.INFO)
+        try:
+            if options['mode'] in ('single', 'both'):
+                report['single'] = replay_single(chunks())
+            if options['mode'] in ('pool', 'both'):
+                report['pool'] = replay_pool(chunks(), options['processes'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Source: {report['source']}")
+        for name in ('single', 'pool'):
+            run = report.get(name)
+            if run is None:
+                continue
+            if not run['messages']:
+                raise CommandError('No user messages to replay')
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name} ({run['workers']} worker{'s' if run['workers'] != 1 else ''}): "
+                f"{run['messages']} messages in {run['seconds']}s = {run['messages_per_second']} messages/s"
+            ))
+            for stage, values in run['stages'].items():
+                share = f"{values['share']:.1%}" if values['share'] is not None else '-'
+                self.stdout.write(f"  {stage:<10}{values['seconds']:>10.3f}s {share:>7}")
+            if run['compared']:
+                self.stdout.write(
+                    f"  Replies changed: {run['changed']} of {run['compared']} ({run['changed_fraction']:.1%})"
+                )
+        if 'single' in report and 'pool' in report and report['single']['messages_per_second']:
+            speedup = report['pool']['messages_per_second'] / report['single']['messages_per_second']
+            self.stdout.write('')
+            self.stdout.write(f"Pool speedup: {speedup:.2f}x on {report['pool']['workers']} processes")
@@ -0,0 +1,33 @@
+# Report how much storage the shared ResponseText store saves
+import json
+
+from django.core.management.base import BaseCommand
+
+from cipherapp.response_store import storage_report
+
+class Command(BaseCommand):
+    help = 'Show bot message text deduplication and the storage it saves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        report = storage_report()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        logical = report['logical_chars']
+        ratio = logical / report['stored_chars'] if report['stored_chars'] else 0
+        dedupe = logical / report['text_chars'] if report['text_chars'] else 0
+        compression = report['text_chars'] / report['stored_chars'] if report['stored_chars'] else 0
+        self.stdout.write(f"Bot messages:           {report['bot_messages']}")
+        self.stdout.write(f"  sharing a text:       {report['deduplicated_messages']}")
+        self.stdout.write(f"  stored inline:        {report['inline_messages']} ({report['inline_chars']} characters)")
+        self.stdout.write(f"Shared texts:           {report['unique_texts']} ({report['unreferenced_texts']} unreferenced)")
+        self.stdout.write(f"Characters referenced:  {logical}")
+        self.stdout.write(f"Characters of text:     {report['text_chars']} ({dedupe:.1f}x deduplication)")
+        self.stdout.write(f"Characters stored:      {report['stored_chars']} ({compression:.1f}x compression)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {report['saved_chars']} characters ({ratio:.1f}x overall)"
+        ))
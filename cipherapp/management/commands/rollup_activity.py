@@ -0,0 +1,31 @@
+# Roll raw UserActivity rows up into hourly/daily counts and prune old raw rows
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cipherapp.activity import prune_activity, rolled_up_until, rollup_activity
+
+class Command(BaseCommand):
+    help = 'Fold closed hours of user activity into the rollup tables and apply the retention policy (run hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild-since', metavar='YYYY-MM-DD',
+                            help='Recompute the rollups from this date (limited to raw rows still kept)')
+        parser.add_argument('--no-prune', action='store_true', help='Roll up without deleting old rows')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['rebuild_since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['rebuild_since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--rebuild-since must be a date like 2024-01-31')
+
+        hours = rollup_activity(since=since)
+        self.stdout.write(f'Rolled up {hours} hour(s); rollups cover activity before {rolled_up_until()}')
+
+        if not options['no_prune']:
+            raw_deleted, hourly_deleted = prune_activity()
+            self.stdout.write(f'Pruned {raw_deleted} raw activity row(s) and {hourly_deleted} hourly row(s)')
+        self.stdout.write(self.style.SUCCESS('Activity rollup complete'))
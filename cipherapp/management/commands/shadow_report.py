@@ -0,0 +1,64 @@
+# Compare a shadow-evaluated candidate chatbot model with the active one
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cipherapp.shadow import shadow_report
+
+class Command(BaseCommand):
+    help = 'Compare latency, memory and output divergence of the candidate chatbot model with the active one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--candidate', help='Candidate model file name (default: CHATBOT_CANDIDATE_MODEL_PATH)')
+        parser.add_argument('--days', type=float, default=7, help='Only use evaluations from the last N days (0 = all)')
+        parser.add_argument('--no-memory', action='store_true', help='Skip loading both models to measure their memory')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        report = shadow_report(options['candidate'], since, measure_memory=not options['no_memory'])
+        if report['candidate'] is None:
+            raise CommandError('No candidate: set CHATBOT_CANDIDATE_MODEL_PATH or pass --candidate')
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Candidate:        {report['candidate']}")
+        self.stdout.write(f"Compared calls:   {report['compared_calls']} ({report['messages']} messages)")
+        self.stdout.write(f"Failed calls:     {report['failed_calls']}")
+        for error, count in report['top_errors']:
+            self.stdout.write(f"  {count} x {error}")
+        if not report['compared_calls']:
+            self.stdout.write(self.style.WARNING('No compared calls yet; is CHATBOT_SHADOW_SAMPLE_RATE > 0?'))
+        else:
+            self.stdout.write('')
+            self.stdout.write(f"{'predict() ms':<20}{'active':>12}{'candidate':>12}{'ratio':>10}")
+            for key in ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'):
+                active = report['latency']['active'][key]
+                candidate = report['latency']['candidate'][key]
+                ratio = f" {candidate / active:.2f}x" if active else '-'
+                self.stdout.write(f"  {key:<18}{active:>12.3f}{candidate:>12.3f}{ratio:>10}")
+            self.stdout.write('')
+            self.stdout.write(f"Identical answers: {report['identical_rate']:.1%}")
+            self.stdout.write(f"Mean similarity:   {report['mean_similarity']:.3f}")
+
+        memory = report.get('memory')
+        if memory:
+            self.stdout.write('')
+            for name in ('active', 'candidate'):
+                result = memory[name]
+                if result is None:
+                    continue
+                if 'error' in result:
+                    self.stdout.write(f"{name.capitalize()} model memory: could not load ({result['error']})")
+                else:
+                    self.stdout.write(
+                        f"{name.capitalize()} model memory: {result['memory_bytes'] / 1e6:.1f} MB with its imports "
+                        f"(peak {result['peak_bytes'] / 1e6:.1f} MB while loading, {result['load_seconds']:.2f}s)"
+                    )
+
+        slowdown = report['slowdown']
+        if slowdown and slowdown['p95_ms'] and slowdown['p95_ms'] > 1.5:
+            self.stdout.write(self.style.WARNING(f"Candidate p95 is {slowdown['p95_ms']}x the active model's"))
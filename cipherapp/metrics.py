@@ -0,0 +1,351 @@
+# Cross-process metrics with Prometheus text exposition
+#
+# Every worker process writes its counters and histogram buckets into its own
+# memory-mapped file under METRICS_DIR, so writes never contend across
+# processes and need only a cheap in-process lock. The /metrics view sums the
+# files of live workers and deletes those of exited processes, so their
+# counters drop out (Prometheus rate() reads that as a counter reset) and
+# gauges never keep a crashed worker's level. Files are named after the metric
+# layout, so a deploy that changes the layout starts fresh instead of
+# misreading old files. manage.py commands other than runserver keep their
+# metrics in process-local memory (see isolate_command_runs).
+import glob
+import hashlib
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+# Seconds; suits both sub-millisecond pipeline stages and slow requests
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGES = ('rules', 'kb', 'model', 'rl', 'persist')
+RESPONSE_SOURCES = ('rule', 'knowledge_base', 'chatbot_model', 'fallback')
+RL_OVERRIDES = ('pattern', 'enhanced', 'template')
+ADMISSION_REJECTIONS = ('rate_limited', 'queue_full', 'queue_timeout')
+COALESCE_ROLES = ('leader', 'follower', 'timeout', 'abandoned')
+SHADOW_OUTCOMES = ('compared', 'error', 'dropped')
+SHADOW_MODELS = ('active', 'candidate')
+
+# Set for manage.py commands; subprocesses (pool workers, startup benchmarks) inherit it
+PROCESS_LOCAL_ENV = 'CIPHERDEPTH_METRICS_PROCESS_LOCAL'
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+def isolate_command_runs(argv):
+    """Keep benchmark, load test and maintenance commands out of the workers' METRICS_DIR"""
+    program = os.path.basename(argv[0]) if argv else ''
+    if program in ('manage.py', 'django-admin') and argv[1:2] != ['runserver']:
+        os.environ[PROCESS_LOCAL_ENV] = '1'
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists but belongs to another user
+        return True
+    return True
+
+def file_pid(path):
+    """The worker PID in a metrics_<layout>_<pid>.db file name, or None"""
+    try:
+        return int(os.path.basename(path).rsplit('_', 1)[1].split('.', 1)[0])
+    except (IndexError, ValueError):
+        return None
+
+def tracked_endpoints():
+    """URL names of the app's views, plus 'other' for everything else"""
+    from .urls import urlpatterns
+    names = sorted({pattern.name for pattern in urlpatterns if pattern.name})
+    return tuple(names) + ('other',)
+
+class Metric:
+    """A metric with at most one label whose values are fixed up front"""
+    kind = None
+
+    def __init__(self, name, documentation, label=None, values=None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values = values
+
+    def label_values(self):
+        if self.label is None:
+            return (None,)
+        values = self._values() if callable(self._values) else self._values
+        return tuple(values)
+
+    def width(self):
+        """Number of float slots one series occupies"""
+        return 1
+
+    def slot(self, label_value):
+        return registry.slot(self, label_value)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, label_value=None, amount=1):
+        if not is_enabled():
+            return
+        base = self.slot(label_value)
+        if base is not None:
+            registry.add(((base, amount),))
+
+    def totals(self):
+        """{label value: total across all workers}"""
+        values = registry.collect()
+        return {
+            label_value: values[registry.slot(self, label_value)]
+            for label_value in self.label_values()
+        }
+
+class Gauge(Counter):
+    """A level each worker moves up and down; the exposed value is the sum over workers"""
+    kind = 'gauge'
+
+    def dec(self, label_value=None, amount=1):
+        self.inc(label_value, -amount)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label=None, values=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label, values)
+        self.buckets = tuple(buckets)
+
+    def width(self):
+        # one slot per bucket, +Inf, sum, count
+        return len(self.buckets) + 3
+
+    def observe(self, value, label_value=None):
+        if not is_enabled():
+            return
+        base = self.slot(label_value)
+        if base is None:
+            return
+        n = len(self.buckets)
+        registry.add((
+            (base + bisect_left(self.buckets, value), 1),
+            (base + n + 1, value),
+            (base + n + 2, 1),
+        ))
+
+class MetricsRegistry:
+    """Fixed slot layout for all metrics, backed by this process's mmap file"""
+
+    def __init__(self):
+        self.metrics = []
+        self._offsets = None
+        self._size = 0
+        self._layout_id = None
+        self._view = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def _build_layout(self):
+        offsets = {}
+        size = 0
+        signature = []
+        for metric in self.metrics:
+            for label_value in metric.label_values():
+                offsets[(metric.name, label_value)] = size
+                signature.append(f'{metric.name}:{label_value}:{metric.width()}')
+                size += metric.width()
+        self._size = size
+        self._layout_id = hashlib.sha1('|'.join(signature).encode('utf-8')).hexdigest()[:12]
+        self._offsets = offsets
+
+    def slot(self, metric, label_value):
+        """Offset of a series; unknown label values map to 'other' when available"""
+        if self._offsets is None:
+            with self._lock:
+                if self._offsets is None:
+                    self._build_layout()
+        offset = self._offsets.get((metric.name, label_value))
+        if offset is None:
+            offset = self._offsets.get((metric.name, 'other'))
+        return offset
+
+    def _directory(self):
+        if os.environ.get(PROCESS_LOCAL_ENV):
+            return None
+        directory = getattr(settings, 'METRICS_DIR', None)
+        return str(directory) if directory else None
+
+    def _open_storage(self):
+        nbytes = self._size * 8
+        directory = self._directory()
+        if directory is None:
+            # Process-local only; /metrics then shows just this worker
+            buffer = mmap.mmap(-1, nbytes)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'metrics_{self._layout_id}_{os.getpid()}.db')
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                # Start from zero even if an exited process with the same PID left a file
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, nbytes)
+                buffer = mmap.mmap(fd, nbytes)
+            finally:
+                os.close(fd)
+        return memoryview(buffer).cast('d')
+
+    def add(self, increments):
+        """Apply (slot, amount) increments atomically with respect to this process"""
+        with self._lock:
+            if self._view is None:
+                self._view = self._open_storage()
+            view = self._view
+            for slot, amount in increments:
+                view[slot] += amount
+
+    def collect(self):
+        """Slot values summed across every worker's file"""
+        if self._offsets is None:
+            with self._lock:
+                if self._offsets is None:
+                    self._build_layout()
+        totals = [0.0] * self._size
+        directory = self._directory()
+        if directory is None:
+            with self._lock:
+                if self._view is not None:
+                    totals = list(self._view)
+            return totals
+
+        current = f'metrics_{self._layout_id}_'
+        for path in glob.glob(os.path.join(directory, 'metrics_*_*.db')):
+            pid = file_pid(path)
+            if pid is not None and not pid_alive(pid):
+                # Nothing writes to an exited worker's file any more
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not os.path.basename(path).startswith(current):
+                continue
+            values = array('d')
+            try:
+                with open(path, 'rb') as f:
+                    values.frombytes(f.read(self._size * 8))
+            except (OSError, ValueError):
+                continue
+            for i, value in enumerate(values):
+                totals[i] += value
+        return totals
+
+    def reset_after_fork(self):
+        # Child processes must write to their own file, not the parent's
+        self._view = None
+        self._lock = threading.Lock()
+
+    def render_prometheus(self):
+        """All metrics in Prometheus text exposition format 0.0.4"""
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for label_value in metric.label_values():
+                base = self._offsets[(metric.name, label_value)]
+                label = f'{metric.label}="{label_value}"' if metric.label else ''
+                if metric.kind == 'histogram':
+                    cumulative = 0.0
+                    bounds = [format_value(b) for b in metric.buckets] + ['+Inf']
+                    for i, bound in enumerate(bounds):
+                        cumulative += values[base + i]
+                        labels = f'{label},le="{bound}"' if label else f'le="{bound}"'
+                        lines.append(f'{metric.name}_bucket{{{labels}}} {format_value(cumulative)}')
+                    suffix = f'{{{label}}}' if label else ''
+                    n = len(metric.buckets)
+                    lines.append(f'{metric.name}_sum{suffix} {format_value(values[base + n + 1])}')
+                    lines.append(f'{metric.name}_count{suffix} {format_value(values[base + n + 2])}')
+                else:
+                    suffix = f'{{{label}}}' if label else ''
+                    lines.append(f'{metric.name}{suffix} {format_value(values[base])}')
+        return '\n'.join(lines) + '\n'
+
+def format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+registry = MetricsRegistry()
+os.register_at_fork(after_in_child=registry.reset_after_fork)
+
+response_source = registry.register(Counter(
+    'cipherdepth_response_source_total',
+    'Bot responses by the pipeline step that produced the base response',
+    label='source', values=RESPONSE_SOURCES,
+))
+rl_overrides = registry.register(Counter(
+    'cipherdepth_rl_override_total',
+    'Base responses replaced or rewritten by the RL service',
+    label='kind', values=RL_OVERRIDES,
+))
+stage_duration = registry.register(Histogram(
+    'cipherdepth_stage_duration_seconds',
+    'Time spent in each response pipeline stage',
+    label='stage', values=STAGES,
+))
+request_duration = registry.register(Histogram(
+    'cipherdepth_request_duration_seconds',
+    'Request latency by endpoint',
+    label='endpoint', values=tracked_endpoints,
+))
+request_db_duration = registry.register(Histogram(
+    'cipherdepth_request_db_duration_seconds',
+    'Database time per request',
+))
+rl_model_reloads = registry.register(Counter(
+    'cipherdepth_rl_model_reloads_total',
+    'RL model reloads after another worker saved it or the copy aged out',
+))
+db_queries = registry.register(Counter(
+    'cipherdepth_db_queries_total',
+    'Database queries executed while serving requests',
+))
+admission_rejections = registry.register(Counter(
+    'cipherdepth_admission_rejections_total',
+    'Pipeline requests refused before any work: 429 rate_limited, 503 queue_full or queue_timeout',
+    label='reason', values=ADMISSION_REJECTIONS,
+))
+pipeline_in_flight = registry.register(Gauge(
+    'cipherdepth_pipeline_in_flight',
+    'Requests currently running the response pipeline',
+))
+pipeline_queue_depth = registry.register(Gauge(
+    'cipherdepth_pipeline_queue_depth',
+    'Requests waiting for a pipeline slot',
+))
+admission_wait = registry.register(Histogram(
+    'cipherdepth_admission_wait_seconds',
+    'Time queued requests waited for a pipeline slot',
+))
+coalesced_calls = registry.register(Counter(
+    'cipherdepth_coalesced_calls_total',
+    'Response computations by role: leader ran it, follower shared its result, timeout gave up waiting and ran it, abandoned ran it after the leader was cancelled',
+    label='role', values=COALESCE_ROLES,
+))
+shadow_samples = registry.register(Counter(
+    'cipherdepth_shadow_samples_total',
+    'Sampled model calls replayed against the candidate model, by outcome',
+    label='outcome', values=SHADOW_OUTCOMES,
+))
+shadow_model_seconds = registry.register(Histogram(
+    'cipherdepth_shadow_model_seconds',
+    'predict() time of the active and candidate models on the same sampled inputs',
+    label='model', values=SHADOW_MODELS,
+))
@@ -0,0 +1,206 @@
+# Middleware for CipherApp
+import cProfile
+import logging
+import mimetypes
+import os
+import random
+import re
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.middleware.gzip import GZipMiddleware
+from django.utils._os import safe_join
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+from .profiling import start_collecting, stop_collecting
+
+logger = logging.getLogger(__name__)
+
+# Content-hashed names written by ManifestStaticFilesStorage, e.g. home.3f2a9c1b7d10.js
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+# Accept-Encoding token -> (file suffix, Content-Encoding), in order of preference
+ENCODINGS = [
+    ('br', '.br', 'br'),
+    ('gzip', '.gz', 'gzip'),
+]
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class PrecompressedStaticMiddleware:
+    """
+    Serve collected static files from STATIC_ROOT, picking the .br/.gz variant
+    written by CompressedManifestStaticFilesStorage from Accept-Encoding.
+
+    Content-hashed files get far-future immutable caching; other files get
+    STATIC_MAX_AGE. Requests for files not in STATIC_ROOT fall through, so the
+    development static view keeps working before collectstatic has run.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_url = settings.STATIC_URL
+        self.static_root = str(settings.STATIC_ROOT) if settings.STATIC_ROOT else None
+        self.max_age = getattr(settings, 'STATIC_MAX_AGE', 3600)
+
+    def __call__(self, request):
+        if self.static_root and request.method in ('GET', 'HEAD') and request.path.startswith(self.static_url):
+            response = self.serve(request, request.path[len(self.static_url):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        """Build a response for a static file, or None if it is not collected"""
+        try:
+            path = safe_join(self.static_root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        # Each encoded variant is its own representation with its own ETag
+        serve_path, encoding = self.choose_variant(request, path)
+        stat = os.stat(serve_path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path)
+            response = FileResponse(open(serve_path, 'rb'), content_type=content_type or 'application/octet-stream')
+            if encoding:
+                response['Content-Encoding'] = encoding
+
+        response['ETag'] = etag
+        if HASHED_NAME_RE.search(name):
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = f'public, max-age={self.max_age}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def choose_variant(self, request, path):
+        """Pick the best precompressed file the client accepts"""
+        accepted = set()
+        for token in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            coding, _, params = token.partition(';')
+            if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(coding.strip().lower())
+        for token, suffix, encoding in ENCODINGS:
+            if token in accepted and os.path.isfile(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+class JsonGzipMiddleware(GZipMiddleware):
+    """
+    Gzip JSON responses of at least API_GZIP_MIN_BYTES for clients that accept
+    it (full chat histories, search results). HTML pages are left alone, and
+    API_GZIP_MIN_BYTES = None turns compression off.
+    """
+
+    def process_response(self, request, response):
+        min_bytes = getattr(settings, 'API_GZIP_MIN_BYTES', 8192)
+        if min_bytes is None or response.streaming:
+            return response
+        if not response.get('Content-Type', '').startswith('application/json') or len(response.content) < min_bytes:
+            return response
+        return super().process_response(request, response)
+
+class ProfilingMiddleware:
+    """
+    Per-request DB and pipeline stage timings, reported in a Server-Timing header
+    and recorded as endpoint latency / DB time metrics.
+
+    With PROFILE_SAMPLE_RATE > 0, that fraction of requests also runs under
+    cProfile, and profiles of requests slower than PROFILE_SLOW_MS are written
+    to PROFILE_DIR as .prof files. With Server-Timing, metrics and sampling all
+    off the middleware passes requests straight through.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING_ENABLED', False)
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_seconds = getattr(settings, 'PROFILE_SLOW_MS', 500) / 1000
+        self.profile_dir = getattr(settings, 'PROFILE_DIR', None)
+        self.record_metrics = metrics.is_enabled()
+
+    def __call__(self, request):
+        profiler = None
+        if self.sample_rate and self.profile_dir and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+
+        if not self.server_timing and not self.record_metrics and profiler is None:
+            return self.get_response(request)
+
+        timings, token = start_collecting()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self.time_query(timings)):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            stop_collecting(token)
+        elapsed = time.perf_counter() - start
+
+        if self.record_metrics:
+            self.record_request_metrics(request, timings, elapsed)
+        if self.server_timing:
+            response['Server-Timing'] = self.format_server_timing(timings, elapsed)
+        if profiler is not None and elapsed >= self.slow_seconds:
+            self.dump_profile(profiler, request, elapsed)
+        return response
+
+    def time_query(self, timings):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings.db_time += time.perf_counter() - start
+                timings.db_queries += 1
+        return wrapper
+
+    def record_request_metrics(self, request, timings, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match and match.url_name else 'other'
+        metrics.request_duration.observe(elapsed, endpoint)
+        metrics.request_db_duration.observe(timings.db_time)
+        if timings.db_queries:
+            metrics.db_queries.inc(amount=timings.db_queries)
+
+    def format_server_timing(self, timings, elapsed):
+        """Server-Timing value: total, db and one entry per pipeline stage"""
+        metrics = [
+            f'total;dur={elapsed * 1000:.2f}',
+            f'db;dur={timings.db_time * 1000:.2f};desc="{timings.db_queries} queries"',
+        ]
+        for name, (seconds, count) in timings.stages.items():
+            metric = f'{name};dur={seconds * 1000:.2f}'
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+    def dump_profile(self, profiler, request, elapsed):
+        """Write a slow request's profile to PROFILE_DIR"""
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            filename = f'{stamp}-{request.method}-{slug}-{elapsed * 1000:.0f}ms.prof'
+            profiler.dump_stats(os.path.join(self.profile_dir, filename))
+            logger.info(f"Wrote profile for slow request {request.path} ({elapsed * 1000:.0f} ms): {filename}")
+        except Exception as e:
+            logger.error(f"Error writing request profile: {e}")
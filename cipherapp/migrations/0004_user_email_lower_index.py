@@ -0,0 +1,57 @@
+# Case-insensitive email index on auth_user for cipherapp.backends.EmailBackend
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import Lower
+
+INDEX_NAME = 'cipherapp_user_email_lower_idx'
+
+
+def report_duplicate_emails(User):
+    """Print every email shared (case-insensitively) by more than one account"""
+    duplicates = (
+        User.objects.exclude(email='')
+        .annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(accounts=Count('id'))
+        .filter(accounts__gt=1)
+        .order_by('email_lower')
+    )
+    duplicates = list(duplicates)
+    if duplicates:
+        print(f"\n  Found {len(duplicates)} email(s) shared by several accounts:")
+        for row in duplicates:
+            usernames = User.objects.annotate(email_lower=Lower('email')).filter(
+                email_lower=row['email_lower']
+            ).values_list('username', flat=True)
+            print(f"    {row['email_lower']}: {', '.join(usernames)}")
+        print("  Building a non-unique index; merge these accounts and re-run this migration to enforce uniqueness.")
+    return duplicates
+
+
+def build_email_index(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    if report_duplicate_emails(User):
+        index = models.Index(Lower('email'), name=INDEX_NAME)
+        schema_editor.add_index(User, index)
+    else:
+        constraint = models.UniqueConstraint(Lower('email'), name=INDEX_NAME, condition=~Q(email=''))
+        schema_editor.add_constraint(User, constraint)
+
+
+def drop_email_index(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    schema_editor.remove_index(User, models.Index(Lower('email'), name=INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cipherapp', '0003_reinforcementlearningmodel_responsepattern_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_email_index, drop_email_index),
+    ]
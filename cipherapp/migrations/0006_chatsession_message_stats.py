@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:06
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+import django.utils.timezone
+
+
+def backfill_message_stats(apps, schema_editor):
+    """Fill the new columns from the messages table (manage.py repair_session_stats does the same)"""
+    ChatSession = apps.get_model('cipherapp', 'ChatSession')
+    ChatMessage = apps.get_model('cipherapp', 'ChatMessage')
+    messages = ChatMessage.objects.filter(session=OuterRef('pk'))
+    latest = messages.order_by('-timestamp', '-id')
+    ChatSession.objects.update(
+        message_count=Coalesce(
+            Subquery(messages.order_by().values('session').annotate(count=Count('id')).values('count')),
+            Value(0),
+        ),
+        last_message_preview=Coalesce(
+            Subquery(latest.annotate(preview=Substr('content', 1, 100)).values('preview')[:1]),
+            Value(''),
+        ),
+        last_message_at=Coalesce(Subquery(latest.values('timestamp')[:1]), F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cipherapp', '0005_chatsession_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chatsession',
+            options={'ordering': ['-last_message_at']},
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp'], name='chatmessage_session_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', '-last_message_at'], name='chatsession_user_recent_idx'),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+    ]
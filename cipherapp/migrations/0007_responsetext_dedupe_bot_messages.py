@@ -0,0 +1,113 @@
+# Content-addressed ResponseText store; moves existing bot message text into it
+
+import hashlib
+
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+BATCH_SIZE = 2000
+
+
+def dedupe_bot_messages(apps, schema_editor):
+    """
+    Point every bot message at a shared ResponseText and empty its inline copy.
+
+    Each batch commits on its own; an interrupted run resumes where it stopped
+    because moved messages no longer match `pending`.
+    """
+    ChatMessage = apps.get_model('cipherapp', 'ChatMessage')
+    ResponseText = apps.get_model('cipherapp', 'ResponseText')
+
+    pending = ChatMessage.objects.filter(message_type='bot', response_text__isnull=True).exclude(inline_content='')
+    messages_moved = 0
+    inline_chars = 0
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id).order_by('id').values_list('id', 'inline_content')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        by_digest = {}
+        for message_id, text in batch:
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            by_digest.setdefault(digest, (text, []))[1].append(message_id)
+            inline_chars += len(text)
+
+        with transaction.atomic():
+            existing = set(ResponseText.objects.filter(digest__in=list(by_digest)).values_list('digest', flat=True))
+            ResponseText.objects.bulk_create([
+                ResponseText(digest=digest, text=text)
+                for digest, (text, _) in by_digest.items() if digest not in existing
+            ])
+            ids = dict(ResponseText.objects.filter(digest__in=list(by_digest)).values_list('digest', 'id'))
+            for digest, (_, message_ids) in by_digest.items():
+                ChatMessage.objects.filter(id__in=message_ids).update(response_text_id=ids[digest], inline_content='')
+        messages_moved += len(batch)
+
+    if messages_moved:
+        stored_chars = sum(len(text) for text in ResponseText.objects.values_list('text', flat=True).iterator())
+        print(
+            f"\n  Deduplicated {messages_moved} bot message(s) into "
+            f"{ResponseText.objects.count()} shared text(s): {inline_chars} characters inline before, "
+            f"{stored_chars} stored now ({inline_chars - stored_chars} saved)."
+        )
+
+
+def inline_bot_messages(apps, schema_editor):
+    """Copy shared text back onto each message so the store can be dropped"""
+    ChatMessage = apps.get_model('cipherapp', 'ChatMessage')
+    ResponseText = apps.get_model('cipherapp', 'ResponseText')
+    pending = ChatMessage.objects.filter(response_text__isnull=False)
+    while True:
+        batch = list(pending.order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic():
+            ChatMessage.objects.filter(id__in=batch).update(
+                inline_content=Subquery(ResponseText.objects.filter(id=OuterRef('response_text_id')).values('text')[:1]),
+                response_text=None,
+            )
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are never locked for long
+    atomic = False
+
+    dependencies = [
+        ('cipherapp', '0006_chatsession_message_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # The column keeps its name; only the model field is renamed
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name='chatmessage',
+                    old_name='content',
+                    new_name='inline_content',
+                ),
+                migrations.AlterField(
+                    model_name='chatmessage',
+                    name='inline_content',
+                    field=models.TextField(blank=True, db_column='content'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='response_text',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='messages', to='cipherapp.responsetext'),
+        ),
+        migrations.RunPython(dedupe_bot_messages, inline_bot_messages),
+    ]
@@ -0,0 +1,69 @@
+# Compress long message, shared response and pattern text in place
+
+from django.conf import settings
+from django.db import migrations
+
+import cipherapp.fields
+from cipherapp.fields import compress_rows
+
+BATCH_SIZE = 500
+
+
+def _targets(apps):
+    ChatMessage = apps.get_model('cipherapp', 'ChatMessage')
+    ResponseText = apps.get_model('cipherapp', 'ResponseText')
+    ResponsePattern = apps.get_model('cipherapp', 'ResponsePattern')
+    plaintext_types = getattr(settings, 'PLAINTEXT_MESSAGE_TYPES', [])
+    return [
+        (ChatMessage.objects.exclude(message_type__in=plaintext_types), 'inline_content'),
+        (ResponseText.objects.all(), 'text'),
+        (ResponsePattern.objects.all(), 'bot_response'),
+    ]
+
+
+def compress_existing_rows(apps, schema_editor):
+    for queryset, field_name in _targets(apps):
+        rows, before, after = compress_rows(queryset, field_name, batch_size=BATCH_SIZE)
+        if rows:
+            print(
+                f"\n  {queryset.model.__name__}.{field_name}: compressed {rows} row(s), "
+                f"{before} -> {after} characters"
+            )
+
+
+def decompress_existing_rows(apps, schema_editor):
+    for queryset, field_name in _targets(apps):
+        compress_rows(queryset.model.objects.all(), field_name, batch_size=BATCH_SIZE, decompress=True)
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables are never locked for long
+    atomic = False
+
+    dependencies = [
+        ('cipherapp', '0007_responsetext_dedupe_bot_messages'),
+    ]
+
+    operations = [
+        # Same TEXT columns; only how Django reads and writes them changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='chatmessage',
+                    name='inline_content',
+                    field=cipherapp.fields.CompressedTextField(blank=True, db_column='content', plaintext_when='keeps_plaintext'),
+                ),
+                migrations.AlterField(
+                    model_name='responsepattern',
+                    name='bot_response',
+                    field=cipherapp.fields.CompressedTextField(),
+                ),
+                migrations.AlterField(
+                    model_name='responsetext',
+                    name='text',
+                    field=cipherapp.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+        migrations.RunPython(compress_existing_rows, decompress_existing_rows),
+    ]
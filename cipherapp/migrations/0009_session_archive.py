@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cipherapp', '0008_compressed_text_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedSession',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='cipherapp.chatsession')),
+                ('payload', models.BinaryField()),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('first_message_id', models.BigIntegerField(null=True)),
+                ('last_message_id', models.BigIntegerField(null=True)),
+                ('original_size', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'first_message_id'], name='archivedsession_user_msg_idx')],
+            },
+        ),
+    ]
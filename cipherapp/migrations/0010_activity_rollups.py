@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('cipherapp', '0009_session_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50)),
+                ('bucket', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserActivityHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['timestamp'], name='useractivity_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='useractivityhourly',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='useractivitydaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='useractivityhourly',
+            index=models.Index(fields=['bucket', 'action'], name='activityhourly_bucket_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='useractivityhourly',
+            unique_together={('user', 'action', 'bucket')},
+        ),
+        migrations.AddIndex(
+            model_name='useractivitydaily',
+            index=models.Index(fields=['bucket', 'action'], name='activitydaily_bucket_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='useractivitydaily',
+            unique_together={('user', 'action', 'bucket')},
+        ),
+    ]
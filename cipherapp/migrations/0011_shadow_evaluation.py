@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cipherapp', '0010_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShadowEvaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candidate', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch_size', models.PositiveIntegerField(default=1)),
+                ('active_seconds', models.FloatField()),
+                ('candidate_seconds', models.FloatField(blank=True, null=True)),
+                ('identical', models.PositiveIntegerField(default=0)),
+                ('similarity', models.FloatField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['candidate', 'created_at'], name='shadoweval_candidate_idx')],
+            },
+        ),
+    ]
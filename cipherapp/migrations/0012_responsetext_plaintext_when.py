@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:01
+
+import cipherapp.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cipherapp', '0011_shadow_evaluation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='responsetext',
+            name='text',
+            field=cipherapp.fields.CompressedTextField(plaintext_when='keeps_plaintext'),
+        ),
+    ]
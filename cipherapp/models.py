@@ -1,9 +1,14 @@
 # CipherApp models for user profiles and chat history
 from django.db import models
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+import hashlib
 import json
 
+from .fields import CompressedTextField
+
 class UserProfile(models.Model):
     """Extended user profile with additional information"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -20,6 +25,12 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class ChatSessionManager(models.Manager):
+    """Default manager that hides soft-deleted sessions waiting to be purged"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class ChatSession(models.Model):
     """Chat sessions for organizing conversations"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -27,13 +38,60 @@ class ChatSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Set when a large session is soft-deleted; rows are purged in the background
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Set while the messages live in ArchivedSession instead of ChatMessage
+    archived_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Denormalized from the messages table by cipherapp.session_stats
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(default=timezone.now)
+    last_message_preview = models.CharField(max_length=100, blank=True, default='')
+    
+    objects = ChatSessionManager()
+    all_objects = models.Manager()
     
     class Meta:
-        ordering = ['-updated_at']
+        ordering = ['-last_message_at']
+        indexes = [
+            # Serves the sidebar and session list: a user's live sessions, most recent first
+            models.Index(
+                fields=['user', '-last_message_at'],
+                name='chatsession_user_recent_idx',
+                condition=models.Q(deleted_at__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
+class ResponseText(models.Model):
+    """Bot response text stored once and shared by every message that uses it"""
+    digest = models.CharField(max_length=64, unique=True)  # SHA-256 of the text
+    text = CompressedTextField(plaintext_when='keeps_plaintext')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    @staticmethod
+    def make_digest(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def keeps_plaintext(self):
+        """Bot text lives here, so 'bot' in PLAINTEXT_MESSAGE_TYPES keeps it uncompressed"""
+        return 'bot' in getattr(settings, 'PLAINTEXT_MESSAGE_TYPES', [])
+    
+    def __str__(self):
+        return f"{self.digest[:12]}: {self.text[:50]}..."
+
+class ChatMessageQuerySet(models.QuerySet):
+    def with_text(self):
+        """Annotate `text`, the message content wherever it is stored, for filtering and values()"""
+        return self.annotate(text=Coalesce('response_text__text', 'inline_content'))
+
+class ChatMessageManager(models.Manager.from_queryset(ChatMessageQuerySet)):
+    """Default manager that loads the shared response text along with each message"""
+    
+    def get_queryset(self):
+        return super().get_queryset().select_related('response_text')
+
 class ChatMessage(models.Model):
     """Individual chat messages"""
     MESSAGE_TYPES = [
@@ -44,17 +102,61 @@ class ChatMessage(models.Model):
     
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     message_type = models.CharField(max_length=10, choices=MESSAGE_TYPES)
-    content = models.TextField()
+    # Text stored on the row itself; empty when response_text holds it
+    inline_content = CompressedTextField(db_column='content', blank=True, plaintext_when='keeps_plaintext')
+    # Deduplicated bot response text (see cipherapp.response_store)
+    response_text = models.ForeignKey(ResponseText, on_delete=models.PROTECT, null=True, blank=True, related_name='messages')
     timestamp = models.DateTimeField(auto_now_add=True)
     # New field to link user messages with their corresponding bot responses
     linked_message = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='response_to')
     
+    objects = ChatMessageManager()
+    
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['session', 'timestamp'], name='chatmessage_session_time_idx'),
+        ]
+    
+    @property
+    def content(self):
+        if self.response_text_id is not None:
+            return self.response_text.text
+        return self.inline_content
+    
+    @content.setter
+    def content(self, value):
+        # Assigning text stores it on the row; use response_store for shared text
+        self.inline_content = value
+        self.response_text = None
+    
+    def keeps_plaintext(self):
+        """Message types listed in PLAINTEXT_MESSAGE_TYPES are never compressed (e.g. for a DB full-text index)"""
+        return self.message_type in getattr(settings, 'PLAINTEXT_MESSAGE_TYPES', [])
     
     def __str__(self):
         return f"{self.message_type}: {self.content[:50]}..."
 
+class ArchivedSession(models.Model):
+    """Compressed cold-storage copy of an inactive session's messages and feedback"""
+    session = models.OneToOneField(ChatSession, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    payload = models.BinaryField()  # Compressed JSON, see cipherapp.archive
+    message_count = models.PositiveIntegerField(default=0)
+    # Message id range, to find the archive holding a given message id
+    first_message_id = models.BigIntegerField(null=True)
+    last_message_id = models.BigIntegerField(null=True)
+    original_size = models.PositiveIntegerField(default=0)  # Uncompressed JSON bytes
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'first_message_id'], name='archivedsession_user_msg_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archive of session {self.session_id} ({self.message_count} messages)"
+
 class MessageFeedback(models.Model):
     """User feedback for bot messages to train reinforcement learning model"""
     FEEDBACK_CHOICES = [
@@ -76,7 +178,7 @@ class MessageFeedback(models.Model):
 class ResponsePattern(models.Model):
     """Store patterns that lead to positive/negative feedback for ML training"""
     user_input = models.TextField()  # The user's input that led to the response
-    bot_response = models.TextField()  # The bot's response
+    bot_response = CompressedTextField()  # The bot's response
     positive_feedback_count = models.IntegerField(default=0)
     negative_feedback_count = models.IntegerField(default=0)
     total_uses = models.IntegerField(default=0)
@@ -127,6 +229,64 @@ class UserActivity(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Rollup and retention jobs scan by time
+            models.Index(fields=['timestamp'], name='useractivity_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.action} at {self.timestamp}"
+
+class UserActivityHourly(models.Model):
+    """UserActivity counts per user, action and hour, built by cipherapp.activity"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    action = models.CharField(max_length=50)
+    bucket = models.DateTimeField()  # Start of the hour
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-bucket']
+        unique_together = ['user', 'action', 'bucket']
+        indexes = [
+            models.Index(fields=['bucket', 'action'], name='activityhourly_bucket_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.action} x{self.count} at {self.bucket}"
+
+class UserActivityDaily(models.Model):
+    """UserActivity counts per user, action and day, built from the hourly rollup"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    action = models.CharField(max_length=50)
+    bucket = models.DateField()  # Day in TIME_ZONE
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-bucket']
+        unique_together = ['user', 'action', 'bucket']
+        indexes = [
+            models.Index(fields=['bucket', 'action'], name='activitydaily_bucket_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.action} x{self.count} on {self.bucket}"
+
+class ShadowEvaluation(models.Model):
+    """One sampled model call replayed against a candidate model (see cipherapp.shadow)"""
+    candidate = models.CharField(max_length=255)  # Candidate model file name
+    created_at = models.DateTimeField(auto_now_add=True)
+    batch_size = models.PositiveIntegerField(default=1)  # Messages in the predict() call
+    active_seconds = models.FloatField()
+    candidate_seconds = models.FloatField(null=True, blank=True)  # None when the candidate failed
+    identical = models.PositiveIntegerField(default=0)  # Messages answered exactly like the active model
+    similarity = models.FloatField(null=True, blank=True)  # Mean text similarity to the active answers, 0-1
+    error = models.CharField(max_length=255, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['candidate', 'created_at'], name='shadoweval_candidate_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.candidate} at {self.created_at}"
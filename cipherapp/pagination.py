@@ -0,0 +1,75 @@
+# Paginator for admin changelists over very large tables
+#
+# Django's Paginator runs an exact COUNT(*) on every changelist page, which
+# scans the whole table. EstimatedCountPaginator uses the database's own row
+# estimate for unfiltered changelists and caps the count of filtered ones, so
+# a page loads in about the same time at a thousand rows as at 100M.
+import logging
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+def get_exact_count_limit():
+    """Counts up to this many rows are exact; larger tables report an estimate"""
+    return getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+
+def estimate_table_rows(model, using='default'):
+    """The row count the database keeps in its statistics, or None if it has none"""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT table_rows FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError as e:
+        logger.warning(f"Could not read the row estimate for {table}: {e}")
+        return None
+    # PostgreSQL reports -1 for a table that has never been analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+def estimate_from_keys(queryset):
+    """Primary key span of the table, two index lookups; overestimates after deletes"""
+    span = queryset.model._base_manager.using(queryset.db).aggregate(low=Min('pk'), high=Max('pk'))
+    if span['low'] is None:
+        return 0
+    return span['high'] - span['low'] + 1
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts more than ADMIN_EXACT_COUNT_LIMIT rows.
+
+    Unfiltered lists use the planner's estimate (or the primary key span on
+    databases without one) once the table is larger than the limit. Filtered
+    or searched lists count at most limit + 1 matches and report the limit,
+    so later pages are reached by narrowing the filter.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = get_exact_count_limit()
+        if not hasattr(queryset, 'query'):
+            return super().count
+        if queryset.query.where:
+            return min(queryset.order_by()[:limit + 1].count(), limit)
+        estimate = estimate_table_rows(queryset.model, using=queryset.db)
+        if estimate is None:
+            estimate = estimate_from_keys(queryset)
+        if estimate <= limit:
+            return queryset.count()
+        return estimate
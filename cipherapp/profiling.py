@@ -0,0 +1,56 @@
+# Request-scoped stage timings for the response pipeline
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import metrics
+
+# Timings for the current request, or None when nobody is collecting
+_request_timings = ContextVar('cipherapp_request_timings', default=None)
+
+class RequestTimings:
+    """Accumulated time and call count per named stage for one request"""
+
+    def __init__(self):
+        self.stages = {}
+        self.db_time = 0.0
+        self.db_queries = 0
+
+    def add(self, name, seconds):
+        total, count = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (total + seconds, count + 1)
+
+def start_collecting():
+    """Start collecting stage timings for the current request; returns (timings, token)"""
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+def stop_collecting(token):
+    _request_timings.reset(token)
+
+def current_timings():
+    return _request_timings.get()
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as a named pipeline stage.
+
+    The duration goes to the current request's timings (if collecting) and to
+    the stage latency histogram. Costs a context variable lookup and a settings
+    read when both are off.
+    """
+    timings = _request_timings.get()
+    record_metrics = metrics.is_enabled()
+    if timings is None and not record_metrics:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings.add(name, elapsed)
+        if record_metrics:
+            metrics.stage_duration.observe(elapsed, name)
@@ -0,0 +1,202 @@
+# Replay stored user messages through the response pipeline
+#
+# Streams user messages (with the bot reply stored for each) from ChatMessage
+# or from a JSON lines export, runs them through generate_bot_response in this
+# process and across a process pool, and reports throughput, the time spent in
+# each pipeline stage and how many replies differ from the stored ones. Used by
+# `manage.py replay_benchmark`; nothing is written to the database.
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection
+
+from .profiling import start_collecting, stop_collecting
+
+def stream_database_messages(limit=None, chunk_size=200):
+    """
+    Yield lists of (message, stored reply or None) for user messages in id
+    order. Messages of archived sessions are not in the hot table and are skipped.
+    """
+    from .models import ChatMessage
+
+    users = ChatMessage.objects.filter(message_type='user').order_by('id').values_list('id', 'inline_content')
+    if limit:
+        users = users[:limit]
+    chunk = []
+    for message_id, text in users.iterator(chunk_size=chunk_size):
+        text = str(text)
+        if text.strip():
+            chunk.append((message_id, text))
+        if len(chunk) >= chunk_size:
+            yield attach_stored_replies(chunk)
+            chunk = []
+    if chunk:
+        yield attach_stored_replies(chunk)
+
+def attach_stored_replies(chunk):
+    """Pair each (id, text) with the content of the latest bot reply linked to it"""
+    from .models import ChatMessage
+
+    replies = {}
+    bots = ChatMessage.objects.filter(
+        message_type='bot', linked_message_id__in=[message_id for message_id, _ in chunk]
+    ).order_by('id')
+    for bot in bots:
+        replies[bot.linked_message_id] = bot.content
+    return [(text, replies.get(message_id)) for message_id, text in chunk]
+
+def stream_file_messages(path, limit=None, chunk_size=200):
+    """Yield lists of (message, stored reply or None) from JSON lines of {"message", "reply"}"""
+    chunk = []
+    count = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not str(item.get('message') or '').strip():
+                continue
+            chunk.append((item['message'], item.get('reply')))
+            count += 1
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+            if limit and count >= limit:
+                break
+    if chunk:
+        yield chunk
+
+def export_messages(chunks, path):
+    """Write streamed messages as JSON lines for later replays; returns the count"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            for message, reply in chunk:
+                f.write(json.dumps({'message': message, 'reply': reply}, ensure_ascii=False) + '\n')
+                count += 1
+    return count
+
+def replay_chunk(items):
+    """Generate replies for (message, stored reply) pairs; returns counts and stage timings"""
+    from .views import generate_bot_response
+
+    timings, token = start_collecting()
+
+    def time_query(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            timings.db_time += time.perf_counter() - started
+            timings.db_queries += 1
+
+    changed = compared = 0
+    try:
+        with connection.execute_wrapper(time_query):
+            for message, stored in items:
+                reply = generate_bot_response(message)
+                if stored is not None:
+                    compared += 1
+                    changed += reply != stored
+    finally:
+        stop_collecting(token)
+    return {
+        'messages': len(items),
+        'compared': compared,
+        'changed': changed,
+        'stages': {name: list(value) for name, value in timings.stages.items()},
+        'db': [timings.db_time, timings.db_queries],
+    }
+
+class ReplayTotals:
+    """Results of one replay run, merged chunk by chunk"""
+
+    def __init__(self):
+        self.messages = 0
+        self.compared = 0
+        self.changed = 0
+        self.stages = {}
+        self.db = [0.0, 0]
+
+    def add(self, result):
+        self.messages += result['messages']
+        self.compared += result['compared']
+        self.changed += result['changed']
+        for name, (seconds, calls) in result['stages'].items():
+            total = self.stages.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += calls
+        self.db[0] += result['db'][0]
+        self.db[1] += result['db'][1]
+
+    def report(self, seconds, workers):
+        """
+        Stage shares are of the total pipeline time across all workers
+        (wall time x workers); db overlaps the stages it runs in.
+        """
+        busy = seconds * workers
+        stages = {
+            name: {
+                'seconds': round(total, 4),
+                'calls': calls,
+                'share': round(total / busy, 4) if busy else None,
+            }
+            for name, (total, calls) in sorted(self.stages.items())
+        }
+        stages['db'] = {
+            'seconds': round(self.db[0], 4),
+            'queries': self.db[1],
+            'share': round(self.db[0] / busy, 4) if busy else None,
+        }
+        return {
+            'workers': workers,
+            'messages': self.messages,
+            'seconds': round(seconds, 3),
+            'messages_per_second': round(self.messages / seconds, 2) if seconds else None,
+            'stages': stages,
+            'compared': self.compared,
+            'changed': self.changed,
+            'changed_fraction': round(self.changed / self.compared, 4) if self.compared else None,
+        }
+
+def replay_single(chunks):
+    totals = ReplayTotals()
+    started = time.perf_counter()
+    for chunk in chunks:
+        totals.add(replay_chunk(chunk))
+    return totals.report(time.perf_counter() - started, 1)
+
+def init_pool_worker():
+    import django
+    django.setup()
+    # The pipeline logs every KB/model hit
+    logging.disable(logging.INFO)
+
+def warm_pool_worker(_):
+    # Imports the pipeline and opens the worker's DB connection before timing starts
+    replay_chunk([('hello', None)])
+    time.sleep(0.1)
+
+def replay_pool(chunks, processes):
+    """
+    Replay across `processes` spawned workers, keeping at most two chunks per
+    worker in flight so the source is still streamed.
+    """
+    totals = ReplayTotals()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_pool_worker) as pool:
+        list(pool.map(warm_pool_worker, range(processes)))
+        started = time.perf_counter()
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(replay_chunk, chunk))
+            if len(pending) >= processes * 2:
+                totals.add(pending.popleft().result())
+        while pending:
+            totals.add(pending.popleft().result())
+        seconds = time.perf_counter() - started
+    return totals.report(seconds, processes)
@@ -0,0 +1,107 @@
+# Content-addressed storage for bot response text
+#
+# Most bot replies are one of a small set of texts (rule responses, fallbacks,
+# RL templates, reused patterns, knowledge base answers). Each distinct text is
+# stored once in ResponseText, keyed by its SHA-256, and bot messages point at
+# it instead of carrying their own copy.
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from .fields import compressed_lookup
+from .models import ChatMessage, ResponseText
+
+# digest -> ResponseText known to be committed; shared by the process's threads,
+# so it is only read or changed under _known_lock
+_known = {}
+_known_lock = threading.Lock()
+
+def get_cache_size():
+    return getattr(settings, 'RESPONSE_TEXT_CACHE_SIZE', 1000)
+
+def _remember(response_texts):
+    with _known_lock:
+        if len(_known) + len(response_texts) > get_cache_size():
+            _known.clear()
+        for response_text in response_texts:
+            _known[response_text.digest] = response_text
+
+def intern_response_texts(texts):
+    """
+    Return a ResponseText for each text, in order, creating missing ones.
+
+    Hot texts come from the in-process cache with no query; otherwise one
+    SELECT, plus an INSERT and a second SELECT for texts never seen before.
+    """
+    digests = [ResponseText.make_digest(text) for text in texts]
+    with _known_lock:
+        found = {digest: _known[digest] for digest in digests if digest in _known}
+    missing = {digest: text for digest, text in zip(digests, texts) if digest not in found}
+
+    if missing:
+        loaded = {rt.digest: rt for rt in ResponseText.objects.filter(digest__in=list(missing))}
+        new = [ResponseText(digest=digest, text=text) for digest, text in missing.items() if digest not in loaded]
+        if new:
+            # Another worker may insert the same text concurrently; keep whichever row wins
+            ResponseText.objects.bulk_create(new, ignore_conflicts=True)
+            loaded.update(
+                (rt.digest, rt) for rt in ResponseText.objects.filter(digest__in=[rt.digest for rt in new])
+            )
+        found.update(loaded)
+        # Only cache rows once they are committed, so a rollback cannot leave dangling ids
+        transaction.on_commit(lambda: _remember(list(loaded.values())))
+
+    return [found[digest] for digest in digests]
+
+def intern_response_text(text):
+    return intern_response_texts([text])[0]
+
+def storage_report():
+    """
+    Characters of bot text stored inline, referenced through ResponseText, and
+    actually stored there. Text counts are of the decoded text; stored counts
+    are of the column values, compressed or not.
+    """
+    texts = ResponseText.objects.annotate(
+        size=Length('text'),
+        references=Count('messages'),
+    ).values_list('text', 'size', 'references')
+    stored_chars = 0
+    text_chars = 0
+    logical_chars = 0
+    unique_texts = 0
+    unreferenced = 0
+    for text, size, references in texts.iterator():
+        length = len(str(text))
+        unique_texts += 1
+        stored_chars += size
+        text_chars += length
+        logical_chars += length * references
+        if not references:
+            unreferenced += 1
+
+    bot_messages = ChatMessage.objects.filter(message_type='bot')
+    inline = bot_messages.filter(response_text__isnull=True)
+    compressed = compressed_lookup('inline_content')
+    plain = inline.exclude(compressed).aggregate(messages=Count('id'), size=Sum(Length('inline_content')))
+    inline_messages = plain['messages']
+    inline_chars = plain['size'] or 0
+    # Compressed rows have to be decoded to count their characters
+    for text in inline.filter(compressed).values_list('inline_content', flat=True).iterator():
+        inline_messages += 1
+        inline_chars += len(str(text))
+    return {
+        'bot_messages': bot_messages.count(),
+        'deduplicated_messages': bot_messages.filter(response_text__isnull=False).count(),
+        'inline_messages': inline_messages,
+        'inline_chars': inline_chars,
+        'unique_texts': unique_texts,
+        'unreferenced_texts': unreferenced,
+        'logical_chars': logical_chars,
+        'text_chars': text_chars,
+        'stored_chars': stored_chars,
+        'saved_chars': logical_chars - stored_chars,
+    }
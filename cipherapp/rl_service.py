@@ -2,14 +2,25 @@
 # Created by Noaman Ayub - https://www.linkedin.com/in/noamanayub
 # GitHub: https://github.com/noamanayub
 
+#
+# Importing this module touches neither the database nor any heavy library:
+# the service is built on first use of `rl_service` (or get_rl_service()), and
+# the active ReinforcementLearningModel row is loaded on first use of
+# `current_model`. Worker boot and commands such as `migrate` stay DB-free.
+# Workers reload the model when another worker saves it (see rl_state).
+
 import json
+import random
 import re
-import numpy as np
+import threading
+import time
 from collections import defaultdict
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Avg, Count
 from django.utils import timezone
 from datetime import timedelta
 from .models import MessageFeedback, ResponsePattern, ReinforcementLearningModel, ChatMessage
+from . import metrics, rl_state
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,7 +31,10 @@ class RLResponseImprover:
     """
     
     def __init__(self):
-        self.current_model = self.get_or_create_model()
+        self._current_model = None
+        self._model_stamp = None
+        self._model_loaded_at = 0.0
+        self._model_lock = threading.Lock()
         self.response_templates = {
             'greeting': [
             "Hello! I'm CipherDepth, your AI assistant created by Noaman Ayub. How can I help you today?",
@@ -53,29 +67,54 @@ class RLResponseImprover:
             "This platform was created by Noaman Ayub, founder of CipherDepth. Connect with him: LinkedIn - https://www.linkedin.com/in/noamanayub, GitHub - https://github.com/noamanayub"
             ]
         }
-        # Add a new field to track knowledge base and model usage
-        self.source_tracking = {
-            'knowledge_base': 0,
-            'chatbot_model': 0,
-            'templates': 0
-        }
+    
+    @property
+    def current_model(self):
+        """
+        The active RL model, loaded (or created) on first use and reloaded when
+        another worker saved it; None while the database is unavailable
+        """
+        stamp = rl_state.read_version()
+        if self._model_is_stale(stamp):
+            with self._model_lock:
+                if self._model_is_stale(stamp):
+                    # Stamp read before the load: a save racing it triggers another reload
+                    model = self.get_or_create_model()
+                    if model is not None:
+                        if self._current_model is not None:
+                            metrics.rl_model_reloads.inc()
+                        self._current_model = model
+                        self._model_stamp = stamp
+                        self._model_loaded_at = time.monotonic()
+        return self._current_model
+    
+    def _model_is_stale(self, stamp):
+        return (
+            self._current_model is None
+            or stamp != self._model_stamp
+            or time.monotonic() - self._model_loaded_at > rl_state.get_max_age()
+        )
     
     def get_or_create_model(self):
         """Get the current active RL model or create a new one"""
         try:
             model = ReinforcementLearningModel.objects.filter(is_active=True).first()
             if not model:
-                model = ReinforcementLearningModel.objects.create(
-                    model_version="v1.0",
-                    is_active=True,
-                    parameters={
-                        'learning_rate': 0.1,
-                        'exploration_rate': 0.2,
-                        'decay_rate': 0.95,
-                        'min_samples_for_pattern': 3
-                    }
-                )
-                logger.info(f"Created new RL model: {model.model_version}")
+                try:
+                    model = ReinforcementLearningModel.objects.create(
+                        model_version="v1.0",
+                        is_active=True,
+                        parameters={
+                            'learning_rate': 0.1,
+                            'exploration_rate': 0.2,
+                            'decay_rate': 0.95,
+                            'min_samples_for_pattern': 3
+                        }
+                    )
+                    logger.info(f"Created new RL model: {model.model_version}")
+                except IntegrityError:
+                    # Another worker created it first
+                    model = ReinforcementLearningModel.objects.filter(is_active=True).first()
             return model
         except Exception as e:
             logger.error(f"Error getting/creating RL model: {e}")
@@ -135,21 +174,18 @@ class RLResponseImprover:
             category = self.categorize_input(user_input)
             similar_patterns = self.find_similar_patterns(user_input)
             
-            # Track the source of the base response if metadata is available
-            if hasattr(base_response, 'source') and base_response.source:
-                if base_response.source in self.source_tracking:
-                    self.source_tracking[base_response.source] += 1
-            
             # If we have successful patterns, use the best one
             if similar_patterns and similar_patterns[0].success_rate > 0.7:
                 best_pattern = similar_patterns[0]
                 logger.info(f"Using successful pattern with {best_pattern.success_rate:.2%} success rate")
+                metrics.rl_overrides.inc('pattern')
                 return best_pattern.bot_response
             
             # If we have a base response, try to improve it
             if base_response:
                 improved_response = self.enhance_response(base_response, category, similar_patterns)
                 if improved_response != base_response:
+                    metrics.rl_overrides.inc('enhanced')
                     return improved_response
             
             # Fall back to template-based response or base response
@@ -157,14 +193,14 @@ class RLResponseImprover:
             
             # For greeting category, prefer template over base response to avoid duplication
             if category == 'greeting':
-                self.source_tracking['templates'] += 1
+                metrics.rl_overrides.inc('template')
                 return template
             
             # For other categories, prefer base response if available
             if base_response:
                 return base_response
             else:
-                self.source_tracking['templates'] += 1
+                metrics.rl_overrides.inc('template')
                 return template
                 
         except Exception as e:
@@ -213,7 +249,7 @@ class RLResponseImprover:
     def get_response_template(self, category):
         """Get a template response for the given category"""
         templates = self.response_templates.get(category, self.response_templates['helpful'])
-        return np.random.choice(templates)
+        return random.choice(templates)
     
     def record_feedback(self, message_id, user, feedback_type):
         """Record user feedback and update patterns"""
@@ -294,9 +330,13 @@ class RLResponseImprover:
             
             if total_feedback > 0:
                 accuracy = positive_feedback / total_feedback
-                self.current_model.accuracy_score = accuracy
-                self.current_model.total_feedback_processed = total_feedback
-                self.current_model.save()
+                model = self.current_model
+                # Statistics only: an UPDATE that leaves other workers' parameters alone
+                ReinforcementLearningModel.objects.filter(pk=model.pk).update(
+                    accuracy_score=accuracy, total_feedback_processed=total_feedback
+                )
+                model.accuracy_score = accuracy
+                model.total_feedback_processed = total_feedback
                 
                 logger.info(f"Model accuracy updated: {accuracy:.2%}")
             
@@ -306,18 +346,22 @@ class RLResponseImprover:
     def get_model_performance(self):
         """Get current model performance metrics including source tracking"""
         try:
+            # Statistics are written without a version bump, so read them fresh
+            model = ReinforcementLearningModel.objects.get(pk=self.current_model.pk)
             performance_data = {
-                'model_version': self.current_model.model_version,
+                'model_version': model.model_version,
                 'total_patterns': ResponsePattern.objects.count(),
                 'successful_patterns': ResponsePattern.objects.filter(success_rate__gte=0.7).count(),
                 'total_feedback': MessageFeedback.objects.count(),
                 'positive_feedback': MessageFeedback.objects.filter(feedback_type='positive').count(),
-                'accuracy': self.current_model.accuracy_score,
+                'accuracy': model.accuracy_score,
                 'success_rate': ResponsePattern.objects.filter(success_rate__gte=0.7).count() / ResponsePattern.objects.count() if ResponsePattern.objects.count() > 0 else 0
             }
             
-            # Add source tracking to performance data
-            performance_data['source_usage'] = self.source_tracking
+            # Add source tracking to performance data (aggregated across workers)
+            source_usage = metrics.response_source.totals()
+            source_usage['templates'] = metrics.rl_overrides.totals()['template']
+            performance_data['source_usage'] = source_usage
             
             return performance_data
         except Exception as e:
@@ -330,21 +374,41 @@ class RLResponseImprover:
             # Simple retraining: update exploration parameters based on performance
             performance = self.get_model_performance()
             
-            if performance.get('accuracy', 0) > 0.8:
-                # High accuracy: reduce exploration, increase exploitation
-                self.current_model.parameters['exploration_rate'] *= 0.9
-            elif performance.get('accuracy', 0) < 0.6:
-                # Low accuracy: increase exploration
-                self.current_model.parameters['exploration_rate'] = min(0.5, self.current_model.parameters['exploration_rate'] * 1.1)
-            
-            self.current_model.training_sessions += 1
-            self.current_model.last_trained = timezone.now()
-            self.current_model.save()
+            with transaction.atomic():
+                # Start from the stored parameters, not this worker's copy, so concurrent retrains compose
+                model = ReinforcementLearningModel.objects.select_for_update().get(pk=self.current_model.pk)
+                if performance.get('accuracy', 0) > 0.8:
+                    # High accuracy: reduce exploration, increase exploitation
+                    model.parameters['exploration_rate'] *= 0.9
+                elif performance.get('accuracy', 0) < 0.6:
+                    # Low accuracy: increase exploration
+                    model.parameters['exploration_rate'] = min(0.5, model.parameters['exploration_rate'] * 1.1)
+                
+                model.training_sessions += 1
+                model.last_trained = timezone.now()
+                # The post_save signal bumps the shared version for the other workers
+                model.save()
+            self._current_model = model
             
-            logger.info(f"Model retrained. New exploration rate: {self.current_model.parameters['exploration_rate']:.3f}")
+            logger.info(f"Model retrained. New exploration rate: {model.parameters['exploration_rate']:.3f}")
             
         except Exception as e:
             logger.error(f"Error retraining model: {e}")
 
-# Global instance
-rl_service = RLResponseImprover()
+_rl_service = None
+_rl_service_lock = threading.Lock()
+
+def get_rl_service():
+    """The process-wide RLResponseImprover, built on first call"""
+    global _rl_service
+    if _rl_service is None:
+        with _rl_service_lock:
+            if _rl_service is None:
+                _rl_service = RLResponseImprover()
+    return _rl_service
+
+def __getattr__(name):
+    # `from .rl_service import rl_service` keeps working, built lazily
+    if name == 'rl_service':
+        return get_rl_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
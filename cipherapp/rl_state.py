@@ -0,0 +1,76 @@
+# Cross-worker version stamp for the RL model state
+#
+# Each worker keeps the active ReinforcementLearningModel in memory. Saving
+# the model bumps a 64-bit stamp in a small memory-mapped file shared by every
+# worker on the host (RL_STATE_PATH). Before using its copy a worker compares
+# the stamp with the one it loaded under, which is a memory read, and only
+# reloads from the database when it moved. Workers on other hosts, or all
+# workers when RL_STATE_PATH is None, also reload every RL_STATE_MAX_AGE
+# seconds.
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+STAMP = struct.Struct('<Q')
+
+def get_max_age():
+    return getattr(settings, 'RL_STATE_MAX_AGE', 60)
+
+class SharedVersion:
+    """A version stamp in a memory-mapped file, readable without a lock or syscall"""
+
+    def __init__(self):
+        self._map = None
+        self._path = None
+        self._lock = threading.Lock()
+
+    def _get_map(self):
+        path = getattr(settings, 'RL_STATE_PATH', None)
+        if path is None:
+            return None
+        path = str(path)
+        if self._map is None or self._path != path:
+            with self._lock:
+                if self._map is None or self._path != path:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                    try:
+                        if os.fstat(fd).st_size < STAMP.size:
+                            os.ftruncate(fd, STAMP.size)
+                        self._map = mmap.mmap(fd, STAMP.size)
+                    finally:
+                        os.close(fd)
+                    self._path = path
+        return self._map
+
+    def read(self):
+        """The current stamp, or None without a shared file"""
+        shared = self._get_map()
+        if shared is None:
+            return None
+        return STAMP.unpack_from(shared)[0]
+
+    def bump(self):
+        """
+        Move the stamp to a new value. Uses the clock rather than +1 so two
+        workers bumping at once still leave a value neither reader has seen.
+        """
+        shared = self._get_map()
+        if shared is None:
+            return
+        current = STAMP.unpack_from(shared)[0]
+        STAMP.pack_into(shared, 0, max(time.time_ns(), current + 1))
+
+version = SharedVersion()
+
+def read_version():
+    return version.read()
+
+def bump_version_on_commit():
+    """Tell every worker to reload the RL model once the current transaction commits"""
+    transaction.on_commit(version.bump)
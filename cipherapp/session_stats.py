@@ -0,0 +1,127 @@
+# Denormalized per-session message statistics
+#
+# ChatSession.message_count, last_message_at and last_message_preview are
+# maintained by the write paths themselves, inside the transaction that adds
+# or removes the messages, with one UPDATE per session touched. These UPDATEs
+# send no signals, so each one also bumps the owner's cache version on commit.
+# manage.py repair_session_stats recomputes everything from the messages table.
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+
+from .cache import bump_user_cache_version
+from .fields import MARKER
+from .models import ChatSession, ChatMessage
+
+# Must match ChatSession.last_message_preview's max_length
+PREVIEW_LENGTH = 100
+
+def make_preview(content):
+    return content[:PREVIEW_LENGTH]
+
+def _bump_on_commit(user_ids):
+    for user_id in set(user_ids):
+        transaction.on_commit(lambda user_id=user_id: bump_user_cache_version(user_id))
+
+def record_messages_added(chat_session, chat_messages, removed=0):
+    """
+    Count new messages on their session and make the newest the last message.
+
+    `removed` messages are subtracted in the same UPDATE. The last message
+    only moves forward, so concurrent turns cannot leave an older preview.
+    """
+    last = max(chat_messages, key=lambda chat_message: chat_message.timestamp)
+    preview = make_preview(last.content)
+    delta = len(chat_messages) - removed
+
+    # The preview is assigned before last_message_at so backends that apply
+    # SET clauses left to right (MySQL) still compare with the old time
+    ChatSession.all_objects.filter(id=chat_session.id).update(
+        message_count=F('message_count') + delta,
+        last_message_preview=Case(
+            When(last_message_at__lte=last.timestamp, then=Value(preview)),
+            default=F('last_message_preview'),
+        ),
+        last_message_at=Case(
+            When(last_message_at__lte=last.timestamp, then=Value(last.timestamp)),
+            default=F('last_message_at'),
+        ),
+        updated_at=last.timestamp,
+    )
+
+    chat_session.message_count += delta
+    if last.timestamp >= chat_session.last_message_at:
+        chat_session.last_message_at = last.timestamp
+        chat_session.last_message_preview = preview
+    chat_session.updated_at = last.timestamp
+    _bump_on_commit([chat_session.user_id])
+
+def last_message_expressions():
+    """Update kwargs that recompute last_message_at/preview from the messages table"""
+    latest = ChatMessage.objects.filter(session=OuterRef('pk')).order_by('-timestamp', '-id')
+    return {
+        'last_message_preview': Coalesce(
+            Subquery(latest.with_text().annotate(preview=Substr('text', 1, PREVIEW_LENGTH)).values('preview')[:1]),
+            Value(''),
+        ),
+        'last_message_at': Coalesce(Subquery(latest.values('timestamp')[:1]), F('created_at')),
+    }
+
+def record_messages_removed(counts):
+    """
+    Apply deletions to session stats.
+
+    `counts` is {(session_id, user_id): messages removed}. Must run in the
+    deleting transaction, after the DELETEs, so the last message is
+    recomputed from what is left.
+    """
+    for (session_id, user_id), removed in counts.items():
+        ChatSession.all_objects.filter(id=session_id).update(
+            message_count=F('message_count') - removed,
+            **last_message_expressions()
+        )
+    fix_encoded_previews(ChatSession.all_objects.filter(id__in=[session_id for session_id, _ in counts]))
+    _bump_on_commit(user_id for _, user_id in counts)
+
+def fix_encoded_previews(sessions):
+    """
+    SQL cannot decompress, so a preview cut from a compressed last message is
+    rebuilt in Python (rare: compressed rows are long and mostly not last).
+    """
+    for chat_session in sessions.filter(last_message_preview__startswith=MARKER).only('id'):
+        last = chat_session.messages.order_by('-timestamp', '-id').first()
+        ChatSession.all_objects.filter(id=chat_session.id).update(
+            last_message_preview=make_preview(last.content) if last else ''
+        )
+
+def count_messages_by_session(message_ids):
+    """{(session_id, user_id): number of the given messages in that session}"""
+    rows = (
+        ChatMessage.objects.filter(id__in=message_ids)
+        .order_by()
+        .values_list('session_id', 'session__user_id')
+        .annotate(count=Count('id'))
+    )
+    return {(session_id, user_id): count for session_id, user_id, count in rows}
+
+def refresh_session_stats(sessions):
+    """
+    Recompute every stat for a ChatSession queryset from its messages; returns rows updated.
+    Archived sessions are skipped: their messages are not in the table.
+    """
+    sessions = sessions.filter(archived_at__isnull=True)
+    message_count = (
+        ChatMessage.objects.filter(session=OuterRef('pk'))
+        .order_by()
+        .values('session')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    user_ids = list(sessions.values_list('user_id', flat=True).distinct())
+    updated = sessions.update(
+        message_count=Coalesce(Subquery(message_count), Value(0)),
+        **last_message_expressions()
+    )
+    fix_encoded_previews(sessions)
+    _bump_on_commit(user_ids)
+    return updated
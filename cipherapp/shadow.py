@@ -0,0 +1,245 @@
+# Shadow evaluation of a candidate chatbot model
+#
+# With CHATBOT_CANDIDATE_MODEL_PATH set, a sample (CHATBOT_SHADOW_SAMPLE_RATE)
+# of the active model's predict() calls is replayed against the candidate on a
+# small background thread pool. The user already has the active model's answer;
+# the pool only records how long the candidate took and how far its answers
+# diverge, as ShadowEvaluation rows written in batches. Samples are dropped,
+# never queued without bound, when the pool falls behind. `manage.py
+# shadow_report` compares the two models, including their memory footprint.
+import difflib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+def get_candidate_path():
+    return getattr(settings, 'CHATBOT_CANDIDATE_MODEL_PATH', None)
+
+def get_sample_rate():
+    return getattr(settings, 'CHATBOT_SHADOW_SAMPLE_RATE', 0.05)
+
+def get_max_pending():
+    """Sampled calls allowed to wait for the shadow pool; more are dropped"""
+    return getattr(settings, 'CHATBOT_SHADOW_MAX_PENDING', 50)
+
+def get_flush_size():
+    return getattr(settings, 'CHATBOT_SHADOW_FLUSH_SIZE', 20)
+
+def candidate_label(path):
+    return Path(path).name
+
+def text_similarity(a, b):
+    """0-1 similarity of two answers; 1.0 when identical"""
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, str(a or ''), str(b or '')).ratio()
+
+class ShadowEvaluator:
+    """Per-process pool, candidate model and pending results for shadow evaluation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pending = 0
+        self._model = None
+        self._model_path = None
+        self._model_lock = threading.Lock()
+        self._buffer = []
+
+    def reset_after_fork(self):
+        # Threads do not survive fork; the child starts its own pool
+        self.__init__()
+
+    def observe(self, messages, responses, active_seconds):
+        """Maybe replay one active predict() call against the candidate; never raises"""
+        path = get_candidate_path()
+        if not path or random.random() >= get_sample_rate():
+            return
+        with self._lock:
+            if self._pending >= get_max_pending():
+                metrics.shadow_samples.inc('dropped')
+                return
+            self._pending += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CHATBOT_SHADOW_WORKERS', 1),
+                    thread_name_prefix='shadow-model',
+                )
+            pool = self._pool
+        pool.submit(self._evaluate, str(path), list(messages), list(responses), active_seconds)
+
+    def load_candidate(self, path):
+        """The candidate model, unpickled once per process and path"""
+        with self._model_lock:
+            if self._model is None or self._model_path != path:
+                # Only needed when shadow mode is on; keeps it out of worker boot
+                import pickle
+                with open(path, 'rb') as f:
+                    self._model = pickle.load(f)
+                self._model_path = path
+                logger.info(f"Loaded candidate model {path} for shadow evaluation")
+            return self._model
+
+    def _evaluate(self, path, messages, responses, active_seconds):
+        evaluation = {
+            'candidate': candidate_label(path),
+            'batch_size': len(messages),
+            'active_seconds': active_seconds,
+        }
+        try:
+            model = self.load_candidate(path)
+            started = time.perf_counter()
+            candidate_responses = list(model.predict(messages))
+            evaluation['candidate_seconds'] = time.perf_counter() - started
+            evaluation['identical'] = sum(a == b for a, b in zip(responses, candidate_responses))
+            evaluation['similarity'] = sum(
+                text_similarity(a, b) for a, b in zip(responses, candidate_responses)
+            ) / max(1, len(messages))
+            metrics.shadow_samples.inc('compared')
+            metrics.shadow_model_seconds.observe(active_seconds, 'active')
+            metrics.shadow_model_seconds.observe(evaluation['candidate_seconds'], 'candidate')
+        except Exception as e:
+            evaluation['error'] = f'{type(e).__name__}: {e}'[:255]
+            metrics.shadow_samples.inc('error')
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._buffer.append(evaluation)
+                batch = None
+                if len(self._buffer) >= get_flush_size():
+                    batch, self._buffer = self._buffer, []
+        if batch:
+            self.save(batch)
+
+    def flush(self):
+        """Write buffered results now (the pool writes every CHATBOT_SHADOW_FLUSH_SIZE results)"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self.save(batch)
+
+    def wait(self):
+        """Block until every submitted sample is evaluated, then flush (commands and tests)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        self.flush()
+
+    def save(self, batch):
+        from .models import ShadowEvaluation
+
+        close_old_connections()
+        try:
+            ShadowEvaluation.objects.bulk_create([ShadowEvaluation(**evaluation) for evaluation in batch])
+        except Exception as e:
+            logger.error(f"Could not save {len(batch)} shadow evaluation(s): {e}")
+
+evaluator = ShadowEvaluator()
+os.register_at_fork(after_in_child=evaluator.reset_after_fork)
+
+def observe_model_call(messages, responses, active_seconds):
+    evaluator.observe(messages, responses, active_seconds)
+
+# Run in a fresh interpreter so only the model's own allocations are counted
+MEMORY_SCRIPT = '''
+import json, pickle, sys, time, tracemalloc
+import django
+django.setup()
+tracemalloc.start()
+started = time.perf_counter()
+with open(sys.argv[1], 'rb') as f:
+    model = pickle.load(f)
+load_seconds = time.perf_counter() - started
+current, peak = tracemalloc.get_traced_memory()
+print(json.dumps({'load_seconds': load_seconds, 'memory_bytes': current, 'peak_bytes': peak}))
+'''
+
+def measure_model_memory(path):
+    """{'load_seconds', 'memory_bytes', 'peak_bytes'} for unpickling a model file, or {'error'}"""
+    result = subprocess.run(
+        [sys.executable, '-c', MEMORY_SCRIPT, str(path)],
+        cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def latency_summary(seconds):
+    """Mean and nearest-rank percentiles in milliseconds, or None without samples"""
+    if not seconds:
+        return None
+    ordered = sorted(seconds)
+
+    def percentile(pct):
+        return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))]
+    return {
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(50) * 1000, 3),
+        'p95_ms': round(percentile(95) * 1000, 3),
+        'p99_ms': round(percentile(99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+def shadow_report(candidate=None, since=None, measure_memory=True):
+    """Compare the candidate with the active model over the recorded evaluations"""
+    from collections import Counter
+    from .models import ShadowEvaluation
+
+    candidate_path = get_candidate_path()
+    candidate = candidate or (candidate_label(candidate_path) if candidate_path else None)
+    evaluations = ShadowEvaluation.objects.filter(candidate=candidate)
+    if since is not None:
+        evaluations = evaluations.filter(created_at__gte=since)
+
+    active_seconds, candidate_seconds, errors = [], [], Counter()
+    messages = identical = 0
+    similarity_total = 0.0
+    for row in evaluations.values_list('active_seconds', 'candidate_seconds', 'identical', 'similarity', 'batch_size', 'error').iterator():
+        active, seconds, same, similarity, batch_size, error = row
+        if error or seconds is None:
+            errors[error or 'unknown'] += 1
+            continue
+        active_seconds.append(active)
+        candidate_seconds.append(seconds)
+        messages += batch_size
+        identical += same
+        similarity_total += similarity * batch_size
+
+    active = latency_summary(active_seconds)
+    shadow = latency_summary(candidate_seconds)
+    report = {
+        'candidate': candidate,
+        'since': since.isoformat() if since else None,
+        'compared_calls': len(candidate_seconds),
+        'failed_calls': sum(errors.values()),
+        'top_errors': errors.most_common(3),
+        'latency': {'active': active, 'candidate': shadow},
+        'slowdown': {
+            key: round(shadow[key] / active[key], 2) if active[key] else None
+            for key in ('p50_ms', 'p95_ms', 'p99_ms')
+        } if active and shadow else None,
+        'messages': messages,
+        'identical_rate': round(identical / messages, 4) if messages else None,
+        'mean_similarity': round(similarity_total / messages, 4) if messages else None,
+    }
+    if measure_memory:
+        report['memory'] = {
+            'active': measure_model_memory(getattr(settings, 'CHATBOT_MODEL_PATH', '')),
+            'candidate': measure_model_memory(candidate_path) if candidate_path else None,
+        }
+    return report
@@ -0,0 +1,24 @@
+# Signal handlers for CipherApp
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_user_cache_version
+from .models import UserProfile, ChatSession, ReinforcementLearningModel
+from .rl_state import bump_version_on_commit
+
+@receiver([post_save, post_delete], sender=ChatSession)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Bump the owner's cache version when their sessions or profile change"""
+    bump_user_cache_version(instance.user_id)
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache_on_user_save(sender, instance, **kwargs):
+    """The sidebar shows the user's name, so user edits invalidate too"""
+    bump_user_cache_version(instance.pk)
+
+@receiver([post_save, post_delete], sender=ReinforcementLearningModel)
+def reload_rl_model(sender, instance, **kwargs):
+    """Every worker reloads the RL model after it is saved (service, admin or shell)"""
+    bump_version_on_commit()
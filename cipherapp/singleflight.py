@@ -0,0 +1,126 @@
+# Single-flight coalescing of identical in-flight computations
+#
+# When many requests ask for the same thing at once (a popular prompt), the
+# first caller for a key runs the computation and every caller that arrives
+# while it is running waits for that result instead of repeating the work.
+# Nothing is cached: the key is forgotten as soon as the leader finishes.
+# Waiters can be threads (WSGI workers, sync views under ASGI) or coroutines,
+# in any mix, and a waiter that times out computes the result itself, as does
+# one whose leader was cancelled or interrupted before it had a result.
+import asyncio
+import threading
+
+from . import metrics
+
+class Call:
+    """One in-flight computation and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # The leader stopped without a result or an error of its own (cancelled)
+        self.abandoned = False
+        self.futures = []
+
+    def wake(self):
+        """Resolve the coroutines waiting on this call (threads wake on `done`)"""
+        for loop, future in self.futures:
+            loop.call_soon_threadsafe(self._resolve, future)
+
+    def _resolve(self, future):
+        if not future.done():
+            future.set_result(None)
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """The call for a key, and whether this caller leads it"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = Call()
+            return call, True
+
+    def _finish(self, key, call, result=None, error=None, abandoned=False):
+        call.result = result
+        call.error = error
+        call.abandoned = abandoned
+        # Under the lock, so a coroutine either sees `done` or is in `futures` before wake()
+        with self._lock:
+            self._calls.pop(key, None)
+            call.done.set()
+        call.wake()
+
+    def do(self, key, func, timeout=None):
+        """func() for the first caller of a key; later concurrent callers get its result"""
+        call, leader = self._join(key)
+        if leader:
+            metrics.coalesced_calls.inc('leader')
+            try:
+                result = func()
+            except Exception as e:
+                self._finish(key, call, error=e)
+                raise
+            except BaseException:
+                # KeyboardInterrupt, SystemExit: release the key, waiters run func() themselves
+                self._finish(key, call, abandoned=True)
+                raise
+            self._finish(key, call, result)
+            return result
+
+        if not call.done.wait(timeout):
+            metrics.coalesced_calls.inc('timeout')
+            return func()
+        if call.abandoned:
+            metrics.coalesced_calls.inc('abandoned')
+            return func()
+        metrics.coalesced_calls.inc('follower')
+        return call.outcome()
+
+    async def do_async(self, key, func, timeout=None):
+        """Coroutine version of do(); `func` is an async callable"""
+        call, leader = self._join(key)
+        if leader:
+            metrics.coalesced_calls.inc('leader')
+            try:
+                result = await func()
+            except Exception as e:
+                self._finish(key, call, error=e)
+                raise
+            except BaseException:
+                # CancelledError (client went away) must not leave the key in flight
+                self._finish(key, call, abandoned=True)
+                raise
+            self._finish(key, call, result)
+            return result
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            # finish() may have run between _join() and here
+            if call.done.is_set():
+                future.set_result(None)
+            else:
+                call.futures.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            metrics.coalesced_calls.inc('timeout')
+            return await func()
+        if call.abandoned:
+            metrics.coalesced_calls.inc('abandoned')
+            return await func()
+        metrics.coalesced_calls.inc('follower')
+        return call.outcome()
@@ -0,0 +1,108 @@
+# Static files storage with content hashing, precompression and optional minification
+import gzip
+import logging
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+# Files that are already compressed gain nothing from gzip/brotli
+UNCOMPRESSIBLE_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff', '.woff2',
+    '.gz', '.br', '.zip', '.pdf', '.mp4', '.webm',
+)
+
+# Smaller files are not worth an extra variant
+MIN_COMPRESS_SIZE = 256
+
+def compress_variants(data):
+    """Return {'.gz': bytes, '.br': bytes} for the encodings that shrink data"""
+    variants = {}
+    gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gzipped) < len(data):
+        variants['.gz'] = gzipped
+    if brotli is not None:
+        brotlied = brotli.compress(data, quality=11)
+        if len(brotlied) < len(data):
+            variants['.br'] = brotlied
+    return variants
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes .gz (and .br when the brotli
+    package is installed) next to every collected file, and minifies JS/CSS
+    on collect when STATICFILES_MINIFY is on and rjsmin/rcssmin are available.
+    """
+
+    def save(self, name, content, max_length=None):
+        # collectstatic copies through save(); post_process writes hashed
+        # copies through _save(), so files are minified once, before hashing
+        if getattr(settings, 'STATICFILES_MINIFY', False):
+            content = self.minify(name, content)
+        return super().save(name, content, max_length=max_length)
+
+    def minify(self, name, content):
+        """Minify a JS or CSS file if a minifier is installed"""
+        if name.endswith('.min.js') or name.endswith('.min.css'):
+            return content
+        if name.endswith('.js') and rjsmin is not None:
+            minifier = rjsmin.jsmin
+        elif name.endswith('.css') and rcssmin is not None:
+            minifier = rcssmin.cssmin
+        else:
+            return content
+
+        content.seek(0)
+        source = content.read()
+        if isinstance(source, bytes):
+            source = source.decode('utf-8')
+        return ContentFile(minifier(source).encode('utf-8'))
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = {}
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and hashed_name:
+                processed_names[name] = hashed_name
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        # Compress once the final hashed names are known
+        for name, hashed_name in processed_names.items():
+            for path in {name, hashed_name}:
+                self.write_compressed_variants(path)
+
+    def write_compressed_variants(self, path):
+        """Write precompressed copies of a stored file"""
+        if path.lower().endswith(UNCOMPRESSIBLE_EXTENSIONS) or not self.exists(path):
+            return
+
+        with self.open(path) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+
+        for suffix, compressed in compress_variants(data).items():
+            variant = path + suffix
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(compressed))
+            logger.debug(f"Wrote {variant} ({len(compressed)} of {len(data)} bytes)")
@@ -0,0 +1,74 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db.models.functions import TruncDate
+from django.test import TestCase
+
+from cipherapp.activity import day_start, prune_activity, rolled_up_until, rollup_activity, usage_series
+from cipherapp.models import UserActivity, UserActivityDaily, UserActivityHourly
+
+# Noon on a fixed day, so hour and day boundaries do not depend on when the tests run
+NOW = day_start(date(2025, 6, 15)) + timedelta(hours=12)
+
+class ActivityRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+
+    def add_activity(self, when, action='login', count=1):
+        for _ in range(count):
+            activity = UserActivity.objects.create(user=self.user, action=action)
+            # auto_now_add stamps the current time
+            UserActivity.objects.filter(pk=activity.pk).update(timestamp=when)
+
+    def test_raw_rows_are_rolled_up_before_they_are_pruned(self):
+        old = NOW - timedelta(days=40)
+        self.add_activity(old, count=3)
+        self.add_activity(NOW - timedelta(days=10), count=2)
+
+        # Nothing rolled up yet: past the retention period or not, nothing is deleted
+        self.assertEqual(prune_activity(now=NOW), (0, 0))
+        self.assertEqual(UserActivity.objects.count(), 5)
+
+        rollup_activity(now=NOW)
+        self.assertEqual(prune_activity(now=NOW), (3, 0))
+        self.assertEqual(UserActivity.objects.count(), 2)
+        daily = UserActivityDaily.objects.get(bucket=old.date())
+        self.assertEqual((daily.action, daily.count), ('login', 3))
+        self.assertEqual(UserActivityHourly.objects.get(bucket=old).count, 3)
+
+    def test_rows_newer_than_the_watermark_are_never_pruned(self):
+        self.add_activity(NOW - timedelta(days=40), count=2)
+        # Past the 30 day retention, but after the last rollup run
+        self.add_activity(NOW - timedelta(days=33), count=4)
+        rollup_activity(now=NOW - timedelta(days=35))
+        self.assertEqual(rolled_up_until(), NOW - timedelta(days=40) + timedelta(hours=1))
+
+        self.assertEqual(prune_activity(now=NOW), (2, 0))
+        self.assertEqual(UserActivity.objects.count(), 4)
+        self.assertFalse(UserActivity.objects.filter(timestamp__lt=NOW - timedelta(days=35)).exists())
+
+    def test_usage_series_matches_raw_counts_across_the_split(self):
+        for days_ago in range(6):
+            for hour in (1, 9, 17, 23):
+                self.add_activity(NOW - timedelta(days=days_ago, hours=hour), action='message_sent', count=days_ago + 1)
+        self.add_activity(NOW - timedelta(days=3, hours=5), action='login', count=2)
+        # The watermark falls mid-day, so one day is split between the daily rollup and raw rows
+        rollup_activity(now=NOW - timedelta(days=2, hours=4))
+        watermark = rolled_up_until()
+        self.assertLess(watermark, NOW - timedelta(days=2))
+        self.assertTrue(UserActivity.objects.filter(timestamp__gte=watermark).exists())
+
+        start = day_start(NOW.date() - timedelta(days=7))
+        raw = Counter(
+            (row['day'].isoformat(), row['action'])
+            for row in UserActivity.objects.annotate(day=TruncDate('timestamp')).values('day', 'action')
+        )
+
+        daily = usage_series(start, NOW, 'day')
+        self.assertEqual({(row['bucket'], row['action']): row['count'] for row in daily}, dict(raw))
+        hourly = usage_series(start, NOW, 'hour')
+        self.assertEqual(sum(row['count'] for row in hourly), UserActivity.objects.count())
+        self.assertEqual(
+            sum(row['count'] for row in usage_series(start, NOW, 'day', action='login')), 2
+        )
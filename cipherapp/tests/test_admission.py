@@ -0,0 +1,74 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cipherapp import fastjson
+from cipherapp.admission import take_tokens
+from cipherapp.models import ChatMessage
+
+@override_settings(ADMISSION_USER_BURST=10, ADMISSION_USER_RATE=0.001)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.client.force_login(self.user)
+
+    def chat(self):
+        return self.client.post(reverse('chat_api'), json.dumps({'message': 'hello'}), content_type='application/json')
+
+    def batch(self, count):
+        return self.client.post(
+            reverse('chat_batch_api'), json.dumps({'messages': ['hello'] * count}), content_type='application/json'
+        )
+
+    def test_rate_limited_after_the_burst(self):
+        for _ in range(10):
+            self.assertEqual(self.chat().status_code, 200)
+        response = self.chat()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(ChatMessage.objects.count(), 20)
+
+    def test_batch_is_charged_per_message(self):
+        self.assertEqual(self.batch(6).status_code, 200)
+        self.assertEqual(self.batch(4).status_code, 200)
+        self.assertEqual(self.chat().status_code, 429)
+
+    def test_batch_larger_than_the_burst_is_refused(self):
+        response = self.batch(11)
+        self.assertEqual(response.status_code, 429)
+        self.assertNotIn('Retry-After', response)
+        self.assertIn('At most 10', response.json()['error'])
+        self.assertFalse(ChatMessage.objects.exists())
+        # Nothing was charged
+        self.assertEqual(self.batch(10).status_code, 200)
+
+    def test_batch_body_is_parsed_once(self):
+        with mock.patch.object(fastjson, 'loads', wraps=fastjson.loads) as loads:
+            self.assertEqual(self.batch(2).status_code, 200)
+        self.assertEqual(loads.call_count, 1)
+
+    @override_settings(ADMISSION_MAX_CONCURRENCY=0, ADMISSION_MAX_QUEUE=0)
+    def test_shed_when_the_pipeline_is_full(self):
+        response = self.chat()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(ChatMessage.objects.exists())
+
+    @override_settings(ADMISSION_ENABLED=False)
+    def test_disabled(self):
+        for _ in range(12):
+            self.assertEqual(self.chat().status_code, 200)
+
+    @override_settings(ADMISSION_USER_RATE=2)
+    def test_bucket_refills(self):
+        with mock.patch('cipherapp.admission.time.time', return_value=1000.0) as clock:
+            self.assertEqual(take_tokens('bucket', 10), 0)
+            self.assertEqual(take_tokens('bucket', 1), 0.5)
+            clock.return_value = 1002.0
+            self.assertEqual(take_tokens('bucket', 4), 0)
+            self.assertEqual(take_tokens('bucket', 1), 0.5)
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from cipherapp.api_auth import issue_api_token, user_from_claims, verify_api_token
+
+class ApiTokenAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.url = reverse('chat_history')
+
+    def get(self, token):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_valid_token(self):
+        response = self.get(issue_api_token(self.user))
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_token(self):
+        response = self.get('not-a-token')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('error', response.json())
+
+    def test_deactivated_user_is_rejected(self):
+        token = issue_api_token(self.user)
+        # Loads and caches the user row
+        self.assertEqual(self.get(token).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        token = issue_api_token(self.user)
+        self.user.delete()
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_claims_resolve_to_the_stored_user(self):
+        self.user.email = 'alice@example.com'
+        self.user.save()
+        user = user_from_claims(verify_api_token(issue_api_token(self.user)))
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'alice@example.com')
@@ -0,0 +1,116 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cipherapp.archive import (
+    archive_inactive_sessions, archive_session, lock_sessions_for_write, restore_for_message, restore_session,
+)
+from cipherapp.models import ArchivedSession, ChatMessage, ChatSession
+from cipherapp.tests.test_deletion import add_turns
+from cipherapp.views import save_chat_turn
+
+class SessionArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.session = ChatSession.objects.create(user=self.user, title='Old chat')
+        self.messages = add_turns(self.session, 2)
+        self.message_ids = [message.id for message in self.messages]
+        self.client.force_login(self.user)
+
+    def archive(self):
+        self.assertEqual(archive_session(self.session), 4)
+        self.session.refresh_from_db()
+
+    def test_archive_moves_rows_and_history_reads_through(self):
+        self.archive()
+        self.assertIsNotNone(self.session.archived_at)
+        self.assertFalse(ChatMessage.objects.filter(session=self.session).exists())
+        response = self.client.get(reverse('chat_history'), {'session_id': self.session.id})
+        data = response.json()
+        self.assertTrue(data['session']['archived'])
+        self.assertEqual([message['id'] for message in data['messages']], self.message_ids)
+        self.assertEqual(data['messages'][1]['content'], 'answer 0')
+
+    def test_search_reads_archives(self):
+        self.archive()
+        live = ChatSession.objects.create(user=self.user, title='New chat')
+        add_turns(live, 1)
+        url = reverse('search_messages_api')
+        results = self.client.get(url, {'query': 'question'}).json()['results']
+        self.assertEqual({result['session_id'] for result in results}, {self.session.id, live.id})
+        results = self.client.get(url, {'query': 'answer 1', 'session_id': self.session.id}).json()['results']
+        self.assertEqual([result['id'] for result in results], [self.message_ids[3]])
+
+    def test_new_message_restores_the_session(self):
+        self.archive()
+        response = self.client.post(
+            reverse('chat_api'), json.dumps({'message': 'hello again', 'session_id': self.session.id}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ArchivedSession.objects.exists())
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 6)
+
+    def test_write_with_a_session_loaded_before_archiving(self):
+        stale = ChatSession.objects.get(id=self.session.id)
+        self.archive()
+        request = RequestFactory().post('/api/chat/')
+        request.user = self.user
+        save_chat_turn(request, stale, 'late message', 'late reply')
+        self.assertFalse(ArchivedSession.objects.exists())
+        self.assertIsNone(ChatSession.objects.get(id=self.session.id).archived_at)
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 6)
+
+    def test_archiving_skips_sessions_active_since_the_cutoff(self):
+        ChatSession.objects.filter(id=self.session.id).update(last_message_at=timezone.now() - timedelta(days=100))
+        self.assertEqual(archive_inactive_sessions(days=90), (1, 4))
+        self.assertEqual(archive_session(self.session), 0)
+
+        other = ChatSession.objects.create(user=self.user)
+        add_turns(other, 1)
+        self.assertEqual(archive_session(other, inactive_before=timezone.now() - timedelta(days=90)), 0)
+        self.assertTrue(ChatMessage.objects.filter(session=other).exists())
+
+    def test_session_lock_writes_before_reading(self):
+        # SQLite cannot upgrade a read to a write under concurrency; the lock must take the write first
+        with CaptureQueriesContext(connection) as queries:
+            lock_sessions_for_write([self.session])
+        self.assertTrue(queries.captured_queries[0]['sql'].startswith('UPDATE'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.archive()
+        statements = [query['sql'] for query in queries.captured_queries if query['sql'].split()[0] != 'SAVEPOINT']
+        self.assertTrue(statements[0].startswith('UPDATE'))
+
+    def test_archiving_an_empty_session_changes_nothing(self):
+        empty = ChatSession.objects.create(user=self.user)
+        self.assertEqual(archive_session(empty), 0)
+        self.assertIsNone(ChatSession.objects.get(id=empty.id).archived_at)
+
+    def test_restoring_the_same_archive_twice(self):
+        # Two requests that both saw the session archived restore it one after the other
+        first = ChatSession.all_objects.get(id=self.session.id)
+        self.archive()
+        second = ChatSession.all_objects.get(id=self.session.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(restore_session(second), 4)
+        statements = [query['sql'] for query in queries.captured_queries if query['sql'].split()[0] != 'SAVEPOINT']
+        self.assertTrue(statements[0].startswith('UPDATE'))
+        self.assertEqual(restore_session(second), 0)
+        self.assertEqual(restore_session(first), 0)
+        self.assertEqual(ChatMessage.objects.filter(session=self.session).count(), 4)
+        self.assertIsNone(ChatSession.objects.get(id=self.session.id).archived_at)
+
+    def test_restore_for_message(self):
+        self.archive()
+        self.assertTrue(restore_for_message(self.user, self.message_ids[2]))
+        self.assertTrue(ChatMessage.objects.filter(id=self.message_ids[2]).exists())
+        self.assertFalse(restore_for_message(self.user, self.message_ids[2]))
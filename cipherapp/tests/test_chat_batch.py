@@ -0,0 +1,75 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cipherapp.models import ChatMessage, ChatSession
+
+class ChatBatchApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.client.force_login(self.user)
+        self.url = reverse('chat_batch_api')
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_messages_without_session_share_a_new_session(self):
+        response = self.post({'messages': ['hello', {'message': 'how are you?'}]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['user_message']['content'] for result in results], ['hello', 'how are you?'])
+        self.assertEqual(results[0]['session_id'], results[1]['session_id'])
+        session = ChatSession.objects.get(id=results[0]['session_id'])
+        self.assertEqual(session.user, self.user)
+        self.assertEqual(session.message_count, 4)
+        bot_message = ChatMessage.objects.get(id=results[1]['bot_message']['id'])
+        self.assertEqual(bot_message.linked_message_id, results[1]['user_message']['id'])
+
+    def test_items_go_to_their_own_sessions(self):
+        first = ChatSession.objects.create(user=self.user)
+        second = ChatSession.objects.create(user=self.user)
+        response = self.post({
+            'session_id': first.id,
+            'messages': ['hello', {'message': 'hi there', 'session_id': second.id}],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['session_id'] for result in response.json()['results']], [first.id, second.id])
+        self.assertEqual(ChatMessage.objects.filter(session=first).count(), 2)
+        self.assertEqual(ChatMessage.objects.filter(session=second).count(), 2)
+
+    def test_other_users_session_is_not_found(self):
+        other = User.objects.create_user(username='bob', password='bob-pass-123')
+        session = ChatSession.objects.create(user=other)
+        response = self.post({'messages': [{'message': 'hello', 'session_id': session.id}]})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['session_ids'], [session.id])
+        self.assertFalse(ChatMessage.objects.exists())
+
+    @override_settings(ADMISSION_ENABLED=False)
+    def test_invalid_bodies(self):
+        for body in ({'messages': []}, {'messages': 'hello'}, {'messages': ['ok', '  ']}, {'messages': [3]},
+                     {'messages': [{'message': 'hi', 'session_id': 'abc'}]}):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChatMessage.objects.exists())
+
+    @override_settings(CHAT_BATCH_MAX_MESSAGES=2)
+    def test_batch_size_limit(self):
+        response = self.post({'messages': ['a', 'b', 'c']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 2', response.json()['error'])
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.post({'messages': ['hello']})
+        self.assertNotEqual(response.status_code, 200)
+        self.assertFalse(ChatMessage.objects.exists())
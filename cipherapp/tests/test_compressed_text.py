@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from cipherapp.fields import ESCAPE_PREFIX, is_compressed
+from cipherapp.models import ChatMessage, ChatSession, ResponseText
+from cipherapp.response_store import intern_response_text, storage_report
+
+LONG_TEXT = 'The quick brown fox jumps over the lazy dog. ' * 40
+
+def stored_value(model, pk, column):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {column} FROM {model._meta.db_table} WHERE id = %s', [pk])
+        return cursor.fetchone()[0]
+
+class CompressedTextFieldTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.session = ChatSession.objects.create(user=user)
+
+    def create(self, text, message_type='user'):
+        return ChatMessage.objects.create(session=self.session, message_type=message_type, inline_content=text)
+
+    def test_long_text_round_trips_compressed(self):
+        message = self.create(LONG_TEXT)
+        self.assertTrue(is_compressed(stored_value(ChatMessage, message.id, 'content')))
+        self.assertEqual(ChatMessage.objects.get(id=message.id).content, LONG_TEXT)
+
+    def test_short_text_stays_plaintext(self):
+        message = self.create('hello there')
+        self.assertEqual(stored_value(ChatMessage, message.id, 'content'), 'hello there')
+
+    def test_marker_in_plaintext_is_escaped(self):
+        message = self.create('\x1bz:not compressed')
+        self.assertEqual(stored_value(ChatMessage, message.id, 'content'), ESCAPE_PREFIX + '\x1bz:not compressed')
+        self.assertEqual(ChatMessage.objects.get(id=message.id).content, '\x1bz:not compressed')
+
+    @override_settings(PLAINTEXT_MESSAGE_TYPES=['user'])
+    def test_plaintext_message_types_are_not_compressed(self):
+        message = self.create(LONG_TEXT)
+        self.assertEqual(stored_value(ChatMessage, message.id, 'content'), LONG_TEXT)
+
+    @override_settings(PLAINTEXT_MESSAGE_TYPES=['bot'])
+    def test_plaintext_bot_type_covers_shared_response_text(self):
+        response_text = intern_response_text(LONG_TEXT)
+        self.assertEqual(stored_value(ResponseText, response_text.id, 'text'), LONG_TEXT)
+
+    def test_untouched_row_is_saved_as_is(self):
+        message = self.create(LONG_TEXT)
+        raw = stored_value(ChatMessage, message.id, 'content')
+        loaded = ChatMessage.objects.get(id=message.id)
+        loaded.message_type = 'system'
+        loaded.save()
+        self.assertEqual(stored_value(ChatMessage, message.id, 'content'), raw)
+
+class StorageReportTests(TestCase):
+    def test_counts_decoded_characters(self):
+        user = User.objects.create_user(username='alice', password='alice-pass-123')
+        session = ChatSession.objects.create(user=user)
+        response_text = intern_response_text(LONG_TEXT)
+        for _ in range(3):
+            ChatMessage.objects.create(session=session, message_type='bot', response_text=response_text)
+        ChatMessage.objects.create(session=session, message_type='bot', inline_content=LONG_TEXT)
+
+        stored = len(stored_value(ResponseText, response_text.id, 'text'))
+        report = storage_report()
+        self.assertEqual(report['text_chars'], len(LONG_TEXT))
+        self.assertEqual(report['logical_chars'], 3 * len(LONG_TEXT))
+        self.assertEqual(report['stored_chars'], stored)
+        self.assertLess(stored, len(LONG_TEXT))
+        self.assertEqual(report['inline_messages'], 1)
+        self.assertEqual(report['inline_chars'], len(LONG_TEXT))
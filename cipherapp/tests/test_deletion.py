@@ -0,0 +1,74 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cipherapp.deletion import delete_messages, delete_session_auto, purge_session
+from cipherapp.models import ChatMessage, ChatSession, MessageFeedback
+from cipherapp.session_stats import record_messages_added
+
+def add_turns(session, count):
+    """`count` user/bot message pairs, counted on the session like the views do"""
+    added = []
+    for i in range(count):
+        user_message = ChatMessage.objects.create(session=session, message_type='user', inline_content=f'question {i}')
+        bot_message = ChatMessage.objects.create(
+            session=session, message_type='bot', inline_content=f'answer {i}', linked_message=user_message
+        )
+        added += [user_message, bot_message]
+    record_messages_added(session, added)
+    return added
+
+class SessionDeletionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.session = ChatSession.objects.create(user=self.user, title='Chat')
+        self.messages = add_turns(self.session, 3)
+        MessageFeedback.objects.create(message=self.messages[1], user=self.user, feedback_type='like')
+        self.client.force_login(self.user)
+
+    def post_delete(self, session_id):
+        return self.client.post(
+            reverse('delete_chat_session'), json.dumps({'session_id': session_id}), content_type='application/json'
+        )
+
+    def test_small_session_is_deleted_at_once(self):
+        response = self.post_delete(self.session.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['purge'], 'deleted')
+        self.assertFalse(ChatSession.all_objects.filter(id=self.session.id).exists())
+        self.assertFalse(ChatMessage.objects.filter(session_id=self.session.id).exists())
+        self.assertFalse(MessageFeedback.objects.exists())
+
+    def test_other_users_session_is_not_found(self):
+        other = User.objects.create_user(username='bob', password='bob-pass-123')
+        self.client.force_login(other)
+        self.assertEqual(self.post_delete(self.session.id).status_code, 404)
+        self.assertTrue(ChatSession.objects.filter(id=self.session.id).exists())
+
+    @override_settings(SESSION_SOFT_DELETE_THRESHOLD=4)
+    def test_large_session_is_soft_deleted_then_purged(self):
+        response = self.post_delete(self.session.id)
+        self.assertEqual(response.json()['purge'], 'scheduled')
+        self.assertFalse(ChatSession.objects.filter(id=self.session.id).exists())
+        self.assertTrue(ChatSession.all_objects.filter(id=self.session.id).exists())
+
+        self.assertEqual(purge_session(self.session.id, batch_size=2), 6)
+        self.assertFalse(ChatSession.all_objects.filter(id=self.session.id).exists())
+        self.assertFalse(ChatMessage.objects.filter(session_id=self.session.id).exists())
+
+    @override_settings(SESSION_SOFT_DELETE_THRESHOLD=100)
+    def test_size_check_uses_the_denormalized_count(self):
+        ChatSession.all_objects.filter(id=self.session.id).update(message_count=101)
+        session = ChatSession.objects.get(id=self.session.id)
+        # Only the UPDATE of deleted_at; no COUNT over the session's messages
+        with self.assertNumQueries(1):
+            self.assertEqual(delete_session_auto(session), 'scheduled')
+
+    def test_delete_messages_updates_session_stats(self):
+        user_message, bot_message = self.messages[4:6]
+        self.assertEqual(delete_messages([user_message.id, bot_message.id]), 2)
+        session = ChatSession.objects.get(id=self.session.id)
+        self.assertEqual(session.message_count, 4)
+        self.assertEqual(session.last_message_preview, 'answer 1')
@@ -0,0 +1,50 @@
+from django.core.management import CommandError
+from django.test import SimpleTestCase
+
+from cipherapp.management.commands.loadtest import Command, parse_mix
+
+class LoadTestReportTests(SimpleTestCase):
+    def options(self, **overrides):
+        options = {
+            'url': None, 'users': 2, 'requests': 3, 'duration': 0, 'no_admission': False,
+            'user_rate': None, 'user_burst': None, 'max_concurrency': None,
+        }
+        options.update(overrides)
+        return options
+
+    def test_rejections_are_reported_apart_from_served_requests(self):
+        statuses = {'chat': {200: 2, 302: 1, 429: 3, 503: 1, 500: 1, 0: 1}}
+        latencies = {'chat': [0.5, 0.1, 0.2]}
+        error_latencies = {'chat': [0.001, 0.002]}
+        report = Command().build_report(
+            self.options(), parse_mix('chat=1'), 1, 2.0, latencies, error_latencies, statuses, {}
+        )
+        chat = report['endpoints']['chat']
+        self.assertEqual(chat['requests'], 9)
+        self.assertEqual(chat['served'], 3)
+        self.assertEqual(chat['rejected'], {'rate_limited': 3, 'shed': 1})
+        self.assertEqual(chat['errors'], 2)
+        self.assertEqual(chat['requests_per_second'], 1.5)
+        self.assertEqual(chat['latency_ms']['max'], 500.0)
+        self.assertEqual(chat['error_latency_ms']['max'], 2.0)
+        self.assertEqual(report['total_rejected'], {'rate_limited': 3, 'shed': 1})
+        self.assertEqual(report['total_errors'], 2)
+        self.assertEqual(report['requests_per_second'], 1.5)
+
+    def test_endpoint_with_only_rejections(self):
+        report = Command().build_report(self.options(), parse_mix('chat=1'), 1, 1.0, {}, {}, {'chat': {429: 4}}, {})
+        self.assertEqual(report['endpoints']['chat']['served'], 0)
+        self.assertIsNone(report['endpoints']['chat']['latency_ms'])
+        self.assertIsNone(report['endpoints']['chat']['error_latency_ms'])
+
+    def test_admission_overrides(self):
+        command = Command()
+        self.assertEqual(command.admission_overrides(self.options()), {})
+        self.assertEqual(
+            command.admission_overrides(self.options(no_admission=True, user_burst=50)),
+            {'ADMISSION_ENABLED': False, 'ADMISSION_USER_BURST': 50},
+        )
+        with self.assertRaises(CommandError):
+            command.admission_overrides(self.options(user_rate=0))
+        with self.assertRaises(CommandError):
+            command.admission_overrides(self.options(url='http://127.0.0.1:8000', no_admission=True))
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from cipherapp import metrics
+from cipherapp.metrics import PROCESS_LOCAL_ENV, isolate_command_runs, registry
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+class MetricsStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        environ = {key: value for key, value in os.environ.items() if key != PROCESS_LOCAL_ENV}
+        patcher = mock.patch.dict(os.environ, environ, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.settings_override = override_settings(METRICS_DIR=self.directory.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        # Each test writes to a fresh file of its own
+        registry.reset_after_fork()
+        self.addCleanup(registry.reset_after_fork)
+
+    def write_worker_file(self, pid, value):
+        registry.slot(metrics.pipeline_in_flight, None)
+        path = os.path.join(self.directory.name, f'metrics_{registry._layout_id}_{pid}.db')
+        values = [0.0] * registry._size
+        values[registry.slot(metrics.pipeline_in_flight, None)] = value
+        with open(path, 'wb') as f:
+            f.write(metrics.array('d', values).tobytes())
+        return path
+
+    def test_exited_workers_are_dropped(self):
+        path = self.write_worker_file(exited_pid(), 3)
+        self.assertEqual(metrics.pipeline_in_flight.totals()[None], 0)
+        self.assertFalse(os.path.exists(path))
+
+    def test_live_workers_are_summed(self):
+        self.write_worker_file(os.getppid(), 2)
+        metrics.pipeline_in_flight.inc()
+        self.assertEqual(metrics.pipeline_in_flight.totals()[None], 3)
+
+    def test_own_file_starts_from_zero(self):
+        self.write_worker_file(os.getpid(), 5)
+        metrics.pipeline_in_flight.inc()
+        self.assertEqual(metrics.pipeline_in_flight.totals()[None], 1)
+
+class CommandIsolationTests(SimpleTestCase):
+    def test_commands_use_process_memory(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop(PROCESS_LOCAL_ENV, None)
+            isolate_command_runs(['manage.py', 'benchmark'])
+            self.assertEqual(os.environ.get(PROCESS_LOCAL_ENV), '1')
+
+    def test_runserver_shares_the_directory(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop(PROCESS_LOCAL_ENV, None)
+            isolate_command_runs(['manage.py', 'runserver'])
+            isolate_command_runs(['gunicorn', 'cipherproject.wsgi'])
+            self.assertNotIn(PROCESS_LOCAL_ENV, os.environ)
@@ -0,0 +1,53 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from cipherapp import rl_state
+from cipherapp.models import ReinforcementLearningModel
+from cipherapp.rl_service import RLResponseImprover
+
+class SharedModelStateTests(TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = Path(workdir.name) / 'run' / 'rl_state.version'
+        self.model = ReinforcementLearningModel.objects.create(
+            model_version='v1.0', is_active=True, parameters={'exploration_rate': 0.2}
+        )
+
+    def retrain_elsewhere(self, exploration_rate):
+        """Save the model as another worker would; the post_save signal bumps the stamp on commit"""
+        model = ReinforcementLearningModel.objects.get(pk=self.model.pk)
+        model.parameters['exploration_rate'] = exploration_rate
+        with self.captureOnCommitCallbacks(execute=True):
+            model.save()
+
+    def test_bumped_stamp_reloads_other_workers(self):
+        with override_settings(RL_STATE_PATH=self.path):
+            worker = RLResponseImprover()
+            self.assertEqual(worker.current_model.parameters['exploration_rate'], 0.2)
+
+            # Within RL_STATE_MAX_AGE and with the stamp unchanged, the copy is reused without a query
+            with self.assertNumQueries(0):
+                worker.current_model
+
+            # Another process maps the same file
+            other_process = rl_state.SharedVersion()
+            stamp = other_process.read()
+            self.retrain_elsewhere(0.3)
+            self.assertNotEqual(other_process.read(), stamp)
+            self.assertEqual(worker.current_model.parameters['exploration_rate'], 0.3)
+
+    @override_settings(RL_STATE_PATH=None, RL_STATE_MAX_AGE=60)
+    def test_no_shared_file_reloads_on_age_only(self):
+        worker = RLResponseImprover()
+        self.assertEqual(worker.current_model.parameters['exploration_rate'], 0.2)
+        self.retrain_elsewhere(0.3)
+        self.assertIsNone(rl_state.read_version())
+        self.assertFalse(self.path.exists())
+        self.assertEqual(worker.current_model.parameters['exploration_rate'], 0.2)
+
+        with mock.patch('cipherapp.rl_service.time.monotonic', return_value=worker._model_loaded_at + 61):
+            self.assertEqual(worker.current_model.parameters['exploration_rate'], 0.3)
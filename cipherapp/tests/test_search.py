@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cipherapp.models import ChatMessage, ChatSession
+
+LONG_TEXT = 'The quick brown fox jumps over the lazy dog. ' * 40
+
+class SearchMessagesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+        self.session = ChatSession.objects.create(user=self.user, title='Chat')
+        self.client.force_login(self.user)
+        self.now = timezone.now()
+
+    def create(self, text, minutes_ago, session=None):
+        message = ChatMessage.objects.create(
+            session=session or self.session, message_type='user', inline_content=text
+        )
+        ChatMessage.objects.filter(id=message.id).update(timestamp=self.now - timedelta(minutes=minutes_ago))
+        return message
+
+    def search(self, query, **params):
+        return self.client.get(reverse('search_messages_api'), {'query': query, **params})
+
+    @override_settings(SEARCH_COMPRESSED_CHUNK_SIZE=10)
+    def test_old_compressed_messages_are_found(self):
+        old = self.create(LONG_TEXT + ' needle', minutes_ago=1000)
+        for i in range(60):
+            self.create(LONG_TEXT + f' filler {i}', minutes_ago=i)
+        response = self.search('needle')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['id'] for result in response.json()['results']], [old.id])
+
+    def test_plaintext_and_compressed_matches_are_merged_newest_first(self):
+        compressed = self.create(LONG_TEXT + ' needle', minutes_ago=5)
+        plain_new = self.create('needle near', minutes_ago=1)
+        plain_old = self.create('needle far', minutes_ago=10)
+        ids = [result['id'] for result in self.search('NEEDLE').json()['results']]
+        self.assertEqual(ids, [plain_new.id, compressed.id, plain_old.id])
+
+    def test_results_are_limited_to_the_newest_fifty(self):
+        self.create(LONG_TEXT + ' needle', minutes_ago=1000)
+        newest = [self.create(f'needle {i}', minutes_ago=i) for i in range(55)]
+        results = self.search('needle').json()['results']
+        self.assertEqual([result['id'] for result in results], [message.id for message in newest[:50]])
+
+    def test_other_users_messages_are_not_searched(self):
+        other = User.objects.create_user(username='bob', password='bob-pass-123')
+        self.create('needle', minutes_ago=1, session=ChatSession.objects.create(user=other))
+        self.assertEqual(self.search('needle').json()['count'], 0)
+
+    def test_short_query_is_rejected(self):
+        self.assertEqual(self.search('n').status_code, 400)
@@ -0,0 +1,77 @@
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+
+from django.test import TransactionTestCase, override_settings
+
+from cipherapp.models import ShadowEvaluation
+from cipherapp.shadow import ShadowEvaluator, evaluator
+from cipherapp.views import get_model_responses
+
+# Candidate predict() calls block on this, so tests control when they finish
+candidate_release = threading.Event()
+
+class EchoModel:
+    def predict(self, messages):
+        return [f'echo: {message}' for message in messages]
+
+class FailingCandidate:
+    def predict(self, messages):
+        candidate_release.wait(5)
+        raise RuntimeError('candidate broke')
+
+class SlowCandidate(EchoModel):
+    def predict(self, messages):
+        candidate_release.wait(5)
+        return super().predict(messages)
+
+# The pool threads write results on their own connections, outside any test transaction
+class ShadowEvaluationTests(TransactionTestCase):
+    def setUp(self):
+        candidate_release.clear()
+        self.addCleanup(candidate_release.set)
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = Path(workdir.name)
+        self.active_path = self.write_model('active.pkl', EchoModel())
+
+    def write_model(self, name, model):
+        path = self.workdir / name
+        with open(path, 'wb') as f:
+            pickle.dump(model, f)
+        return path
+
+    def test_failing_candidate_never_affects_the_reply(self):
+        candidate_path = self.write_model('candidate.pkl', FailingCandidate())
+        with override_settings(
+            CHATBOT_MODEL_PATH=self.active_path, CHATBOT_CANDIDATE_MODEL_PATH=candidate_path,
+            CHATBOT_SHADOW_SAMPLE_RATE=1.0, CHATBOT_SHADOW_FLUSH_SIZE=1,
+        ):
+            # The reply is back while the candidate is still running
+            self.assertEqual(get_model_responses(['hi']), ['echo: hi'])
+            self.assertFalse(ShadowEvaluation.objects.exists())
+            candidate_release.set()
+            evaluator.wait()
+
+        evaluation = ShadowEvaluation.objects.get()
+        self.assertEqual(evaluation.candidate, 'candidate.pkl')
+        self.assertEqual(evaluation.error, 'RuntimeError: candidate broke')
+        self.assertIsNone(evaluation.candidate_seconds)
+
+    def test_samples_beyond_max_pending_are_dropped(self):
+        candidate_path = self.write_model('candidate.pkl', SlowCandidate())
+        shadow = ShadowEvaluator()
+        with override_settings(
+            CHATBOT_CANDIDATE_MODEL_PATH=candidate_path, CHATBOT_SHADOW_SAMPLE_RATE=1.0,
+            CHATBOT_SHADOW_MAX_PENDING=2,
+        ):
+            for i in range(5):
+                shadow.observe([f'message {i}'], [f'echo: message {i}'], 0.001)
+            self.assertEqual(shadow._pending, 2)
+            candidate_release.set()
+            shadow.wait()
+
+        self.assertEqual(shadow._pending, 0)
+        self.assertEqual(ShadowEvaluation.objects.count(), 2)
+        self.assertEqual(set(ShadowEvaluation.objects.values_list('identical', flat=True)), {1})
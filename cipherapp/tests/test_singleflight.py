@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from cipherapp.benchmarks import shared_connection_pool
+from cipherapp.singleflight import SingleFlight
+
+class CountingFlight(SingleFlight):
+    """SingleFlight that counts the callers that have joined a call"""
+
+    def __init__(self):
+        super().__init__()
+        self.joined = 0
+
+    def _join(self, key):
+        call, leader = super()._join(key)
+        self.joined += 1
+        return call, leader
+
+    def wait_for_callers(self, count):
+        while self.joined < count:
+            time.sleep(0.001)
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.flight = CountingFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        self.release.wait(5)
+        return 'result'
+
+    def test_followers_share_the_leaders_result(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(self.flight.do, 'k', self.compute)
+            followers = [pool.submit(self.flight.do, 'k', self.compute) for _ in range(3)]
+            # Everyone joins while the leader's call is in flight
+            self.flight.wait_for_callers(4)
+            self.release.set()
+            results = [leader.result()] + [future.result() for future in followers]
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight._calls, {})
+
+    def test_followers_see_the_leaders_error(self):
+        def fail():
+            self.release.wait(5)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(self.flight.do, 'k', fail)
+            follower = pool.submit(self.flight.do, 'k', self.compute)
+            self.flight.wait_for_callers(2)
+            self.release.set()
+            with self.assertRaises(ValueError):
+                leader.result()
+            with self.assertRaises(ValueError):
+                follower.result()
+        self.assertEqual(self.calls, 0)
+
+    def test_follower_computes_itself_after_the_timeout(self):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(self.flight.do, 'k', self.compute)
+            self.flight.wait_for_callers(1)
+            self.assertEqual(self.flight.do('k', lambda: 'own', timeout=0.01), 'own')
+            self.release.set()
+            self.assertEqual(leader.result(), 'result')
+
+    def test_coroutine_waits_on_a_thread_leader(self):
+        async def compute_async():
+            return 'async'
+
+        async def follow():
+            return await self.flight.do_async('k', compute_async)
+
+        def release_once_joined():
+            self.flight.wait_for_callers(2)
+            self.release.set()
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(self.flight.do, 'k', self.compute)
+            self.flight.wait_for_callers(1)
+            pool.submit(release_once_joined)
+            self.assertEqual(asyncio.run(follow()), 'result')
+            self.assertEqual(leader.result(), 'result')
+        self.assertEqual(self.calls, 1)
+
+    def test_cancelled_leader_releases_the_key(self):
+        async def never_finishes():
+            await asyncio.sleep(60)
+
+        async def fresh():
+            return 'fresh'
+
+        async def scenario():
+            leader = asyncio.create_task(self.flight.do_async('k', never_finishes))
+            follower = asyncio.create_task(self.flight.do_async('k', fresh, timeout=30))
+            while self.flight.joined < 2:
+                await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            # The waiter runs the work itself instead of waiting out its timeout
+            self.assertEqual(await asyncio.wait_for(follower, 1), 'fresh')
+            self.assertEqual(self.flight._calls, {})
+            # and the next caller leads straight away
+            return await asyncio.wait_for(self.flight.do_async('k', fresh, timeout=30), 1)
+
+        self.assertEqual(asyncio.run(scenario()), 'fresh')
+
+    def test_interrupted_thread_leader_releases_the_key(self):
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.flight.do('k', interrupted)
+        self.assertEqual(self.flight._calls, {})
+        started = time.monotonic()
+        self.assertEqual(self.flight.do('k', lambda: 'fresh', timeout=30), 'fresh')
+        self.assertLess(time.monotonic() - started, 1)
+
+class SharedConnectionPoolTests(TestCase):
+    def test_threads_see_uncommitted_rows(self):
+        # The coalesce benchmarks run inside the run's rolled-back transaction
+        User.objects.create_user(username='pool-user')
+        with shared_connection_pool(2) as pool:
+            counts = list(pool.map(lambda _: User.objects.filter(username='pool-user').count(), range(4)))
+        self.assertEqual(counts, [1] * 4)
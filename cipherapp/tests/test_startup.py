@@ -0,0 +1,12 @@
+from django.test import SimpleTestCase
+
+from cipherapp.benchmarks import run_startup_script
+
+class WorkerStartupTests(SimpleTestCase):
+    """Boot stays free of database connections, numpy and the RL service (checked in a fresh interpreter)"""
+
+    def test_worker_boot_is_lazy(self):
+        run_startup_script(first_request=False)
+
+    def test_first_request_does_not_load_the_pipeline(self):
+        run_startup_script(first_request=True)
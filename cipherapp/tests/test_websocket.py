@@ -0,0 +1,47 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cipherapp.models import ChatMessage
+from cipherapp.websocket import dispatch_frame
+
+# Pages render without a collectstatic manifest
+PLAIN_STATIC = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+META = {'REMOTE_ADDR': '127.0.0.1', 'HTTP_USER_AGENT': 'test', 'SERVER_NAME': 'websocket', 'SERVER_PORT': '0'}
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class ChatSocketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='alice-pass-123')
+
+    def frame(self, payload):
+        return json.loads(dispatch_frame(self.user, META, payload if isinstance(payload, str) else json.dumps(payload)))
+
+    def test_page_stays_on_http_by_default(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'window.CHAT_SOCKET_PATH = "";')
+
+    @override_settings(CHAT_WEBSOCKET_ENABLED=True, STORAGES=PLAIN_STATIC)
+    def test_page_gets_the_socket_path_when_enabled(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'window.CHAT_SOCKET_PATH = "/ws/chat/";')
+
+    def test_chat_frame(self):
+        reply = self.frame({'id': 7, 'type': 'chat', 'data': {'message': 'hello'}})
+        self.assertEqual((reply['id'], reply['status']), (7, 200))
+        self.assertEqual(ChatMessage.objects.filter(session_id=reply['data']['session_id']).count(), 2)
+
+    def test_bad_frames(self):
+        self.assertEqual(self.frame('not json')['status'], 400)
+        reply = self.frame({'id': 3, 'type': 'shutdown', 'data': {}})
+        self.assertEqual((reply['id'], reply['status']), (3, 400))
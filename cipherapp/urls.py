@@ -9,6 +9,8 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('home/', views.home_view, name='home'),
     path('api/chat/', views.chat_api, name='chat_api'),
+    path('api/chat/batch/', views.chat_batch_api, name='chat_batch_api'),
+    path('api/chat/token/', views.api_token_view, name='api_token'),
     path('api/chat/history/', views.chat_history, name='chat_history'),
     path('api/chat/feedback/', views.feedback_api, name='feedback_api'),
     path('api/delete-chat/', views.delete_chat_session, name='delete_chat_session'),
@@ -17,4 +19,7 @@ urlpatterns = [
     path('api/chat/delete-message/', views.delete_message_api, name='delete_message_api'),
     path('api/chat/search/', views.search_messages_api, name='search_messages_api'),
     path('api/chat/export/', views.export_conversation_api, name='export_conversation_api'),
+    # Monitoring
+    path('api/admin/activity/', views.activity_stats_api, name='activity_stats_api'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -4,16 +4,35 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 import json
 import random
+import time
 import logging
-from .models import UserProfile, ChatSession, ChatMessage, UserActivity
+from .models import UserProfile, ChatSession, ChatMessage, UserActivity, ArchivedSession
 from .forms import CustomUserCreationForm, UserProfileForm
-import pickle
+from .api_auth import api_login_required, issue_api_token, get_api_token_max_age
+from .fastjson import FastJsonResponse, parse_json_body
+from .admission import admission_control, batch_cost
+from .singleflight import SingleFlight
+from .shadow import observe_model_call
+from .cache import get_home_data, get_home_cache_timeout
+from .profiling import stage
+from . import metrics
+from .deletion import delete_session_auto, delete_messages
+from .session_stats import record_messages_added
+from .response_store import intern_response_text, intern_response_texts
+from .fields import compressed_lookup
+from .activity import day_start, rolled_up_until, truncate_hour, usage_series
+from .archive import archived_matches, get_session_messages, lock_sessions_for_write, restore_for_message
 import os
 from pathlib import Path
 
@@ -55,28 +74,26 @@ def login_view(request):
         if not email or not password:
             messages.error(request, 'Please enter both email and password.')
         else:
-            # Try to authenticate with email
-            users = User.objects.filter(email=email)
-            if not users.exists():
+            # Authenticate with email (one indexed lookup, see backends.EmailBackend)
+            user = authenticate(request, email=email, password=password)
+            
+            if user is not None:
+                login(request, user)
+                log_user_activity(user, 'login', request)
+                messages.success(request, f'Welcome back, {user.first_name or user.username}!')
+                return redirect('home')
+            
+            error = getattr(request, 'email_auth_error', None)
+            if error == 'not_found':
                 # Handle user not found (invalid email)
                 messages.error(request, 'No user found with this email.')
-            elif users.count() > 1:
+            elif error == 'duplicate':
                 # Handle duplicate email error
                 messages.error(request, 'Multiple accounts found with this email. Please contact support.')
+            elif error == 'inactive':
+                messages.error(request, 'Your account has been deactivated.')
             else:
-                user_obj = users.first()
-                user = authenticate(request, username=user_obj.username, password=password)
-                
-                if user is not None:
-                    if user.is_active:
-                        login(request, user)
-                        log_user_activity(user, 'login', request)
-                        messages.success(request, f'Welcome back, {user.first_name or user.username}!')
-                        return redirect('home')
-                    else:
-                        messages.error(request, 'Your account has been deactivated.')
-                else:
-                    messages.error(request, 'Invalid email or password.')
+                messages.error(request, 'Invalid email or password.')
     
     context = {
         'page_id': 'login-page',
@@ -124,16 +141,17 @@ def register_view(request):
 @login_required
 def home_view(request):
     """Main dashboard/chat interface"""
-    # Get user's chat sessions
-    chat_sessions = ChatSession.objects.filter(user=request.user)[:10]
-    
-    # Get user profile
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Get user's profile and chat sessions (cached per user, see cache.py)
+    home_data = get_home_data(request.user)
     
     context = {
         'user': request.user,
-        'profile': profile,
-        'chat_sessions': chat_sessions,
+        'profile': home_data['profile'],
+        'chat_sessions': home_data['chat_sessions'],
+        'cache_version': home_data['version'],
+        'cache_timeout': get_home_cache_timeout(),
+        'api_token': issue_api_token(request.user),
+        'chat_socket_path': settings.CHAT_WEBSOCKET_PATH if getattr(settings, 'CHAT_WEBSOCKET_ENABLED', False) else '',
         'site_config': {
             'name': 'CipherDepth',
             'theme_colors': {
@@ -147,6 +165,15 @@ def home_view(request):
     
     return render(request, 'cipherapp/home.html', context)
 
+@login_required
+def api_token_view(request):
+    """Issue a fresh stateless API token for the logged-in user"""
+    return FastJsonResponse({
+        'success': True,
+        'token': issue_api_token(request.user),
+        'expires_in': get_api_token_max_age()
+    })
+
 def logout_view(request):
     """Handle user logout"""
     if request.user.is_authenticated:
@@ -155,217 +182,447 @@ def logout_view(request):
         messages.info(request, 'You have been logged out successfully.')
     return redirect('login')
 
-@login_required
+def save_chat_turn(request, chat_session, message, bot_response):
+    """
+    Write a user/bot message pair, update the session's stats and log the
+    activity in a single transaction: the session lock (or INSERT of a new
+    session), two message INSERTs, the stats UPDATE and the activity INSERT,
+    plus the ResponseText lookup when the reply is not cached yet.
+    
+    A missing chat_session is created with a title taken from the message.
+    Returns (chat_session, user_message, bot_message).
+    """
+    with transaction.atomic():
+        if chat_session is None:
+            chat_session = ChatSession.objects.create(
+                user=request.user,
+                title=message[:50] + ('...' if len(message) > 50 else '')
+            )
+        else:
+            # First write since archiving brings the session's rows back
+            lock_sessions_for_write([chat_session])
+        
+        user_message = ChatMessage.objects.create(
+            session=chat_session,
+            message_type='user',
+            content=message
+        )
+        bot_message = ChatMessage.objects.create(
+            session=chat_session,
+            message_type='bot',
+            response_text=intern_response_text(bot_response),
+            linked_message=user_message  # Link bot response to user message
+        )
+        
+        # One UPDATE for the session's counters, last message and updated_at
+        record_messages_added(chat_session, [user_message, bot_message])
+        
+        # Log activity
+        log_user_activity(request.user, 'message_sent', request)
+    
+    return chat_session, user_message, bot_message
+
+@api_login_required
+@admission_control()
 @csrf_exempt
 def chat_api(request):
     """API endpoint for chat functionality"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = parse_json_body(request)
             message = data.get('message', '').strip()
             session_id = data.get('session_id')
             
             if not message:
-                return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+                return FastJsonResponse({'error': 'Message cannot be empty'}, status=400)
             
-            # Get or create chat session
+            # Look up the session (read only; nothing is written until the reply exists)
+            chat_session = None
             if session_id:
-                try:
-                    chat_session = ChatSession.objects.get(id=session_id, user=request.user)
-                except ChatSession.DoesNotExist:
-                    chat_session = ChatSession.objects.create(
-                        user=request.user,
-                        title=message[:50] + ('...' if len(message) > 50 else '')
-                    )
-            else:
-                chat_session = ChatSession.objects.create(
-                    user=request.user,
-                    title=message[:50] + ('...' if len(message) > 50 else '')
-                )
+                chat_session = ChatSession.objects.filter(id=session_id, user=request.user).first()
             
-            # Save user message
-            user_message = ChatMessage.objects.create(
-                session=chat_session,
-                message_type='user',
-                content=message
-            )
-            
-            # Generate bot response using RL-improved responses
-            bot_response = generate_bot_response(message, user_message)
-            
-            bot_message = ChatMessage.objects.create(
-                session=chat_session,
-                message_type='bot',
-                content=bot_response,
-                linked_message=user_message  # Link bot response to user message
-            )
+            # Generate bot response using RL-improved responses, holding no write lock
+            bot_response = generate_bot_response(message)
             
-            # Log activity
-            log_user_activity(request.user, 'message_sent', request)
+            # Persist the whole turn in one short transaction
+            with stage('persist'):
+                chat_session, user_message, bot_message = save_chat_turn(
+                    request, chat_session, message, bot_response
+                )
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'session_id': chat_session.id,
                 'user_message': {
                     'id': user_message.id,
                     'content': user_message.content,
-                    'timestamp': user_message.timestamp.isoformat()
+                    'timestamp': user_message.timestamp
                 },
                 'bot_message': {
                     'id': bot_message.id,
                     'content': bot_message.content,
-                    'timestamp': bot_message.timestamp.isoformat()
+                    'timestamp': bot_message.timestamp
                 }
             })
             
         except json.JSONDecodeError:
-            return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+            return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
         except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
+            return FastJsonResponse({'error': str(e)}, status=500)
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
+    return FastJsonResponse({'error': 'Method not allowed'}, status=405)
 
-@login_required
+def save_chat_batch(request, sessions, session_ids, message_texts, bot_responses):
+    """
+    Write a batch of user/bot message pairs with bulk INSERTs in a single
+    transaction, update the sessions' stats and log the activity.
+    
+    Turns whose session id is None go into one new session titled after the
+    first of them. Messages get increasing timestamps in submission order so
+    each session's history interleaves user and bot messages correctly.
+    Returns a list of (chat_session, user_message, bot_message).
+    """
+    with transaction.atomic():
+        new_session = None
+        if None in session_ids:
+            first_message = message_texts[session_ids.index(None)]
+            new_session = ChatSession.objects.create(
+                user=request.user,
+                title=first_message[:50] + ('...' if len(first_message) > 50 else '')
+            )
+        turn_sessions = [sessions[session_id] if session_id else new_session for session_id in session_ids]
+        lock_sessions_for_write(sessions.values())
+        
+        user_messages = bulk_create_messages([
+            ChatMessage(session=chat_session, message_type='user', content=message)
+            for chat_session, message in zip(turn_sessions, message_texts)
+        ])
+        bot_messages = bulk_create_messages([
+            ChatMessage(session=chat_session, message_type='bot', response_text=response_text, linked_message=user_message)
+            for chat_session, response_text, user_message in zip(
+                turn_sessions, intern_response_texts(bot_responses), user_messages
+            )
+        ])
+        
+        # auto_now_add stamps each INSERT batch separately; restore turn order
+        base = timezone.now()
+        for i, (user_message, bot_message) in enumerate(zip(user_messages, bot_messages)):
+            user_message.timestamp = base + timedelta(microseconds=2 * i)
+            bot_message.timestamp = base + timedelta(microseconds=2 * i + 1)
+        ChatMessage.objects.bulk_update(user_messages + bot_messages, ['timestamp'])
+        
+        # One stats UPDATE per session touched
+        added = {}
+        for chat_session, user_message, bot_message in zip(turn_sessions, user_messages, bot_messages):
+            added.setdefault(chat_session.id, (chat_session, []))[1].extend([user_message, bot_message])
+        for chat_session, chat_messages in added.values():
+            record_messages_added(chat_session, chat_messages)
+        
+        # Log activity
+        ip_address = get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        UserActivity.objects.bulk_create([
+            UserActivity(user=request.user, action='message_sent', ip_address=ip_address, user_agent=user_agent)
+            for _ in message_texts
+        ])
+    
+    return list(zip(turn_sessions, user_messages, bot_messages))
+
+def bulk_create_messages(chat_messages):
+    """bulk_create ChatMessages, saving one by one where the backend cannot return primary keys"""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return ChatMessage.objects.bulk_create(chat_messages)
+    # Bot replies need the user messages' ids for linked_message
+    for chat_message in chat_messages:
+        chat_message.save()
+    return chat_messages
+
+@api_login_required
+@admission_control(cost=batch_cost)
+@csrf_exempt
+def chat_batch_api(request):
+    """
+    API endpoint for submitting many chat messages in one request.
+    
+    Body: {"session_id": optional default, "messages": [{"message": ..., "session_id": ...}, ...]}
+    (plain strings are accepted as items). Messages without a session id go
+    into one new session. Results are returned in submission order.
+    """
+    if request.method == 'POST':
+        try:
+            data = parse_json_body(request)
+            items = data.get('messages')
+            max_messages = getattr(settings, 'CHAT_BATCH_MAX_MESSAGES', 100)
+            
+            if not isinstance(items, list) or not items:
+                return FastJsonResponse({'error': 'Messages must be a non-empty list'}, status=400)
+            if len(items) > max_messages:
+                return FastJsonResponse({'error': f'A batch can contain at most {max_messages} messages'}, status=400)
+            
+            message_texts = []
+            session_ids = []
+            for index, item in enumerate(items):
+                if isinstance(item, str):
+                    item = {'message': item}
+                if not isinstance(item, dict):
+                    return FastJsonResponse({'error': f'Item {index} must be an object or a string'}, status=400)
+                message = str(item.get('message') or '').strip()
+                if not message:
+                    return FastJsonResponse({'error': f'Message {index} cannot be empty'}, status=400)
+                session_id = item.get('session_id', data.get('session_id'))
+                try:
+                    session_id = int(session_id) if session_id else None
+                except (TypeError, ValueError):
+                    return FastJsonResponse({'error': f'Invalid session ID for item {index}'}, status=400)
+                message_texts.append(message)
+                session_ids.append(session_id)
+            
+            # One query for every session the batch refers to
+            requested = {session_id for session_id in session_ids if session_id}
+            sessions = {
+                chat_session.id: chat_session
+                for chat_session in ChatSession.objects.filter(id__in=requested, user=request.user)
+            }
+            missing = sorted(requested - sessions.keys())
+            if missing:
+                return FastJsonResponse({'error': 'Chat session not found', 'session_ids': missing}, status=404)
+            
+            # Generate all bot responses before opening the write transaction
+            bot_responses = generate_bot_responses(message_texts)
+            
+            with stage('persist'):
+                turns = save_chat_batch(request, sessions, session_ids, message_texts, bot_responses)
+            
+            return FastJsonResponse({
+                'success': True,
+                'results': [
+                    {
+                        'session_id': chat_session.id,
+                        'user_message': {
+                            'id': user_message.id,
+                            'content': user_message.content,
+                            'timestamp': user_message.timestamp
+                        },
+                        'bot_message': {
+                            'id': bot_message.id,
+                            'content': bot_message.content,
+                            'timestamp': bot_message.timestamp
+                        }
+                    }
+                    for chat_session, user_message, bot_message in turns
+                ]
+            })
+            
+        except json.JSONDecodeError:
+            return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
+        except Exception as e:
+            logger.error(f"Error in chat batch API: {e}")
+            return FastJsonResponse({'error': str(e)}, status=500)
+    
+    return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+@api_login_required
 @csrf_exempt
 def feedback_api(request):
     """API endpoint for submitting feedback on bot responses"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = parse_json_body(request)
             message_id = data.get('message_id')
             feedback_type = data.get('feedback_type')  # 'positive' or 'negative'
             
             if not message_id or not feedback_type:
-                return JsonResponse({'error': 'Message ID and feedback type are required'}, status=400)
+                return FastJsonResponse({'error': 'Message ID and feedback type are required'}, status=400)
             
             if feedback_type not in ['positive', 'negative']:
-                return JsonResponse({'error': 'Invalid feedback type'}, status=400)
+                return FastJsonResponse({'error': 'Invalid feedback type'}, status=400)
             
             # Use RL service to record feedback
             from .rl_service import rl_service
             
             success = rl_service.record_feedback(message_id, request.user, feedback_type)
+            if not success and restore_for_message(request.user, message_id):
+                # The message was archived; feedback is a write, so restore and retry
+                success = rl_service.record_feedback(message_id, request.user, feedback_type)
             
             if success:
                 # Log activity
                 log_user_activity(request.user, f'feedback_{feedback_type}', request)
                 
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': True,
                     'message': f'Feedback recorded successfully',
                     'feedback_type': feedback_type
                 })
             else:
-                return JsonResponse({'error': 'Failed to record feedback'}, status=500)
+                return FastJsonResponse({'error': 'Failed to record feedback'}, status=500)
                 
         except json.JSONDecodeError:
-            return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+            return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
         except Exception as e:
             logger.error(f"Error in feedback API: {e}")
-            return JsonResponse({'error': 'An error occurred while submitting feedback'}, status=500)
+            return FastJsonResponse({'error': 'An error occurred while submitting feedback'}, status=500)
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
+    return FastJsonResponse({'error': 'Method not allowed'}, status=405)
+
+# Canned replies for common greetings and questions, checked before anything else
+RULE_RESPONSES = [
+    (('hello', 'hi', 'hey'), "Hello! How can I assist you today?"),
+    (('help', 'what can you do'), "I'm CipherDepth, your AI assistant. I can help you with questions, provide information, assist with tasks, and engage in conversations. What would you like to know?"),
+    (('thank', 'thanks'), "You're welcome! I'm happy to help. Is there anything else you'd like to know?"),
+    (('weather',), "I don't have access to real-time weather data, but I'd recommend checking a weather app or website for current conditions in your area."),
+    (('time', 'date'), "I don't have access to real-time data, but you can check your device's clock for the current time and date."),
+    (('cipher', 'encryption'), "I'd be happy to help with cryptography and encryption questions! Ciphers are fascinating - from simple Caesar ciphers to modern AES encryption. What specific aspect interests you?"),
+]
+
+# Default responses for general queries
+FALLBACK_RESPONSES = [
+    "That's an interesting question! Could you provide more details so I can give you a better response?",
+    "I'd be happy to help with that. Could you elaborate on what specific information you're looking for?",
+    "Let me help you with that. Can you provide a bit more context about your question?",
+    "That sounds like something I can assist with. What would you like to know more about?",
+    "I'm here to help! Could you give me more details about what you're looking for?"
+]
+
+ERROR_RESPONSE = "I'd be happy to help you with that! Could you provide more details about your question?"
+
+def get_rule_response(message):
+    """Return the canned reply for a basic greeting or common query, or None"""
+    message_lower = message.lower()
+    for words, response in RULE_RESPONSES:
+        if any(word in message_lower for word in words):
+            return response
+    return None
+
+# Concurrent requests for the same message share one pipeline run
+response_flight = SingleFlight()
+
+def coalesce_key(message):
+    """Messages that differ only in case or spacing get the same response"""
+    return ' '.join(message.lower().split())
 
 def generate_bot_response(message, user_message=None):
     """
     Generate bot response using chatbot model, enhanced knowledge base, and RL improvements.
     """
+    if not getattr(settings, 'CHAT_COALESCE_ENABLED', True):
+        return generate_bot_responses([message])[0]
+    return response_flight.do(
+        coalesce_key(message),
+        lambda: generate_bot_responses([message])[0],
+        timeout=getattr(settings, 'CHAT_COALESCE_TIMEOUT', 10),
+    )
+
+def generate_bot_responses(messages):
+    """
+    Generate bot responses for a list of messages, in order.
+    
+    Each pipeline step runs once over the messages still unanswered: the
+    knowledge base is loaded once for the whole list and the chatbot model
+    is loaded once and called with a single predict().
+    """
     try:
         # Import RL service
         from .rl_service import rl_service
         
+        base_responses = [None] * len(messages)
+        sources = ['rule'] * len(messages)
+        
         # Step 1: Check for basic greetings and common queries first
-        base_response = None
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ['hello', 'hi', 'hey']):
-            base_response = "Hello! How can I assist you today?"
-        elif any(word in message_lower for word in ['help', 'what can you do']):
-            base_response = "I'm CipherDepth, your AI assistant. I can help you with questions, provide information, assist with tasks, and engage in conversations. What would you like to know?"
-        elif any(word in message_lower for word in ['thank', 'thanks']):
-            base_response = "You're welcome! I'm happy to help. Is there anything else you'd like to know?"
-        elif 'weather' in message_lower:
-            base_response = "I don't have access to real-time weather data, but I'd recommend checking a weather app or website for current conditions in your area."
-        elif any(word in message_lower for word in ['time', 'date']):
-            base_response = "I don't have access to real-time data, but you can check your device's clock for the current time and date."
-        elif 'cipher' in message_lower or 'encryption' in message_lower:
-            base_response = "I'd be happy to help with cryptography and encryption questions! Ciphers are fascinating - from simple Caesar ciphers to modern AES encryption. What specific aspect interests you?"
-            
+        with stage('rules'):
+            for i, message in enumerate(messages):
+                base_responses[i] = get_rule_response(message)
+        
         # Step 2: If no basic response, check the enhanced knowledge base
-        if base_response is None:
-            kb_response = search_knowledge_base(message)
-            if kb_response:
-                base_response = kb_response
-                logger.info("Response generated from knowledge base")
+        pending = [i for i, response in enumerate(base_responses) if response is None]
+        if pending:
+            with stage('kb'):
+                knowledge_base = load_knowledge_base()
+                if knowledge_base is not None:
+                    for i in pending:
+                        kb_response = match_knowledge_base(messages[i], knowledge_base)
+                        if kb_response:
+                            base_responses[i] = kb_response
+                            sources[i] = 'knowledge_base'
+                            logger.info("Response generated from knowledge base")
         
         # Step 3: If still no response, use the chatbot model
-        if base_response is None:
-            model_response = get_model_response(message)
-            if model_response:
-                base_response = model_response
-                logger.info("Response generated from chatbot model")
+        pending = [i for i, response in enumerate(base_responses) if response is None]
+        if pending:
+            with stage('model'):
+                model_responses = get_model_responses([messages[i] for i in pending])
+            for i, model_response in zip(pending, model_responses):
+                if model_response:
+                    base_responses[i] = model_response
+                    sources[i] = 'chatbot_model'
+                    logger.info("Response generated from chatbot model")
         
         # Step 4: If still no response, use fallback responses
-        if base_response is None:
-            # Default responses for general queries
-            responses = [
-                "That's an interesting question! Could you provide more details so I can give you a better response?",
-                "I'd be happy to help with that. Could you elaborate on what specific information you're looking for?",
-                "Let me help you with that. Can you provide a bit more context about your question?",
-                "That sounds like something I can assist with. What would you like to know more about?",
-                "I'm here to help! Could you give me more details about what you're looking for?"
-            ]
-            base_response = random.choice(responses)
+        for i, response in enumerate(base_responses):
+            if response is None:
+                base_responses[i] = random.choice(FALLBACK_RESPONSES)
+                sources[i] = 'fallback'
         
-        # Step 5: Use RL service to improve the response based on past feedback
-        improved_response = rl_service.generate_improved_response(message, base_response)
-        return improved_response
+        for source in sources:
+            metrics.response_source.inc(source)
+        
+        # Step 5: Use RL service to improve each response based on past feedback
+        with stage('rl'):
+            return [
+                rl_service.generate_improved_response(message, base_response)
+                for message, base_response in zip(messages, base_responses)
+            ]
         
     except Exception as e:
         logger.error(f"Error generating response: {e}")
         # Fallback to basic response
-        return "I'd be happy to help you with that! Could you provide more details about your question?"
+        return [ERROR_RESPONSE] * len(messages)
 
-@login_required
+@api_login_required
 def chat_history(request):
     """Get chat history for a session"""
     session_id = request.GET.get('session_id')
     if session_id:
         try:
             session = ChatSession.objects.get(id=session_id, user=request.user)
-            messages = session.messages.all()
+            # Archived sessions are read from their archive without restoring them
+            messages = get_session_messages(session)
             
             message_data = [{
                 'id': msg.id,
                 'type': msg.message_type,
                 'content': msg.content,
-                'timestamp': msg.timestamp.isoformat(),
-                'linked_message_id': msg.linked_message.id if msg.linked_message else None
+                'timestamp': msg.timestamp,
+                'linked_message_id': msg.linked_message_id
             } for msg in messages]
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'session': {
                     'id': session.id,
                     'title': session.title,
-                    'created_at': session.created_at.isoformat()
+                    'created_at': session.created_at,
+                    'archived': session.archived_at is not None
                 },
                 'messages': message_data
             })
         except ChatSession.DoesNotExist:
-            return JsonResponse({'error': 'Session not found'}, status=404)
+            return FastJsonResponse({'error': 'Session not found'}, status=404)
     
     # Return all sessions if no specific session requested
     sessions = ChatSession.objects.filter(user=request.user)
     session_data = [{
         'id': session.id,
         'title': session.title,
-        'created_at': session.created_at.isoformat(),
-        'updated_at': session.updated_at.isoformat(),
-        'message_count': session.messages.count()
+        'created_at': session.created_at,
+        'updated_at': session.updated_at,
+        'message_count': session.message_count,
+        'last_message_at': session.last_message_at,
+        'last_message_preview': session.last_message_preview,
+        'archived': session.archived_at is not None
     } for session in sessions]
     
-    return JsonResponse({
+    return FastJsonResponse({
         'success': True,
         'sessions': session_data
     })
@@ -376,231 +633,264 @@ def delete_chat_session(request):
     """Delete a chat session"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = parse_json_body(request)
             session_id = data.get('session_id')
             
             if not session_id:
-                return JsonResponse({'error': 'Session ID is required'}, status=400)
+                return FastJsonResponse({'error': 'Session ID is required'}, status=400)
             
             # Get the session and verify ownership
             try:
                 session = ChatSession.objects.get(id=session_id, user=request.user)
                 session_title = session.title
-                session.delete()
+                # Set-based delete; huge sessions are hidden now and purged in the background
+                status = delete_session_auto(session)
                 
                 log_user_activity(request.user, 'delete_chat_session', request)
                 
-                return JsonResponse({
+                return FastJsonResponse({
                     'success': True,
-                    'message': f'Chat session "{session_title}" deleted successfully'
+                    'message': f'Chat session "{session_title}" deleted successfully',
+                    'purge': status
                 })
                 
             except ChatSession.DoesNotExist:
-                return JsonResponse({'error': 'Chat session not found'}, status=404)
+                return FastJsonResponse({'error': 'Chat session not found'}, status=404)
                 
         except json.JSONDecodeError:
-            return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+            return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
         except Exception as e:
-            return JsonResponse({'error': 'An error occurred while deleting the chat session'}, status=500)
+            return FastJsonResponse({'error': 'An error occurred while deleting the chat session'}, status=500)
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
+    return FastJsonResponse({'error': 'Method not allowed'}, status=405)
 
 # Message Management API Views
 
-@login_required
+@api_login_required
+@admission_control()
 def edit_message_api(request):
     """API endpoint for editing messages"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        data = json.loads(request.body)
+        data = parse_json_body(request)
         message_id = data.get('message_id')
         new_text = data.get('new_text', '').strip()
         
         if not message_id or not new_text:
-            return JsonResponse({'error': 'Message ID and new text are required'}, status=400)
+            return FastJsonResponse({'error': 'Message ID and new text are required'}, status=400)
         
         # Get the message and verify ownership
-        try:
-            message = ChatMessage.objects.get(
-                id=message_id,
-                session__user=request.user,
-                message_type='user'  # Only allow editing user messages
-            )
-        except ChatMessage.DoesNotExist:
-            return JsonResponse({'error': 'Message not found or access denied'}, status=404)
-        
-        # Update the message
-        message.content = new_text
-        message.save()
-        
-        # Remove the old linked bot response since it's no longer relevant
-        removed_bot_id = None
-        bot_response = ChatMessage.objects.filter(linked_message=message).first()
-        if bot_response:
-            removed_bot_id = bot_response.id
-            bot_response.delete()
+        message_filter = dict(
+            id=message_id,
+            session__user=request.user,
+            session__deleted_at__isnull=True,
+            message_type='user'  # Only allow editing user messages
+        )
+        message = ChatMessage.objects.filter(**message_filter).first()
+        if message is None and restore_for_message(request.user, message_id):
+            message = ChatMessage.objects.filter(**message_filter).first()
+        if message is None:
+            return FastJsonResponse({'error': 'Message not found or access denied'}, status=404)
         
-        # Generate a new bot response for the edited message
+        # Generate a new bot response for the edited message before writing anything
         new_bot_response = generate_bot_response(new_text)
         
-        new_bot_message = ChatMessage.objects.create(
-            session=message.session,
-            message_type='bot',
-            content=new_bot_response,
-            linked_message=message
-        )
+        with transaction.atomic():
+            # An archive run since the lookup would have moved the message
+            lock_sessions_for_write([message.session])
+            
+            # Update the message
+            message.content = new_text
+            message.save(update_fields=['inline_content', 'response_text'])
+            
+            # Remove the old linked bot responses since they're no longer relevant
+            old_bot_ids = list(ChatMessage.objects.filter(linked_message=message).values_list('id', flat=True))
+            removed_bot_id = old_bot_ids[0] if old_bot_ids else None
+            removed = delete_messages(old_bot_ids, update_stats=False)
+            
+            new_bot_message = ChatMessage.objects.create(
+                session=message.session,
+                message_type='bot',
+                response_text=intern_response_text(new_bot_response),
+                linked_message=message
+            )
+            record_messages_added(message.session, [new_bot_message], removed=removed)
         
         # Log the activity
         log_user_activity(request.user, 'EDIT_MESSAGE', request)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'message': 'Message updated successfully',
             'removed_bot_id': removed_bot_id,
             'new_bot_message': {
                 'id': new_bot_message.id,
                 'content': new_bot_message.content,
-                'timestamp': new_bot_message.timestamp.isoformat()
+                'timestamp': new_bot_message.timestamp
             }
         })
         
     except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+        return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
-@login_required
+@api_login_required
 def delete_message_api(request):
     """API endpoint for deleting messages"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        data = json.loads(request.body)
+        data = parse_json_body(request)
         message_id = data.get('message_id')
         
         if not message_id:
-            return JsonResponse({'error': 'Message ID is required'}, status=400)
+            return FastJsonResponse({'error': 'Message ID is required'}, status=400)
         
         # Get the message and verify ownership
-        try:
-            message = ChatMessage.objects.get(
-                id=message_id,
-                session__user=request.user
-            )
-        except ChatMessage.DoesNotExist:
-            return JsonResponse({'error': 'Message not found or access denied'}, status=404)
-        
-        # Find linked messages that should be deleted together
-        messages_to_delete = [message]
-        
-        if message.message_type == 'user':
-            # If deleting a user message, also delete its bot response
-            bot_response = ChatMessage.objects.filter(linked_message=message).first()
-            if bot_response:
-                messages_to_delete.append(bot_response)
-        elif message.message_type == 'bot' and message.linked_message:
-            # If deleting a bot message, also delete its linked user message
-            messages_to_delete.append(message.linked_message)
-        
-        # Delete all linked messages
-        deleted_ids = [msg.id for msg in messages_to_delete]
-        for msg in messages_to_delete:
-            msg.delete()
+        message_filter = dict(
+            id=message_id,
+            session__user=request.user,
+            session__deleted_at__isnull=True
+        )
+        message = ChatMessage.objects.filter(**message_filter).first()
+        if message is None and restore_for_message(request.user, message_id):
+            message = ChatMessage.objects.filter(**message_filter).first()
+        if message is None:
+            return FastJsonResponse({'error': 'Message not found or access denied'}, status=404)
+        
+        # Find linked messages that should be deleted together: a user message
+        # takes its bot responses with it, a bot message takes its user message
+        base_ids = [message.id]
+        if message.message_type == 'bot' and message.linked_message_id:
+            base_ids.append(message.linked_message_id)
+        
+        deleted_ids = list(ChatMessage.objects.filter(
+            Q(id__in=base_ids) | Q(linked_message_id__in=base_ids)
+        ).values_list('id', flat=True))
+        
+        # Delete all linked messages (and their feedback) in one transaction
+        delete_messages(deleted_ids)
         
         # Log the activity
         log_user_activity(request.user, 'DELETE_MESSAGE', request)
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'message': 'Message(s) deleted successfully',
             'deleted_ids': deleted_ids
         })
         
     except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+        return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
-@login_required
+@api_login_required
 def search_messages_api(request):
     """API endpoint for searching messages"""
     if request.method != 'GET':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
         query = request.GET.get('query', '').strip()
         session_id = request.GET.get('session_id')
         
         if len(query) < 2:
-            return JsonResponse({'error': 'Query must be at least 2 characters'}, status=400)
+            return FastJsonResponse({'error': 'Query must be at least 2 characters'}, status=400)
         
         # Build the search query
-        messages_query = ChatMessage.objects.filter(
+        messages_query = ChatMessage.objects.with_text().filter(
             session__user=request.user,
-            content__icontains=query
-        ).order_by('-created_at')
+            session__deleted_at__isnull=True
+        )
+        
+        # Archived sessions are searched too, in their archives
+        archives = ArchivedSession.objects.filter(user=request.user, session__deleted_at__isnull=True)
         
         # Filter by session if provided
         if session_id:
             messages_query = messages_query.filter(session_id=session_id)
+            archives = archives.filter(session_id=session_id)
         
-        # Get the messages
-        messages = list(messages_query.values(
-            'id', 'content', 'message_type', 'created_at', 'session_id', 'session__title'
-        )[:50])  # Limit to 50 results
+        fields = ('id', 'text', 'message_type', 'timestamp', 'session_id', 'session__title')
+        compressed = compressed_lookup('text')
+        
+        # Plaintext rows are matched by the database
+        messages = list(messages_query.filter(text__icontains=query).exclude(compressed)
+                        .order_by('-timestamp').values(*fields)[:50])  # Limit to 50 results
+        
+        # Compressed rows cannot be; decode them newest first until no older
+        # row could still make the 50 most recent matches
+        chunk_size = getattr(settings, 'SEARCH_COMPRESSED_CHUNK_SIZE', 500)
+        query_lower = query.lower()
+        for msg in messages_query.filter(compressed).order_by('-timestamp').values(*fields).iterator(chunk_size=chunk_size):
+            if len(messages) >= 50 and msg['timestamp'] < messages[-1]['timestamp']:
+                break
+            msg['text'] = str(msg['text'])
+            if query_lower in msg['text'].lower():
+                messages.append(msg)
+                messages = sorted(messages, key=lambda msg: msg['timestamp'], reverse=True)[:50]
+        
+        # Archives newest session first; a session's messages are no newer than its last one
+        for archive in archives.select_related('session').order_by('-session__last_message_at').iterator(chunk_size=20):
+            if len(messages) >= 50 and archive.session.last_message_at < messages[-1]['timestamp']:
+                break
+            messages.extend(archived_matches(archive, query))
+            messages = sorted(messages, key=lambda msg: msg['timestamp'], reverse=True)[:50]
         
         # Format the results
         results = []
         for msg in messages:
             results.append({
                 'id': msg['id'],
-                'content': msg['content'][:200] + ('...' if len(msg['content']) > 200 else ''),
+                'content': msg['text'][:200] + ('...' if len(msg['text']) > 200 else ''),
                 'type': msg['message_type'],
-                'timestamp': msg['created_at'].isoformat(),
+                'timestamp': msg['timestamp'],
                 'session_id': msg['session_id'],
                 'session_title': msg['session__title']
             })
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'results': results,
             'count': len(results)
         })
         
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
-@login_required
+@api_login_required
 def export_conversation_api(request):
     """API endpoint for exporting conversations"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+        return FastJsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        data = json.loads(request.body)
+        data = parse_json_body(request)
         session_id = data.get('session_id')
         export_format = data.get('format', 'txt').lower()
         
         if not session_id:
-            return JsonResponse({'error': 'Session ID is required'}, status=400)
+            return FastJsonResponse({'error': 'Session ID is required'}, status=400)
         
         if export_format not in ['txt', 'md', 'pdf']:
-            return JsonResponse({'error': 'Invalid format. Use txt, md, or pdf'}, status=400)
+            return FastJsonResponse({'error': 'Invalid format. Use txt, md, or pdf'}, status=400)
         
         # Get the session and verify ownership
         try:
             session = ChatSession.objects.get(id=session_id, user=request.user)
         except ChatSession.DoesNotExist:
-            return JsonResponse({'error': 'Session not found or access denied'}, status=404)
+            return FastJsonResponse({'error': 'Session not found or access denied'}, status=404)
         
-        # Get all messages in the session
-        messages = ChatMessage.objects.filter(session=session).order_by('created_at')
+        # Get all messages in the session (from its archive if it has been archived)
+        messages = get_session_messages(session)
         
-        if not messages.exists():
-            return JsonResponse({'error': 'No messages found in this session'}, status=404)
+        if not messages:
+            return FastJsonResponse({'error': 'No messages found in this session'}, status=404)
         
         # Generate export content based on format
         if export_format == 'txt':
@@ -622,9 +912,9 @@ def export_conversation_api(request):
         return response
         
     except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+        return FastJsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        return FastJsonResponse({'error': str(e)}, status=500)
 
 def export_as_txt(session, messages):
     """Export conversation as plain text"""
@@ -635,7 +925,7 @@ def export_as_txt(session, messages):
     lines.append("")
     
     for message in messages:
-        timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         sender = "You" if message.message_type == 'user' else "Assistant"
         lines.append(f"[{timestamp}] {sender}:")
         lines.append(message.content)
@@ -651,7 +941,7 @@ def export_as_markdown(session, messages):
     lines.append("")
     
     for message in messages:
-        timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         sender = "You" if message.message_type == 'user' else "Assistant"
         lines.append(f"## {sender} - {timestamp}")
         lines.append("")
@@ -708,7 +998,7 @@ def export_as_pdf(session, messages):
         
         # Messages
         for message in messages:
-            timestamp = message.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            timestamp = message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
             sender = "You" if message.message_type == 'user' else "Assistant"
             
             # Header
@@ -732,38 +1022,40 @@ def export_as_pdf(session, messages):
 def message_feedback(request):
     """Handle user feedback for bot messages"""
     if request.method != 'POST':
-        return JsonResponse({'error': 'Only POST method allowed'}, status=405)
+        return FastJsonResponse({'error': 'Only POST method allowed'}, status=405)
     
     try:
-        data = json.loads(request.body)
+        data = parse_json_body(request)
         message_id = data.get('message_id')
         feedback_type = data.get('feedback_type')
         
         if not message_id or feedback_type not in ['positive', 'negative']:
-            return JsonResponse({'error': 'Invalid parameters'}, status=400)
+            return FastJsonResponse({'error': 'Invalid parameters'}, status=400)
         
         # Import RL service
         from .rl_service import rl_service
         
         # Record feedback
         success = rl_service.record_feedback(message_id, request.user, feedback_type)
+        if not success and restore_for_message(request.user, message_id):
+            success = rl_service.record_feedback(message_id, request.user, feedback_type)
         
         if success:
             # Log user activity
             log_user_activity(request.user, f'feedback_{feedback_type}', request)
             
-            return JsonResponse({
+            return FastJsonResponse({
                 'success': True,
                 'message': f'Thank you for your {feedback_type} feedback!'
             })
         else:
-            return JsonResponse({'error': 'Failed to record feedback'}, status=500)
+            return FastJsonResponse({'error': 'Failed to record feedback'}, status=500)
             
     except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        return FastJsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
         logger.error(f"Error in message_feedback: {e}")
-        return JsonResponse({'error': 'Internal server error'}, status=500)
+        return FastJsonResponse({'error': 'Internal server error'}, status=500)
 
 @login_required
 def rl_stats(request):
@@ -773,24 +1065,24 @@ def rl_stats(request):
         
         performance = rl_service.get_model_performance()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'stats': performance
         })
         
     except Exception as e:
         logger.error(f"Error getting RL stats: {e}")
-        return JsonResponse({'error': 'Failed to get statistics'}, status=500)
+        return FastJsonResponse({'error': 'Failed to get statistics'}, status=500)
 
 @csrf_exempt
 @login_required
 def retrain_model(request):
     """Manually trigger model retraining (admin only)"""
     if not request.user.is_staff:
-        return JsonResponse({'error': 'Admin access required'}, status=403)
+        return FastJsonResponse({'error': 'Admin access required'}, status=403)
     
     if request.method != 'POST':
-        return JsonResponse({'error': 'Only POST method allowed'}, status=405)
+        return FastJsonResponse({'error': 'Only POST method allowed'}, status=405)
     
     try:
         from .rl_service import rl_service
@@ -798,7 +1090,7 @@ def retrain_model(request):
         rl_service.retrain_model()
         performance = rl_service.get_model_performance()
         
-        return JsonResponse({
+        return FastJsonResponse({
             'success': True,
             'message': 'Model retrained successfully',
             'stats': performance
@@ -806,14 +1098,82 @@ def retrain_model(request):
         
     except Exception as e:
         logger.error(f"Error retraining model: {e}")
-        return JsonResponse({'error': 'Failed to retrain model'}, status=500)
+        return FastJsonResponse({'error': 'Failed to retrain model'}, status=500)
+
+# Longest range /api/admin/activity/ serves per granularity, keeping responses to a few thousand rows
+ACTIVITY_STATS_MAX_DAYS = {'day': 366, 'hour': 14}
+
+@login_required
+def activity_stats_api(request):
+    """Usage counts per day or hour and action, read from the activity rollups (admin only)"""
+    if not request.user.is_staff:
+        return FastJsonResponse({'error': 'Admin access required'}, status=403)
+    
+    if request.method != 'GET':
+        return FastJsonResponse({'error': 'Only GET method allowed'}, status=405)
+    
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in ACTIVITY_STATS_MAX_DAYS:
+        return FastJsonResponse({'error': 'granularity must be "day" or "hour"'}, status=400)
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return FastJsonResponse({'error': 'days must be a number'}, status=400)
+    days = max(1, min(days, ACTIVITY_STATS_MAX_DAYS[granularity]))
+    
+    user = None
+    username = request.GET.get('user')
+    if username:
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            return FastJsonResponse({'error': 'User not found'}, status=404)
+    
+    try:
+        end = timezone.now()
+        if granularity == 'day':
+            start = day_start(timezone.localdate(end) - timedelta(days=days - 1))
+        else:
+            start = truncate_hour(end) - timedelta(hours=days * 24 - 1)
+        series = usage_series(start, end, granularity=granularity, user=user, action=request.GET.get('action'))
+        
+        totals = {}
+        for row in series:
+            totals[row['action']] = totals.get(row['action'], 0) + row['count']
+        watermark = rolled_up_until()
+        
+        return FastJsonResponse({
+            'success': True,
+            'granularity': granularity,
+            'start': start,
+            'end': end,
+            'rolled_up_until': watermark,
+            'totals': totals,
+            'series': series
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting activity stats: {e}")
+        return FastJsonResponse({'error': 'Failed to get activity statistics'}, status=500)
+
+def metrics_view(request):
+    """Prometheus metrics aggregated across all worker processes"""
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    if allowed_ips and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    
+    return HttpResponse(
+        metrics.registry.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 def load_chatbot_model():
     """
     Load the noaman_chatbot_model_final.pkl file
     """
     try:
-        model_path = Path(__file__).resolve().parent / 'noaman_chatbot_model_final.pkl'
+        model_path = getattr(settings, 'CHATBOT_MODEL_PATH', Path(__file__).resolve().parent / 'noaman_chatbot_model_final.pkl')
+        # Only needed when the model is actually loaded; keeps it out of worker boot
+        import pickle
         with open(model_path, 'rb') as f:
             chatbot_model = pickle.load(f)
         return chatbot_model
@@ -825,32 +1185,60 @@ def get_model_response(message):
     """
     Use the loaded model to generate a response
     """
+    return get_model_responses([message])[0]
+
+def get_model_responses(messages):
+    """
+    Generate model responses for a list of messages with one predict() call.
+    Returns a list with None for every message when the model is unavailable.
+    """
     try:
         chatbot_model = load_chatbot_model()
         if chatbot_model is None:
-            return None
+            return [None] * len(messages)
             
-        # Generate response from the model
+        # Generate responses from the model
         # Note: Adjust this code based on how your specific model works
-        response = chatbot_model.predict([message])[0]
-        return response
+        started = time.perf_counter()
+        responses = list(chatbot_model.predict(list(messages)))
+        # A sample of calls is replayed against the candidate model in the background
+        observe_model_call(messages, responses, time.perf_counter() - started)
+        return responses
     except Exception as e:
         logger.error(f"Error getting model response: {e}")
-        return None
+        return [None] * len(messages)
 
-def search_knowledge_base(query):
+def load_knowledge_base():
     """
-    Search the enhanced knowledge base for relevant answers
+    Load the enhanced knowledge base, or return None if it is missing or invalid
     """
     try:
-        kb_path = Path(__file__).resolve().parent / 'enhanced_knowledge_base.json'
+        kb_path = getattr(settings, 'CHATBOT_KNOWLEDGE_BASE_PATH', Path(__file__).resolve().parent / 'enhanced_knowledge_base.json')
         with open(kb_path, 'r', encoding='utf-8') as f:
             knowledge_base = json.load(f)
             
         if 'qa_pairs' not in knowledge_base:
             logger.error("Invalid knowledge base format")
             return None
-            
+        return knowledge_base
+    except Exception as e:
+        logger.error(f"Error loading knowledge base: {e}")
+        return None
+
+def search_knowledge_base(query):
+    """
+    Search the enhanced knowledge base for relevant answers
+    """
+    knowledge_base = load_knowledge_base()
+    if knowledge_base is None:
+        return None
+    return match_knowledge_base(query, knowledge_base)
+
+def match_knowledge_base(query, knowledge_base):
+    """
+    Find the answer for a query in an already loaded knowledge base
+    """
+    try:
         # Extract keywords from the query
         query_lower = query.lower()
         query_words = set(word.lower() for word in query_lower.split() 
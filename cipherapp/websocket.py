@@ -0,0 +1,179 @@
+# WebSocket chat transport for the ASGI application
+#
+# A chat page keeps one socket open at CHAT_WEBSOCKET_PATH. The connection is
+# authenticated once, at the handshake, from the session cookie (or a bearer
+# API token for non-browser clients), and the Origin header is checked against
+# ALLOWED_HOSTS in place of per-request CSRF. Each frame then runs the same
+# view as the HTTP endpoint, without cookie parsing, session lookup, auth or
+# CSRF:
+#
+#   -> {"id": 1, "type": "chat", "data": {"message": "hi", "session_id": 5}}
+#   <- {"id": 1, "status": 200, "data": {...the /api/chat/ response...}}
+#
+# Types are chat, feedback, edit and delete. Frames on one socket are handled
+# in order. Plain HTTP keeps working; home.js falls back to it.
+import logging
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+
+from . import fastjson, metrics, views
+from .api_auth import user_from_claims, verify_api_token
+
+logger = logging.getLogger(__name__)
+
+# Frame type -> (URL name for metrics, view)
+SOCKET_VIEWS = {
+    'chat': ('chat_api', views.chat_api),
+    'feedback': ('feedback_api', views.feedback_api),
+    'edit': ('edit_message_api', views.edit_message_api),
+    'delete': ('delete_message_api', views.delete_message_api),
+}
+
+# Close codes (4000-4999 are application defined)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN_ORIGIN = 4403
+
+def get_socket_path():
+    return getattr(settings, 'CHAT_WEBSOCKET_PATH', '/ws/chat/')
+
+def get_reauth_seconds():
+    """How long one authentication lasts before the next frame re-checks it"""
+    return getattr(settings, 'CHAT_WEBSOCKET_REAUTH_SECONDS', 300)
+
+def scope_headers(scope):
+    return {name.decode('latin1').lower(): value.decode('latin1') for name, value in scope.get('headers', [])}
+
+def origin_allowed(headers):
+    """Browsers always send Origin; it must name one of ALLOWED_HOSTS (non-browser clients send none)"""
+    origin = headers.get('origin')
+    if origin is None:
+        return True
+    host = urlsplit(origin).netloc
+    if not host:
+        return False
+    domain, _ = split_domain_port(host)
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = ['.localhost', '127.0.0.1', '[::1]']
+    return validate_host(domain, allowed_hosts)
+
+def authenticate_scope(scope, headers):
+    """The user for a handshake, from a bearer token or the session cookie; None if anonymous"""
+    scheme, _, token = headers.get('authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token.strip():
+        claims = verify_api_token(token.strip())
+        return user_from_claims(claims) if claims else None
+
+    session_key = parse_cookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    request = HttpRequest()
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(request)
+    if isinstance(user, AnonymousUser) or not user.is_active:
+        return None
+    return user
+
+def socket_meta(scope, headers):
+    """The request.META the views read (client address and user agent)"""
+    client = scope.get('client') or ('', 0)
+    meta = {
+        'REMOTE_ADDR': client[0],
+        'HTTP_USER_AGENT': headers.get('user-agent', ''),
+        'SERVER_NAME': 'websocket',
+        'SERVER_PORT': '0',
+    }
+    if 'x-forwarded-for' in headers:
+        meta['HTTP_X_FORWARDED_FOR'] = headers['x-forwarded-for']
+    return meta
+
+def dispatch_frame(user, meta, text):
+    """Run one frame through its view and return the reply frame as text"""
+    started = time.perf_counter()
+    try:
+        frame = fastjson.loads(text)
+        frame_id = frame.get('id')
+    except (ValueError, AttributeError):
+        return fastjson.dumps({'id': None, 'status': 400, 'data': {'error': 'Invalid frame'}}).decode('utf-8')
+    if not isinstance(frame.get('type'), str) or frame['type'] not in SOCKET_VIEWS:
+        return fastjson.dumps({'id': frame_id, 'status': 400, 'data': {'error': 'Unknown frame type'}}).decode('utf-8')
+    url_name, view = SOCKET_VIEWS[frame['type']]
+    data = frame.get('data') or {}
+
+    request = HttpRequest()
+    request.method = 'POST'
+    request.META = dict(meta, CONTENT_TYPE='application/json')
+    request.user = user
+    request._body = fastjson.dumps(data)
+    # The Origin was checked at the handshake and nothing here is cookie-driven
+    request._dont_enforce_csrf_checks = True
+
+    try:
+        response = view(request)
+        reply = {'id': frame_id, 'status': response.status_code, 'data': fastjson.loads(response.content)}
+    except Exception as e:
+        logger.error(f"Error handling {url_name} frame: {e}")
+        reply = {'id': frame_id, 'status': 500, 'data': {'error': 'Internal server error'}}
+    metrics.request_duration.observe(time.perf_counter() - started, url_name)
+    return fastjson.dumps(reply).decode('utf-8')
+
+def handle_frame(user, meta, text):
+    """dispatch_frame with the connection housekeeping Django does around each HTTP request"""
+    close_old_connections()
+    try:
+        return dispatch_frame(user, meta, text)
+    finally:
+        close_old_connections()
+
+async def chat_socket(scope, receive, send):
+    """One chat connection: authenticate at the handshake, then serve frames in order"""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    headers = scope_headers(scope)
+    if not origin_allowed(headers):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN_ORIGIN})
+        return
+    user = await sync_to_async(authenticate_scope)(scope, headers)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    authenticated_at = time.monotonic()
+    meta = socket_meta(scope, headers)
+    await send({'type': 'websocket.accept'})
+
+    while True:
+        event = await receive()
+        if event['type'] == 'websocket.disconnect':
+            return
+        if event['type'] != 'websocket.receive':
+            continue
+        if time.monotonic() - authenticated_at > get_reauth_seconds():
+            # Pick up logouts, password changes and deactivation on long-lived sockets
+            user = await sync_to_async(authenticate_scope)(scope, headers)
+            if user is None:
+                await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+                return
+            authenticated_at = time.monotonic()
+        text = event.get('text')
+        if text is None:
+            text = (event.get('bytes') or b'').decode('utf-8', 'replace')
+        await send({'type': 'websocket.send', 'text': await sync_to_async(handle_frame)(user, meta, text)})
+
+async def websocket_application(scope, receive, send):
+    """ASGI app for websocket scopes: the chat socket, or a refused handshake"""
+    if scope['path'] == get_socket_path():
+        await chat_socket(scope, receive, send)
+        return
+    await receive()
+    await send({'type': 'websocket.close'})
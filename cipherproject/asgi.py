@@ -1,9 +1,22 @@
 """
 ASGI config for cipherproject project.
+
+HTTP goes to Django; WebSocket connections go to the chat socket
+(cipherapp.websocket). Serve with an ASGI server, e.g.
+`uvicorn cipherproject.asgi:application`.
 """
 
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cipherproject.settings')
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup so the app registry is ready
+from cipherapp.websocket import websocket_application  # noqa: E402
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
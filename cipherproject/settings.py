@@ -26,6 +26,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'cipherapp.middleware.PrecompressedStaticMiddleware',
+    'cipherapp.middleware.JsonGzipMiddleware',
+    'cipherapp.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +68,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# The local-memory cache is per process; use a shared backend (Redis/Memcached)
+# when running several workers so cache version bumps are seen by all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cipherdepth',
+    }
+}
+
+# Home page data and sidebar fragment cache lifetime (seconds)
+HOME_CACHE_TIMEOUT = 300
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -81,6 +97,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Authentication backends: email login first, username login for the admin
+AUTHENTICATION_BACKENDS = [
+    'cipherapp.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -94,6 +116,22 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed files plus .gz/.br variants
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'cipherapp.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Minify JS/CSS during collectstatic (needs rjsmin / rcssmin installed)
+STATICFILES_MINIFY = False
+
+# Cache lifetime for static files without a content hash (seconds)
+STATIC_MAX_AGE = 3600
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -109,3 +147,96 @@ LOGOUT_REDIRECT_URL = '/login/'
 # Session settings
 SESSION_COOKIE_AGE = 86400  # 24 hours
 SESSION_SAVE_EVERY_REQUEST = True
+
+# Chatbot model and knowledge base used by generate_bot_response
+CHATBOT_MODEL_PATH = BASE_DIR / 'cipherapp' / 'noaman_chatbot_model_final.pkl'
+CHATBOT_KNOWLEDGE_BASE_PATH = BASE_DIR / 'cipherapp' / 'enhanced_knowledge_base.json'
+
+# Shadow evaluation: a sample of model calls is replayed against this candidate
+# model in a background thread and compared (manage.py shadow_report); None = off
+CHATBOT_CANDIDATE_MODEL_PATH = None
+CHATBOT_SHADOW_SAMPLE_RATE = 0.05  # fraction of predict() calls replayed
+CHATBOT_SHADOW_WORKERS = 1  # background threads per worker process
+CHATBOT_SHADOW_MAX_PENDING = 50  # sampled calls waiting beyond this are dropped
+CHATBOT_SHADOW_FLUSH_SIZE = 20  # results written per bulk INSERT
+
+# Stateless API tokens for /api/chat/* (seconds)
+API_TOKEN_MAX_AGE = 900  # 15 minutes
+# How long token requests reuse a cached user row; any User save invalidates it
+API_TOKEN_USER_CACHE_TIMEOUT = 60
+
+# Largest number of messages accepted by /api/chat/batch/ in one request
+CHAT_BATCH_MAX_MESSAGES = 100
+
+# Shared bot response texts each worker remembers, saving the lookup per reply
+RESPONSE_TEXT_CACHE_SIZE = 1000
+
+# Message and response text at least this long is stored compressed
+COMPRESSED_TEXT_MIN_LENGTH = 512
+COMPRESSED_TEXT_CODEC = 'auto'  # 'zstd' when zstandard is installed, else 'zlib'
+# Message types always stored as plaintext, e.g. for a database full-text index
+# ('bot' also keeps the shared ResponseText store uncompressed)
+PLAINTEXT_MESSAGE_TYPES = []
+# Compressed messages /api/chat/search/ fetches per round trip while decoding them in Python
+SEARCH_COMPRESSED_CHUNK_SIZE = 500
+
+# Sessions without messages for this many days move to the archive (manage.py archive_sessions)
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 100
+
+# UserActivity rollups (manage.py rollup_activity, run hourly)
+ACTIVITY_RAW_RETENTION_DAYS = 30  # raw rows are pruned after this, once rolled up
+ACTIVITY_HOURLY_RETENTION_DAYS = 90  # hourly rollups; daily rollups are kept
+
+# Admin changelists count exactly up to this many rows, then show the database's estimate
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Microbenchmark suite (manage.py benchmark)
+BENCHMARK_BASELINE_PATH = BASE_DIR / 'benchmarks' / 'baseline.json'
+BENCHMARK_TOLERANCE = 0.25  # fail when a benchmark is more than 25% slower
+
+# Request profiling (cipherapp.middleware.ProfilingMiddleware)
+SERVER_TIMING_ENABLED = DEBUG  # emit a Server-Timing header with DB and pipeline stage timings
+PROFILE_SAMPLE_RATE = 0.0  # fraction of requests run under cProfile (0 = off)
+PROFILE_SLOW_MS = 500  # only keep profiles of requests slower than this
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Metrics (Prometheus text format at /metrics)
+METRICS_ENABLED = True
+METRICS_DIR = BASE_DIR / 'metrics'  # per-worker mmap files, summed on scrape; None = this process only
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # empty list allows any client
+
+# Admission control for the response pipeline (chat, batch and edit)
+ADMISSION_ENABLED = True
+ADMISSION_CACHE = 'default'  # holds the per-user token buckets; use a shared cache to limit across workers
+ADMISSION_USER_RATE = 1.0  # messages per second each user's bucket refills
+ADMISSION_USER_BURST = 10  # messages a user can send back to back
+ADMISSION_MAX_CONCURRENCY = 8  # pipeline requests running at once, per worker
+ADMISSION_MAX_QUEUE = 16  # requests waiting for a slot beyond that; more are shed with 503
+ADMISSION_QUEUE_TIMEOUT = 2.0  # seconds a queued request waits before it is shed
+ADMISSION_SHED_RETRY_AFTER = 2  # Retry-After seconds on a 503
+
+# Concurrent chat requests with the same message (ignoring case and spacing)
+# share one response pipeline run; a waiter gives up and runs it itself after
+# CHAT_COALESCE_TIMEOUT seconds
+CHAT_COALESCE_ENABLED = True
+CHAT_COALESCE_TIMEOUT = 10
+
+# API JSON encoding: 'auto' uses orjson when installed, else the standard library
+API_JSON_BACKEND = 'auto'
+API_GZIP_MIN_BYTES = 8192  # gzip JSON responses at least this large (None = never)
+
+# WebSocket chat transport; only set True when serving cipherproject.asgi, as
+# runserver and WSGI servers have no socket route (home.js then stays on HTTP)
+CHAT_WEBSOCKET_ENABLED = False
+CHAT_WEBSOCKET_PATH = '/ws/chat/'
+CHAT_WEBSOCKET_REAUTH_SECONDS = 300  # re-check the session of a long-lived socket this often
+
+# RL model state shared by the workers on a host: a version stamp they check
+# before each use (None = no sharing), plus a reload at least this often (seconds)
+RL_STATE_PATH = BASE_DIR / 'run' / 'rl_state.version'
+RL_STATE_MAX_AGE = 60
+
+# Chat session deletion (cipherapp.deletion)
+SESSION_SOFT_DELETE_THRESHOLD = 2000  # sessions with more messages are purged in the background
+SESSION_PURGE_BATCH_SIZE = 500  # messages deleted per purge transaction
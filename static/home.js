@@ -23,6 +23,180 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeApp();
 });
 
+/**
+ * Stateless API token support for /api/chat/* calls
+ */
+
+/**
+ * Fetch a fresh API token using the session login
+ */
+async function refreshApiToken() {
+    const response = await fetch(window.API_TOKEN_URL, { credentials: 'same-origin' });
+    if (!response.ok) {
+        throw new Error(`Token refresh failed: ${response.status}`);
+    }
+    const data = await response.json();
+    window.API_TOKEN = data.token;
+    return data.token;
+}
+
+/**
+ * fetch() wrapper that authenticates with the API token instead of the session cookie.
+ * Falls back to a plain session request when no token is available.
+ */
+async function apiFetch(url, options = {}) {
+    const socketReply = await chatSocket.tryRequest(url, options);
+    if (socketReply) {
+        return socketReply;
+    }
+    
+    if (!window.API_TOKEN) {
+        return fetch(url, options);
+    }
+    
+    const sendWithToken = () => fetch(url, {
+        ...options,
+        credentials: 'omit',
+        headers: {
+            ...(options.headers || {}),
+            'Authorization': `Bearer ${window.API_TOKEN}`
+        }
+    });
+    
+    let response = await sendWithToken();
+    if (response.status === 401) {
+        // Token expired: refresh once, or drop back to the session path
+        try {
+            await refreshApiToken();
+        } catch (error) {
+            console.warn('⚠️ API token refresh failed, using session auth:', error);
+            window.API_TOKEN = null;
+            return fetch(url, options);
+        }
+        response = await sendWithToken();
+    }
+    return response;
+}
+
+/**
+ * WebSocket transport for chat, feedback, edit and delete.
+ * One authenticated socket replaces a full HTTP request per message; calls
+ * made while the socket is not open go over HTTP.
+ */
+const chatSocket = {
+    socket: null,
+    nextId: 1,
+    pending: new Map(),
+    retryDelay: 1000,
+    replyTimeout: 15000,
+    // Handshakes that failed in a row; the page gives up on the socket after
+    // one if it never connected (no socket route) or a few if it had
+    failedHandshakes: 0,
+    connected: false,
+    
+    frameType(url, options) {
+        if ((options.method || 'GET').toUpperCase() !== 'POST') {
+            return null;
+        }
+        const types = {
+            '/api/chat/feedback/': 'feedback',
+            '/api/chat/edit-message/': 'edit',
+            '/api/chat/delete-message/': 'delete'
+        };
+        types[window.API_BASE || '/api/chat/'] = 'chat';
+        return types[url] || null;
+    },
+    
+    connect() {
+        if (!window.CHAT_SOCKET_PATH || !window.WebSocket) {
+            return;
+        }
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}${window.CHAT_SOCKET_PATH}`);
+        
+        let opened = false;
+        socket.onopen = () => {
+            opened = true;
+            this.connected = true;
+            this.failedHandshakes = 0;
+            this.retryDelay = 1000;
+        };
+        socket.onmessage = (event) => {
+            let reply;
+            try {
+                reply = JSON.parse(event.data);
+            } catch (error) {
+                return;
+            }
+            const waiter = this.pending.get(reply.id);
+            if (waiter) {
+                this.pending.delete(reply.id);
+                waiter.resolve(reply);
+            }
+        };
+        socket.onclose = (event) => {
+            this.socket = null;
+            this.failPending();
+            // 4401/4403: not authenticated or wrong origin, stay on HTTP
+            if (event.code === 4401 || event.code === 4403) {
+                return;
+            }
+            if (!opened) {
+                this.failedHandshakes += 1;
+                if (this.failedHandshakes >= (this.connected ? 5 : 1)) {
+                    return;
+                }
+            }
+            setTimeout(() => this.connect(), this.retryDelay);
+            this.retryDelay = Math.min(this.retryDelay * 2, 30000);
+        };
+        this.socket = socket;
+    },
+    
+    failPending() {
+        this.pending.forEach(waiter => waiter.resolve(null));
+        this.pending.clear();
+    },
+    
+    /**
+     * Send a request over the socket. Resolves to a Response, or null when the
+     * caller should use HTTP instead.
+     */
+    tryRequest(url, options) {
+        const type = this.frameType(url, options);
+        if (!type || !this.socket || this.socket.readyState !== WebSocket.OPEN) {
+            return Promise.resolve(null);
+        }
+        let data;
+        try {
+            data = JSON.parse(options.body || '{}');
+        } catch (error) {
+            return Promise.resolve(null);
+        }
+        
+        const id = this.nextId++;
+        const reply = new Promise(resolve => {
+            this.pending.set(id, { resolve });
+            setTimeout(() => {
+                if (this.pending.delete(id)) {
+                    resolve(null);
+                }
+            }, this.replyTimeout);
+        });
+        this.socket.send(JSON.stringify({ id, type, data }));
+        
+        // Once sent, a lost reply is an error rather than an HTTP retry, which
+        // could apply the same chat message or edit twice
+        return reply.then(frame => {
+            const body = frame ? frame.data : { error: 'Connection lost, please try again' };
+            return new Response(JSON.stringify(body), {
+                status: frame ? frame.status : 503,
+                headers: { 'Content-Type': 'application/json' }
+            });
+        });
+    }
+};
+
 /**
  * Initialize the entire application
  */
@@ -35,6 +209,7 @@ function initializeApp() {
     initializeTheme();
     initializeSidebar();
     initializeMessageManagement();
+    chatSocket.connect();
     
     // Auto-hide messages after 5 seconds
     autoHideMessages();
@@ -596,7 +771,7 @@ function addMessageActions(messageElement, messageId, isUserMessage = false) {
 function submitFeedback(messageId, feedbackType) {
     console.log(`🔄 Submitting ${feedbackType} feedback for message ${messageId}`);
     
-    fetch('/api/chat/feedback/', {
+    apiFetch('/api/chat/feedback/', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -705,7 +880,7 @@ async function saveEditedMessage(messageId) {
     }
     
     try {
-        const response = await fetch('/api/chat/edit-message/', {
+        const response = await apiFetch('/api/chat/edit-message/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -807,7 +982,7 @@ async function confirmDeleteMessage() {
     if (!messageToDelete) return;
     
     try {
-        const response = await fetch('/api/chat/delete-message/', {
+        const response = await apiFetch('/api/chat/delete-message/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -880,7 +1055,7 @@ async function exportConversation(format) {
     
     try {
         console.log('📤 Sending export request...');
-        const response = await fetch('/api/chat/export/', {
+        const response = await apiFetch('/api/chat/export/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -1188,7 +1363,7 @@ function handleLoadChatSession(sessionId) {
     // Load chat history for this session
     const url = `${window.CHAT_HISTORY_URL}?session_id=${sessionId}`;
     
-    fetch(url)
+    apiFetch(url)
         .then(response => response.json())
         .then(data => {
             if (data.success) {
@@ -1431,7 +1606,7 @@ function sendMessageToAPI(message) {
     
     console.log('📦 Payload:', payload);
     
-    fetch(apiUrl, {
+    apiFetch(apiUrl, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -1443,7 +1618,8 @@ function sendMessageToAPI(message) {
         console.log('📡 Response status:', response.status);
         console.log('📡 Response headers:', response.headers);
         
-        if (!response.ok) {
+        // 429/503 carry a readable error and Retry-After; show that instead of the status
+        if (!response.ok && response.status !== 429 && response.status !== 503) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         return response.json();
@@ -1497,7 +1673,7 @@ function sendMessageToAPI(message) {
 function refreshChatHistory() {
     console.log('🔄 Refreshing chat history...');
     
-    fetch(window.CHAT_HISTORY_URL)
+    apiFetch(window.CHAT_HISTORY_URL)
         .then(response => response.json())
         .then(data => {
             if (data.success) {